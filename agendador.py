@@ -0,0 +1,90 @@
+"""
+agendador.py
+
+Agendamento das tarefas dos harnesses (grid_search.py, testbench.py) sem oversubscription:
+cada worker recebe uma fatia dos núcleos para os pools de BLAS/OpenMP (a mesma contagem que
+os harnesses repassam ao grafo kNN, em grafo_vizinhos(n_threads=...) ou via OMP_NUM_THREADS
+nos subprocessos), e as tarefas são enviadas da mais longa para a mais curta (LPT) pelo
+custo esperado, para que a cauda da execução não fique presa a uma tarefa lenta iniciada
+por último. Ao final, o relatório compara a ocupação dos workers (tempo ocupado / (parede ×
+workers), sem contar as threads de cada um) e o makespan obtidos com os da ordem ingênua
+(ordem de envio original), simulados com as durações medidas.
+"""
+
+import os
+import heapq
+import logging
+from typing import Optional
+
+# Variáveis lidas pelos pools de threads de BLAS/OpenMP ao carregar NumPy/SciPy
+VARIAVEIS_THREADS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+logger = logging.getLogger(__name__)
+
+
+def threads_por_worker(n_workers: int, n_threads: Optional[int] = None) -> int:
+    """Threads de BLAS por worker: `n_threads`, ou os núcleos divididos entre os workers."""
+    return n_threads or max(1, (os.cpu_count() or 1) // max(1, n_workers))
+
+
+def ambiente_limitado(n_threads: int, base: Optional[dict] = None) -> dict:
+    """Cópia do ambiente (de `base` ou do processo) com os pools de threads limitados."""
+    env = dict(os.environ if base is None else base)
+    env.update({var: str(n_threads) for var in VARIAVEIS_THREADS})
+    return env
+
+
+def limitar_threads(n_threads: int):
+    """
+    Limita as threads deste processo: as variáveis de ambiente valem para subprocessos e
+    para bibliotecas ainda não carregadas; threadpoolctl (dependência do scikit-learn), se
+    disponível, ajusta os pools de BLAS/OpenMP já carregados.
+    """
+    os.environ.update(ambiente_limitado(n_threads))
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:  # sem threadpoolctl, valem só as variáveis de ambiente
+        pass
+    else:
+        threadpool_limits(limits=n_threads)
+
+
+def ordenar_por_custo(tarefas: list, custos: list) -> list:
+    """Índices de `tarefas` da maior para a menor `custos` (LPT); empates na ordem original."""
+    return sorted(range(len(tarefas)), key=lambda i: -custos[i])
+
+
+def makespan(duracoes: list, n_workers: int) -> float:
+    """Makespan de enviar `duracoes` nessa ordem a `n_workers` (cada uma ao 1º livre)."""
+    livres = [0.0] * max(1, n_workers)
+    for d in duracoes:
+        heapq.heappush(livres, heapq.heappop(livres) + d)
+    return max(livres)
+
+
+def relatorio(lotes: list, n_workers: int, wall_time: float) -> dict:
+    """
+    Ocupação dos workers (fração do tempo de parede × workers com uma tarefa em curso, não
+    dos núcleos: cada worker roda várias threads) e makespan da execução. Cada lote é (durações medidas na ordem de envio,
+    ordem ingênua como índices nessas durações); os lotes rodam um após o outro, então os
+    makespans simulados são somados.
+    """
+    n = max(1, n_workers)
+    duracoes = [d for lote, _ in lotes for d in lote]
+    total = sum(duracoes)
+    return {
+        "workers": n,
+        "tarefas": len(duracoes),
+        "tempo_ocupado": total,
+        "ocupacao_workers": total / (wall_time * n) if wall_time else 0.0,
+        "makespan_real": wall_time,
+        "makespan_agendado": sum(makespan(lote, n) for lote, _ in lotes),
+        "makespan_ingenuo": sum(makespan([lote[i] for i in ordem], n) for lote, ordem in lotes),
+        "limite_inferior": sum(max(sum(lote) / n, max(lote, default=0.0)) for lote, _ in lotes),
+    }
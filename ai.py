@@ -4,147 +4,1671 @@ ai.py
 
 Implementa recomendações de produtos para clientes usando filtragem colaborativa KNN,
 incorporando recência, feedback, filtragem de ruído, transformações TF–IDF e normalização.
-Agora suporta sobrescrever os hiperparâmetros a partir de um arquivo JSON de melhores
+Os hiperparâmetros podem ser sobrescritos a partir de um arquivo JSON de melhores
 parâmetros (grid search), via flag -f/--best-params ou ao detectar best_params.json no CWD.
+
+O modelo segue o ciclo construir → salvar → carregar: a matriz CSR normalizada, os
+vocabulários de clientes/produtos e os parâmetros ajustados são gravados em um artefato
+versionado (arquivos .npy + manifesto JSON) em ARTIFACT_DIR. Importar o módulo não lê
+dados nem argumentos: criar_modelo(params, caminho, diretorio) devolve um modelo com
+configuração própria, carregado via memory-map do artefato (quando compatível com os
+parâmetros e com a origem dos dados) ou reconstruído no primeiro uso. Modelos com
+configurações diferentes coexistem no mesmo processo; as funções sem `modelo_ref` usam o
+modelo padrão (constantes do módulo + best_params.json), também criado só no primeiro uso.
 """
 
 import os
 import argparse
 import json
 import logging
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Optional, Union
 import pandas as pd
 import numpy as np
-from scipy.sparse import csr_matrix
-from sklearn.neighbors import NearestNeighbors
-from sklearn.feature_extraction.text import TfidfTransformer
-from sklearn.preprocessing import normalize
+from scipy.sparse import coo_matrix, csr_matrix, diags
+from vocab import Vocabulario
+from cache_estagios import CacheEstagios, chave, hash_dados
+from quantizacao import CSRQuantizada, VetoresQuantizados, dtype_esparso
+import ann
+from ingest import (
+    FEEDBACK_MAP,
+    PAIR_COLUMNS,
+    agregar_pares,
+    agregar_vendas_brutas,
+    anexar_vendas,
+    carregar_vendas,
+    filtrar_pares,
+    mesclar_pares,
+    peso_recencia,
+)
+import sales_store
+
+if TYPE_CHECKING:  # scikit-learn só é importado quando um índice exato é criado
+    from sklearn.neighbors import NearestNeighbors
 
 # === Configurações padrão do modelo ===
 K_VIZINHOS = 20  # número de vizinhos
 K_RECS = 10  # número de recomendações
+MODO_RECOMENDACAO = "clientes"  # "clientes" (KNN), "itens" (item–item) ou "fatores" (SVD)
+ITEM_TOP_N = 50  # vizinhos guardados por produto na similaridade item–item
+RANK_FATORES = 32  # dimensão dos embeddings de clientes/produtos do modo "fatores"
+PRECISAO = "float32"  # "float64"/"float32"; "float16"/"int8" (escala por linha) só nos fatores
+ANN_BACKEND = "brute"  # busca de vizinhos: "brute" (exata) ou "ivf" (aproximada, ver ann.py)
+ANN_LISTS = 0  # listas do índice IVF (0 = ~sqrt(nº de clientes))
+ANN_PROBES = 8  # listas sondadas por consulta no IVF (mais = maior recall e latência)
 ALPHA = 0.01  # taxa de decaimento de recência
 MIN_PRODUCT_SUPPORT = 5  # min clientes por produto
 MIN_CLIENT_TRANSACTIONS = 5  # min transações por cliente
 MIN_QUANTITY = 5  # min quantidade para usar interação
+RECENCY_WINDOW_DAYS = None  # só vendas dos últimos N dias (None = histórico inteiro)
+RECENCY_MODE = "hiperbolico"  # decaimento 1/(1+α·d) fixo no build, ou "exponencial" (re-ancorável)
+BATCH_SIZE = 1024  # clientes por bloco nas recomendações em lote
+MEMORIA_BLOCOS_MB = 512  # teto dos blocos densos de similaridade em voo no grafo kNN
+N_THREADS = int(os.environ.get("OMP_NUM_THREADS") or 0) or os.cpu_count() or 1  # threads: grafo kNN
+PRECOMPUTE_K = 0  # máx. K da tabela de recomendações pré-computada (0 = desativada)
+REBUILD_FRACTION = 0.05  # fração de clientes entrando no filtro que força reconstrução
+REGRAFO_FRACTION = 0.5  # fração de linhas alteradas acima da qual o grafo kNN é refeito inteiro
 
-# === Logging ===
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
+MODOS_RECOMENDACAO = ("clientes", "itens", "fatores")
+HIPERPARAMETROS = (
+    "K_VIZINHOS",
+    "K_RECS",
+    "ALPHA",
+    "MIN_QUANTITY",
+    "MIN_PRODUCT_SUPPORT",
+    "MIN_CLIENT_TRANSACTIONS",
+)  # sobrescritos por best_params.json
+
+# === Artefato do modelo ===
+DATA_PATH = "data/sells_data.csv"  # CSV de vendas (importação/exportação)
+STORE_PATH = sales_store.STORE_DIR  # store colunar particionado, preferido quando existe
+ARTIFACT_DIR = "model"  # diretório do artefato persistido
+ARTIFACT_VERSION = 8  # incrementar ao mudar o formato do artefato
+CACHE_DIR = "cache"  # cache dos estágios do build (None = desativado, ver cache_estagios.py)
+BUILD_PARAMS = (
+    "ALPHA",
+    "MIN_QUANTITY",
+    "MIN_PRODUCT_SUPPORT",
+    "MIN_CLIENT_TRANSACTIONS",
+    "RECENCY_WINDOW_DAYS",
+    "RECENCY_MODE",
+    "RANK_FATORES",
+    "PRECISAO",
+    "ITEM_TOP_N",
+    "ANN_BACKEND",
+    "ANN_LISTS",
 )
+ESTAGIOS = {
+    "agregados": ("ALPHA", "MIN_QUANTITY", "RECENCY_WINDOW_DAYS", "RECENCY_MODE"),
+    "matriz": ("MIN_PRODUCT_SUPPORT", "MIN_CLIENT_TRANSACTIONS"),
+    "indice": ("K_VIZINHOS", "ANN_BACKEND", "ANN_LISTS", "ANN_PROBES"),
+    "similares": ("ITEM_TOP_N",),
+    "fatores": ("RANK_FATORES",),
+}  # parâmetros que entram na chave de cada estágio do build em cache
+
+# === Logging ===
 logger = logging.getLogger(__name__)
 
-# === Sobrescreve via best_params.json se disponível ===
-parser = argparse.ArgumentParser(add_help=False)
-parser.add_argument(
-    "-f",
-    "--best-params",
-    help="Caminho para JSON com melhores parâmetros (precision@K, recall@K, params)",
-)
-# parse_known_args para não interferir em outros usos de argparse
-args, _ = parser.parse_known_args()
-# determina arquivo de parâmetros
-best_path = args.best_params or os.path.join(os.getcwd(), "grid_search", "best_params.json")
-if best_path and os.path.isfile(best_path):
+
+def configurar_logging():
+    """Formato de log dos scripts (chamado nos __main__, não ao importar o módulo)."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+
+@dataclass
+class Modelo:
+    """
+    Modelo de recomendação pronto para consulta:
+    - matriz: CSR cliente×produto normalizada (TF–IDF + L2, com avg_feedback), em float32
+      (ou float64, conforme PRECISAO).
+    - clientes/produtos: vocabulários (nome ↔ código) das linhas/colunas da matriz.
+    - compras: índice do histórico por cliente (offsets indptr + produto/quantidade total
+      contíguos por cliente, ordenados por quantidade decrescente).
+    - params: hiperparâmetros usados na construção.
+    - tabela: top-K pré-computado de todos os clientes (opcional), com o K_VIZINHOS usado.
+    - grafo: grafo kNN em CSR (linha i = vizinhos do cliente i, peso = similaridade de
+      cosseno), com o K_VIZINHOS usado; consultas com k_vizinhos <= grafo_k não usam o knn.
+    - similares: similaridade item–item (CSR produtos×produtos, top-N por produto) do modo
+      "itens".
+    - fatores_clientes/fatores_produtos: embeddings (SVD truncada) do modo "fatores",
+      quantizados conforme PRECISAO (float32, float16 ou int8 com escala por linha).
+    - idf/docfreq/normas: IDF e frequência por coluna e norma L2 de cada linha antes da
+      normalização, usados por atualizar_modelo para não reconstruir tudo.
+    - estado: agregados por par sem os filtros de suporte/transações (+ data âncora da
+      recência; no modo exponencial ela avança com reancorar_modelo).
+    - knn: índice de vizinhos conforme ANN_BACKEND (exato ou IVF); `indice_salvo` restaura
+      um IVF persistido sem retreiná-lo.
+    """
+
+    matriz: csr_matrix
+    clientes: Vocabulario
+    produtos: Vocabulario
+    compras: dict
+    params: dict
+    tabela: Optional[np.ndarray] = None
+    tabela_k_vizinhos: int = 0
+    grafo: Optional[csr_matrix] = None
+    grafo_k: int = 0
+    similares: Optional[csr_matrix] = None
+    fatores_clientes: Optional[VetoresQuantizados] = None
+    fatores_produtos: Optional[VetoresQuantizados] = None
+    idf: Optional[np.ndarray] = None
+    docfreq: Optional[np.ndarray] = None
+    normas: Optional[np.ndarray] = None
+    estado: Optional[dict] = None
+    indice_salvo: Optional[dict] = field(default=None, repr=False)
+    knn: Union["NearestNeighbors", ann.IndiceIVF] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.knn = ann.criar_indice(self.params, self.matriz, self.indice_salvo)
+        self.indice_salvo = None
+
+
+def parametros_atuais() -> dict:
+    """Retorna os seis hiperparâmetros vigentes no módulo (mais janela e modo de recência)."""
+    return {
+        "K_VIZINHOS": K_VIZINHOS,
+        "K_RECS": K_RECS,
+        "ALPHA": ALPHA,
+        "MIN_QUANTITY": MIN_QUANTITY,
+        "MIN_PRODUCT_SUPPORT": MIN_PRODUCT_SUPPORT,
+        "MIN_CLIENT_TRANSACTIONS": MIN_CLIENT_TRANSACTIONS,
+        "RECENCY_WINDOW_DAYS": RECENCY_WINDOW_DAYS,
+        "RECENCY_MODE": RECENCY_MODE,
+        "ITEM_TOP_N": ITEM_TOP_N,
+        "ANN_BACKEND": ANN_BACKEND,
+        "ANN_LISTS": ANN_LISTS,
+        "ANN_PROBES": ANN_PROBES,
+        "RANK_FATORES": RANK_FATORES,
+        "PRECISAO": PRECISAO,
+    }
+
+
+def ler_best_params(caminho: Optional[str] = None) -> dict:
+    """
+    Os HIPERPARAMETROS presentes em um best_params.json do grid search (padrão:
+    grid_search/best_params.json no CWD); {} se o arquivo não existir ou for ilegível.
+    """
+    caminho = caminho or os.path.join(os.getcwd(), "grid_search", "best_params.json")
+    if not os.path.isfile(caminho):
+        return {}
     try:
-        with open(best_path, "r", encoding="utf-8") as bf:
-            best_data = json.load(bf)
-        params = best_data.get("params", {})
-        for name in (
-            "K_VIZINHOS",
-            "K_RECS",
-            "ALPHA",
-            "MIN_QUANTITY",
-            "MIN_PRODUCT_SUPPORT",
-            "MIN_CLIENT_TRANSACTIONS",
-        ):
-            if name in params:
-                old = globals()[name]
-                globals()[name] = params[name]
-                logger.info("Hiperparâmetro %s: %s → %s", name, old, params[name])
-        logger.info("Hiperparâmetros carregados de '%s'", best_path)
+        with open(caminho, "r", encoding="utf-8") as bf:
+            params = json.load(bf).get("params", {})
     except Exception as e:
-        logger.warning("Falha ao carregar parâmetro de '%s': %s", best_path, e)
-
-# === Carregamento e preparação dos dados ===
-logger.info("Carregando dados de vendas")
-df_comp = pd.read_csv("data/sells_data.csv")
-
-logger.info("Removendo interações com quantity < %d", MIN_QUANTITY)
-df_comp = df_comp[df_comp["quantity"] >= MIN_QUANTITY]
-
-logger.info("Convertendo datas e calculando recência (ALPHA=%s)", ALPHA)
-df_comp["date"] = pd.to_datetime(df_comp["date"])
-max_date = df_comp["date"].max()
-df_comp["days_since"] = (max_date - df_comp["date"]).dt.days
-df_comp["recency_weight"] = 1 / (1 + ALPHA * df_comp["days_since"])
-df_comp["weighted_quantity"] = df_comp["quantity"] * df_comp["recency_weight"]
-
-logger.info(
-    "Filtrando produtos com suporte < %d e clientes com < %d transações",
-    MIN_PRODUCT_SUPPORT,
-    MIN_CLIENT_TRANSACTIONS,
-)
-support = df_comp.groupby("product")["client"].nunique()
-popular_products = support[support >= MIN_PRODUCT_SUPPORT].index
-df_comp = df_comp[df_comp["product"].isin(popular_products)]
-txn_counts = df_comp["client"].value_counts()
-active_clients = txn_counts[txn_counts >= MIN_CLIENT_TRANSACTIONS].index
-df_comp = df_comp[df_comp["client"].isin(active_clients)]
-
-logger.info("Gerando matriz cliente×produto (weighted_quantity)")
-pivot = df_comp.pivot_table(
-    index="client", columns="product", values="weighted_quantity", aggfunc="sum", fill_value=0
-)
+        logger.warning("Falha ao carregar parâmetro de '%s': %s", caminho, e)
+        return {}
+    escolhidos = {k: params[k] for k in HIPERPARAMETROS if k in params}
+    for nome, valor in escolhidos.items():
+        logger.info("Hiperparâmetro %s: %s → %s", nome, globals()[nome], valor)
+    logger.info("Hiperparâmetros carregados de '%s'", caminho)
+    return escolhidos
+
+
+def caminho_vendas() -> str:
+    """Store colunar se existir (e pyarrow estiver instalado); senão o CSV."""
+    if sales_store.disponivel() and os.path.isdir(STORE_PATH):
+        return STORE_PATH
+    return DATA_PATH
+
+
+def preparar_dados(caminho: Optional[str] = None, params: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Carrega as vendas (CSV ou store) e aplica filtros de ruído, recência e feedback.
+
+    Retorna:
+        DataFrame de interações filtradas com weighted_quantity e feedback_score.
+    """
+    params = params or parametros_atuais()
+    return filtrar_suporte(preparar_vendas(caminho, params), params)
+
+
+def preparar_vendas(caminho: Optional[str] = None, params: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Primeiro estágio de preparar_dados (só ALPHA, MIN_QUANTITY e recência): vendas com
+    quantity >= MIN_QUANTITY e weighted_quantity, antes dos filtros de suporte.
+    """
+    params = params or parametros_atuais()
+    alpha = params["ALPHA"]
+    min_quantity = params["MIN_QUANTITY"]
+
+    logger.info("Carregando dados de vendas")
+    df_comp = carregar_vendas(caminho or caminho_vendas())
+
+    logger.info("Removendo interações com quantity < %d", min_quantity)
+    df_comp = df_comp[df_comp["quantity"] >= min_quantity]
+
+    modo = params.get("RECENCY_MODE", "hiperbolico")
+    logger.info("Calculando recência (ALPHA=%s, modo %s)", alpha, modo)
+    max_date = df_comp["date"].max()
+    janela = params.get("RECENCY_WINDOW_DAYS")
+    if janela:
+        df_comp = df_comp[df_comp["date"] >= max_date - pd.Timedelta(days=janela)]
+    df_comp["days_since"] = (max_date - df_comp["date"]).dt.days
+    df_comp["recency_weight"] = peso_recencia(df_comp["days_since"], alpha, modo)
+    df_comp["weighted_quantity"] = df_comp["quantity"] * df_comp["recency_weight"]
+    return df_comp
+
+
+def filtrar_suporte(df_comp: pd.DataFrame, params: dict) -> pd.DataFrame:
+    """
+    Segundo estágio de preparar_dados: suporte mínimo de produtos, transações mínimas por
+    cliente e feedback_score. Não altera `df_comp`.
+    """
+    min_product_support = params["MIN_PRODUCT_SUPPORT"]
+    min_client_transactions = params["MIN_CLIENT_TRANSACTIONS"]
+    logger.info(
+        "Filtrando produtos com suporte < %d e clientes com < %d transações",
+        min_product_support,
+        min_client_transactions,
+    )
+    support = df_comp.groupby("product", observed=True)["client"].nunique()
+    popular_products = support[support >= min_product_support].index
+    df_comp = df_comp[df_comp["product"].isin(popular_products)]
+    txn_counts = df_comp["client"].value_counts()
+    active_clients = txn_counts[txn_counts >= min_client_transactions].index
+    df_comp = df_comp[df_comp["client"].isin(active_clients)].copy()
+
+    logger.info("Mapeando feedback")
+    df_comp["feedback_score"] = df_comp["customerFeedback"].map(FEEDBACK_MAP).astype("float64")
+    return df_comp
+
+
+def matriz_interacoes(pares: pd.DataFrame) -> tuple[csr_matrix, Vocabulario, Vocabulario]:
+    """
+    Monta a matriz esparsa cliente×produto direto dos códigos categóricos dos agregados
+    por par (ver ingest.agregar_pares), sem pivot denso: weighted_quantity por
+    (cliente, produto) e, na última coluna, avg_feedback.
+
+    Retorna:
+        (matriz CSR, vocabulário de clientes, vocabulário de produtos) — o de produtos
+        inclui "avg_feedback" como último código.
+    """
+    cli = pd.Categorical(pares["client"]).remove_unused_categories()
+    prod = pd.Categorical(pares["product"]).remove_unused_categories()
+    n_cli, n_prod = len(cli.categories), len(prod.categories)
+    rows = cli.codes.astype(np.int32)
+    cols = prod.codes.astype(np.int32)
+
+    # Média de feedback por cliente ignorando ausentes (como groupby().mean())
+    fb_sum = np.bincount(rows, weights=pares["feedback_sum"].to_numpy(), minlength=n_cli)
+    fb_cnt = np.bincount(rows, weights=pares["feedback_n"].to_numpy(), minlength=n_cli)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_feedback = fb_sum / fb_cnt
+
+    # COO → CSR soma eventuais duplicatas (aggfunc="sum" do pivot)
+    matriz = coo_matrix(
+        (
+            np.concatenate([pares["weighted_quantity"].to_numpy(dtype=np.float64), avg_feedback]),
+            (
+                np.concatenate([rows, np.arange(n_cli, dtype=np.int32)]),
+                np.concatenate([cols, np.full(n_cli, n_prod, dtype=np.int32)]),
+            ),
+        ),
+        shape=(n_cli, n_prod + 1),
+    ).tocsr()
+    matriz.eliminate_zeros()
+    return (
+        matriz,
+        Vocabulario(cli.categories),
+        Vocabulario(list(prod.categories) + ["avg_feedback"]),
+    )
+
+
+def normalizar_linhas_(matriz: csr_matrix) -> np.ndarray:
+    """
+    Normaliza (L2) as linhas de uma CSR no próprio array `data`.
+
+    Retorna:
+        Normas das linhas antes da normalização (1.0 para linhas vazias).
+    """
+    n_por_linha = np.diff(matriz.indptr)
+    linhas = np.repeat(np.arange(matriz.shape[0]), n_por_linha)
+    normas = np.sqrt(np.bincount(linhas, weights=matriz.data**2, minlength=matriz.shape[0]))
+    normas[normas == 0] = 1.0
+    matriz.data /= np.repeat(normas, n_por_linha)
+    return normas
+
+
+def calcular_idf(docfreq: np.ndarray, n: int) -> np.ndarray:
+    """idf = ln((1 + n) / (1 + df)) + 1, como o TfidfTransformer padrão (smooth_idf=True)."""
+    return np.log((1 + n) / (1 + docfreq)) + 1
+
+
+def tfidf_l2_(matriz: csr_matrix) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    TF–IDF + normalização L2 esparsos, no lugar (df = nnz por coluna).
+
+    Retorna:
+        (idf, docfreq, normas das linhas antes da normalização)
+    """
+    docfreq = np.bincount(matriz.indices, minlength=matriz.shape[1])
+    idf = calcular_idf(docfreq, matriz.shape[0])
+    matriz.data *= idf[matriz.indices]
+    return idf, docfreq, normalizar_linhas_(matriz)
+
+
+def indice_compras(
+    cliente: np.ndarray, produto: np.ndarray, quantidade: np.ndarray, n_clientes: int
+) -> dict:
+    """
+    Agrupa as compras por código de cliente em faixas contíguas (offsets estilo CSR),
+    cada faixa já ordenada por quantidade decrescente: o histórico vira uma fatia.
+    """
+    ordem = np.lexsort((-quantidade.astype(np.int64), cliente))
+    indptr = np.zeros(n_clientes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cliente, minlength=n_clientes), out=indptr[1:])
+    return {"indptr": indptr, "produto": produto[ordem], "quantidade": quantidade[ordem]}
+
+
+def _estado_de_pares(brutos: pd.DataFrame, ancora) -> dict:
+    """Agregados brutos como arrays (códigos + colunas numéricas) e vocabulários."""
+    cli = pd.Categorical(brutos["client"])
+    prod = pd.Categorical(brutos["product"])
+    estado = {c: brutos[c].to_numpy() for c in PAIR_COLUMNS}
+    estado.update(
+        cliente=cli.codes.astype(np.int32),
+        produto=prod.codes.astype(np.int32),
+        clientes=list(cli.categories),
+        produtos=list(prod.categories),
+        ancora=pd.Timestamp(ancora).isoformat() if ancora is not None else None,
+    )
+    return estado
+
+
+def _pares_de_estado(estado: dict) -> pd.DataFrame:
+    """Reconstrói o DataFrame de agregados brutos a partir do estado do modelo."""
+    return pd.DataFrame(
+        {
+            "client": pd.Categorical.from_codes(estado["cliente"], categories=estado["clientes"]),
+            "product": pd.Categorical.from_codes(estado["produto"], categories=estado["produtos"]),
+            **{c: np.asarray(estado[c]) for c in PAIR_COLUMNS},
+        }
+    )
+
+
+def _chaves_estagios(chave_brutos: str, params: dict) -> dict:
+    """Chaves de cache dos estágios após os agregados, encadeadas a partir de `chave_brutos`."""
+
+    def _params(estagio):
+        return {p: params.get(p, globals()[p]) for p in ESTAGIOS[estagio]}
+
+    dtype = np.dtype(dtype_esparso(params.get("PRECISAO", PRECISAO))).name
+    k_matriz = chave(chave_brutos, {**_params("matriz"), "dtype": dtype})
+    return {
+        "matriz": k_matriz,
+        **{e: chave(k_matriz, _params(e)) for e in ("indice", "similares", "fatores")},
+    }
+
+
+def _csr(arrays: dict, prefixo: str, shape: tuple) -> csr_matrix:
+    return csr_matrix(
+        (arrays[f"{prefixo}_data"], arrays[f"{prefixo}_indices"], arrays[f"{prefixo}_indptr"]),
+        shape=shape,
+        copy=False,
+    )
+
+
+def _partes_csr(m: csr_matrix, prefixo: str) -> dict:
+    return {f"{prefixo}_{n}": getattr(m, n) for n in ("data", "indices", "indptr")}
+
+
+def construir_modelo(
+    brutos: pd.DataFrame,
+    params: Optional[dict] = None,
+    ancora=None,
+    cache: Optional[CacheEstagios] = None,
+    chave_brutos: Optional[str] = None,
+    somente_matriz: bool = False,
+) -> Modelo:
+    """
+    Gera a matriz cliente×produto normalizada a partir dos agregados por par ainda sem os
+    filtros de suporte/transações (ingest.agregar_vendas_brutas) e ajusta o KNN sobre ela.
+    Os agregados brutos e a data âncora ficam no modelo para atualizações incrementais.
+    Com `cache` e a chave dos agregados (`chave_brutos`), cada estágio seguinte — matriz
+    TF–IDF, índice + grafo kNN, similares e fatores — é lido do cache quando já calculado
+    para os mesmos dados e parâmetros, e gravado nele caso contrário. Com `somente_matriz`,
+    para após a matriz (sem grafo, similares nem fatores), como na avaliação em lote.
+    """
+    params = params or parametros_atuais()
+    precisao = params.get("PRECISAO", PRECISAO)
+    chaves = _chaves_estagios(chave_brutos, params) if cache and chave_brutos else {}
+
+    def _ler(estagio):
+        return cache.ler(estagio, chaves[estagio]) if chaves else None
+
+    def _gravar(estagio, arrays, meta=None):
+        if chaves:
+            cache.gravar(estagio, chaves[estagio], arrays, meta)
+
+    salvo = _ler("matriz")
+    if salvo:
+        arrays, meta = salvo
+        clientes, produtos = Vocabulario(meta["clientes"]), Vocabulario(meta["produtos"])
+        matriz = _csr(arrays, "matriz", tuple(meta["shape"]))
+        compras = {n: arrays[f"compras_{n}"] for n in ("indptr", "produto", "quantidade")}
+        idf, docfreq, normas = arrays["idf"], arrays["docfreq"], arrays["normas"]
+    else:
+        pares = filtrar_pares(
+            brutos, params["MIN_PRODUCT_SUPPORT"], params["MIN_CLIENT_TRANSACTIONS"]
+        )
+        logger.info("Gerando matriz esparsa cliente×produto (weighted_quantity + avg_feedback)")
+        matriz, clientes, produtos = matriz_interacoes(pares)
+
+        logger.info("Aplicando TF–IDF + normalização L2 (esparso, %d não-nulos)", matriz.nnz)
+        idf, docfreq, normas = tfidf_l2_(matriz)
+        matriz = matriz.astype(dtype_esparso(precisao))
+
+        logger.info("Indexando histórico de compras por cliente")
+        compras = indice_compras(
+            clientes.codificar(pares["client"]),
+            produtos.codificar(pares["product"]),
+            pares["quantity"].to_numpy(dtype=np.int64),
+            len(clientes),
+        )
+        _gravar(
+            "matriz",
+            {
+                **_partes_csr(matriz, "matriz"),
+                **{f"compras_{n}": arr for n, arr in compras.items()},
+                "idf": idf,
+                "docfreq": docfreq,
+                "normas": normas,
+            },
+            {
+                "shape": list(matriz.shape),
+                "clientes": clientes.tolist(),
+                "produtos": produtos.tolist(),
+            },
+        )
+
+    indice = _ler("indice")
+    logger.info(
+        "Treinando KNN (K_VIZINHOS=%d, métrica=cosine, backend=%s)",
+        params["K_VIZINHOS"],
+        params.get("ANN_BACKEND", "brute"),
+    )
+    modelo = Modelo(
+        matriz=matriz,
+        clientes=clientes,
+        produtos=produtos,
+        compras=compras,
+        params=dict(params),
+        idf=idf,
+        docfreq=docfreq,
+        normas=normas,
+        estado=_estado_de_pares(brutos, ancora),
+        indice_salvo=(
+            {n: indice[0][f"ann_{n}"] for n in ("centroides", "indptr", "membros")}
+            if indice and "ann_centroides" in indice[0]
+            else None
+        ),
+    )
+    if somente_matriz:
+        return modelo
+    if indice:
+        modelo.grafo = _csr(indice[0], "grafo", (matriz.shape[0], matriz.shape[0]))
+    else:
+        modelo.grafo = grafo_vizinhos(matriz, params["K_VIZINHOS"], indice=modelo.knn)
+        ann_estado = modelo.knn.estado() if isinstance(modelo.knn, ann.IndiceIVF) else {}
+        _gravar(
+            "indice",
+            {
+                **_partes_csr(modelo.grafo, "grafo"),
+                **{f"ann_{n}": a for n, a in ann_estado.items()},
+            },
+        )
+    modelo.grafo_k = params["K_VIZINHOS"]
+
+    salvo = _ler("similares")
+    n_produtos = matriz.shape[1] - 1
+    if salvo:
+        modelo.similares = _csr(salvo[0], "similares", (n_produtos, n_produtos))
+    else:
+        modelo.similares = similaridade_itens(matriz, params.get("ITEM_TOP_N", ITEM_TOP_N))
+        _gravar("similares", _partes_csr(modelo.similares, "similares"))
+
+    salvo = _ler("fatores")
+    if salvo:
+        fatores = salvo[0]["clientes"], salvo[0]["produtos"]
+    else:
+        fatores = fatorar(matriz, params.get("RANK_FATORES", RANK_FATORES))
+        _gravar("fatores", {"clientes": fatores[0], "produtos": fatores[1]})
+    modelo.fatores_clientes, modelo.fatores_produtos = (
+        VetoresQuantizados.de(f, precisao) for f in fatores
+    )
+    logger.info("Modelo KNN treinado")
+    return modelo
+
+
+def construir_de_vendas(
+    caminho: str, params: Optional[dict] = None, cache: Optional[CacheEstagios] = None
+) -> Modelo:
+    """
+    Agrega as vendas de `caminho` e constrói o modelo. Com `cache`, os agregados ficam
+    sob o hash do conteúdo das vendas + parâmetros de recência/quantidade, e os estágios
+    seguintes são encadeados a partir dessa chave (ver construir_modelo).
+    """
+    params = params or parametros_atuais()
+    chave_brutos = salvo = None
+    if cache is not None:
+        chave_brutos = chave(hash_dados(caminho), {p: params.get(p) for p in ESTAGIOS["agregados"]})
+        salvo = cache.ler("agregados", chave_brutos)
+    if salvo:
+        arrays, meta = salvo
+        estado = {**arrays, **meta}
+        brutos, ancora = _pares_de_estado(estado), meta["ancora"]
+    else:
+        brutos, ancora = agregar_vendas_brutas(caminho, params)
+        if cache is not None:
+            estado = _estado_de_pares(brutos, ancora)
+            cache.gravar(
+                "agregados",
+                chave_brutos,
+                {n: estado[n] for n in ["cliente", "produto"] + PAIR_COLUMNS},
+                {n: estado[n] for n in ("clientes", "produtos", "ancora")},
+            )
+    return construir_modelo(brutos, params, ancora, cache, chave_brutos)
+
+
+def _fonte(caminho: str) -> dict:
+    """Identifica as vendas de origem (tamanho e mtime) para invalidar artefatos antigos."""
+    if sales_store.eh_store(caminho):
+        return sales_store.fonte(caminho)
+    st = os.stat(caminho)
+    return {"caminho": os.path.abspath(caminho), "tamanho": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def salvar_modelo(modelo: Modelo, diretorio: str = ARTIFACT_DIR, fonte: Optional[dict] = None):
+    """
+    Grava o artefato do modelo em `diretorio`:
+    - matriz_{data,indices,indptr}.npy: componentes da CSR (memory-mappable),
+    - compras_{indptr,produto,quantidade}.npy: índice do histórico por cliente,
+    - clientes.json / produtos.json: vocabulários,
+    - recs_tabela.npy: tabela de recomendações pré-computada (se houver),
+    - grafo_{data,indices,indptr}.npy: grafo kNN dos clientes (CSR),
+    - similares_{data,indices,indptr}.npy: similaridade item–item (CSR),
+    - fatores_{clientes,produtos}[_escalas].npy: embeddings do modo "fatores" (e escalas
+      por linha, se int8),
+    - tfidf_{idf,docfreq,normas}.npy: estatísticas para atualização incremental,
+    - estado_*.npy / estado_vocab.json: agregados por par sem filtros,
+    - ann_{centroides,indptr,membros}.npy: índice IVF (se ANN_BACKEND = "ivf"),
+    - manifest.json: versão, formato, parâmetros, KNN e origem dos dados.
+    A escrita ocorre em diretório temporário e é trocada atomicamente ao final.
+    """
+    tmp = f"{diretorio}.tmp-{os.getpid()}"
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+
+    m = modelo.matriz
+    np.save(os.path.join(tmp, "matriz_data.npy"), m.data)
+    np.save(os.path.join(tmp, "matriz_indices.npy"), m.indices)
+    np.save(os.path.join(tmp, "matriz_indptr.npy"), m.indptr)
+    for nome, arr in modelo.compras.items():
+        np.save(os.path.join(tmp, f"compras_{nome}.npy"), arr)
+    if modelo.tabela is not None:
+        np.save(os.path.join(tmp, "recs_tabela.npy"), modelo.tabela)
+    for prefixo in ("grafo", "similares"):
+        esparsa = getattr(modelo, prefixo)
+        if esparsa is not None:
+            for nome in ("data", "indices", "indptr"):
+                np.save(os.path.join(tmp, f"{prefixo}_{nome}.npy"), getattr(esparsa, nome))
+    for nome in ("idf", "docfreq", "normas"):
+        np.save(os.path.join(tmp, f"tfidf_{nome}.npy"), getattr(modelo, nome))
+    for nome in ("clientes", "produtos"):
+        vetores = getattr(modelo, f"fatores_{nome}")
+        if vetores is not None:
+            np.save(os.path.join(tmp, f"fatores_{nome}.npy"), vetores.dados)
+            if vetores.escalas is not None:
+                np.save(os.path.join(tmp, f"fatores_{nome}_escalas.npy"), vetores.escalas)
+    if isinstance(modelo.knn, ann.IndiceIVF):
+        for nome, arr in modelo.knn.estado().items():
+            np.save(os.path.join(tmp, f"ann_{nome}.npy"), arr)
+    estado = modelo.estado
+    for nome in ["cliente", "produto"] + PAIR_COLUMNS:
+        np.save(os.path.join(tmp, f"estado_{nome}.npy"), estado[nome])
+    with open(os.path.join(tmp, "estado_vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {"clientes": estado["clientes"], "produtos": estado["produtos"]}, f, ensure_ascii=False
+        )
+    with open(os.path.join(tmp, "clientes.json"), "w", encoding="utf-8") as f:
+        json.dump(modelo.clientes.tolist(), f, ensure_ascii=False)
+    with open(os.path.join(tmp, "produtos.json"), "w", encoding="utf-8") as f:
+        json.dump(modelo.produtos.tolist(), f, ensure_ascii=False)
+
+    manifest = {
+        "versao": ARTIFACT_VERSION,
+        "criado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "shape": list(m.shape),
+        "nnz": int(m.nnz),
+        "dtype": str(m.dtype),
+        "params": modelo.params,
+        "knn": ann.descrever(modelo.knn),
+        "tabela": (
+            {"max_k": modelo.tabela.shape[1], "k_vizinhos": modelo.tabela_k_vizinhos}
+            if modelo.tabela is not None
+            else None
+        ),
+        "grafo": {"k_vizinhos": modelo.grafo_k} if modelo.grafo is not None else None,
+        "similares": (
+            {"top_n": int(np.diff(modelo.similares.indptr).max(initial=0))}
+            if modelo.similares is not None
+            else None
+        ),
+        "fatores": (
+            {
+                "rank": modelo.fatores_produtos.shape[1],
+                "precisao": modelo.fatores_produtos.precisao,
+            }
+            if modelo.fatores_produtos is not None
+            else None
+        ),
+        "ancora": estado["ancora"],
+        "fonte": fonte,
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    old = f"{diretorio}.old-{os.getpid()}"
+    if os.path.isdir(diretorio):
+        os.replace(diretorio, old)
+    os.replace(tmp, diretorio)
+    if os.path.isdir(old):
+        shutil.rmtree(old)
+    logger.info("Artefato do modelo salvo em '%s/'", diretorio)
+
+
+def ler_manifesto(diretorio: str = ARTIFACT_DIR) -> Optional[dict]:
+    """Lê o manifest.json do artefato; None se ausente ou ilegível."""
+    path = os.path.join(diretorio, "manifest.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def artefato_compativel(
+    manifest: Optional[dict], params: dict, fonte: Optional[dict], precompute_k: int = PRECOMPUTE_K
+) -> bool:
+    """Verifica versão, parâmetros de construção e origem dos dados do artefato."""
+    if not manifest or manifest.get("versao") != ARTIFACT_VERSION:
+        return False
+    if any(manifest["params"].get(k) != params.get(k, globals()[k]) for k in BUILD_PARAMS):
+        return False
+    if precompute_k > 0:
+        tabela = manifest.get("tabela") or {}
+        max_k = min(precompute_k, manifest["shape"][1])
+        if tabela.get("k_vizinhos") != params["K_VIZINHOS"] or tabela.get("max_k", 0) < max_k:
+            return False
+    return fonte is None or manifest.get("fonte") == fonte
+
+
+def carregar_modelo(
+    diretorio: str = ARTIFACT_DIR, mmap: bool = True, params: Optional[dict] = None
+) -> Modelo:
+    """
+    Carrega o artefato salvo; com mmap=True os arrays são mapeados do disco.
+    `params` sobrescreve os parâmetros de consulta (K_VIZINHOS, K_RECS) do manifesto.
+    """
+    manifest = ler_manifesto(diretorio)
+    if not manifest or manifest.get("versao") != ARTIFACT_VERSION:
+        raise ValueError(f"Artefato inválido ou de versão incompatível em '{diretorio}'.")
+    mode = "r" if mmap else None
+
+    def _load(nome):
+        return np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode=mode)
 
-logger.info("Mapeando feedback e incluindo avg_feedback")
-feedback_map = {"Excelente": 5, "Bom": 4, "Regular": 3, "Ruim": 2, "Péssimo": 1}
-df_comp["feedback_score"] = df_comp["customerFeedback"].map(feedback_map)
-feedback_avg = df_comp.groupby("client")["feedback_score"].mean().rename("avg_feedback")
-pivot = pivot.merge(feedback_avg, left_index=True, right_index=True)
+    def _vetores(nome):
+        fatores = manifest.get("fatores")
+        if not fatores:
+            return None
+        escalas = _load(f"fatores_{nome}_escalas") if fatores["precisao"] == "int8" else None
+        return VetoresQuantizados(_load(f"fatores_{nome}"), escalas)
 
-dense_matrix = pivot.values
+    matriz = csr_matrix(
+        (_load("matriz_data"), _load("matriz_indices"), _load("matriz_indptr")),
+        shape=tuple(manifest["shape"]),
+        copy=False,
+    )
+    compras = {n: _load(f"compras_{n}") for n in ("indptr", "produto", "quantidade")}
+    with open(os.path.join(diretorio, "clientes.json"), "r", encoding="utf-8") as f:
+        clientes = Vocabulario(json.load(f))
+    with open(os.path.join(diretorio, "produtos.json"), "r", encoding="utf-8") as f:
+        produtos = Vocabulario(json.load(f))
+    with open(os.path.join(diretorio, "estado_vocab.json"), "r", encoding="utf-8") as f:
+        estado = json.load(f)
+    estado.update({n: _load(f"estado_{n}") for n in ["cliente", "produto"] + PAIR_COLUMNS})
+    estado["ancora"] = manifest.get("ancora")
+    params = {**manifest["params"], **(params or {})}
+    tabela = manifest.get("tabela")
+    grafo = manifest.get("grafo")
+    # O IVF salvo é reaproveitado se backend e nº de listas baterem com a configuração
+    knn = manifest.get("knn") or {}
+    indice_salvo = None
+    if params.get("ANN_BACKEND") == "ivf" and knn.get("backend") == "ivf":
+        n_listas = params.get("ANN_LISTS") or ann.listas_padrao(matriz.shape[0])
+        if knn.get("n_listas") == min(n_listas, matriz.shape[0]):
+            indice_salvo = {n: _load(f"ann_{n}") for n in ("centroides", "indptr", "membros")}
+    logger.info("Artefato do modelo carregado de '%s/' (%d×%d)", diretorio, *matriz.shape)
+    return Modelo(
+        matriz=matriz,
+        clientes=clientes,
+        produtos=produtos,
+        compras=compras,
+        params=params,
+        tabela=_load("recs_tabela") if tabela else None,
+        tabela_k_vizinhos=tabela["k_vizinhos"] if tabela else 0,
+        grafo=(
+            csr_matrix(
+                (_load("grafo_data"), _load("grafo_indices"), _load("grafo_indptr")),
+                shape=(matriz.shape[0], matriz.shape[0]),
+                copy=False,
+            )
+            if grafo
+            else None
+        ),
+        grafo_k=grafo["k_vizinhos"] if grafo else 0,
+        similares=(
+            csr_matrix(
+                (_load("similares_data"), _load("similares_indices"), _load("similares_indptr")),
+                shape=(len(produtos) - 1, len(produtos) - 1),
+                copy=False,
+            )
+            if manifest.get("similares")
+            else None
+        ),
+        fatores_clientes=_vetores("clientes"),
+        fatores_produtos=_vetores("produtos"),
+        idf=_load("tfidf_idf"),
+        docfreq=_load("tfidf_docfreq"),
+        normas=_load("tfidf_normas"),
+        estado=estado,
+        indice_salvo=indice_salvo,
+    )
 
-logger.info("Aplicando TF–IDF + normalização L2")
-tfidf_matrix = TfidfTransformer().fit_transform(dense_matrix)
-norm_matrix = normalize(tfidf_matrix, norm="l2", axis=1)
 
-df_sparse = csr_matrix(norm_matrix.toarray())
-tt_clientes = pivot.index.tolist()
-bursos = pivot.columns.tolist()
+def obter_modelo(
+    caminho: Optional[str] = None,
+    diretorio: str = ARTIFACT_DIR,
+    rebuild: bool = False,
+    params: Optional[dict] = None,
+    precompute_k: int = PRECOMPUTE_K,
+    cache_dir: Optional[str] = CACHE_DIR,
+) -> Modelo:
+    """
+    Carrega o artefato se compatível; senão constrói a partir das vendas (reaproveitando
+    os estágios em `cache_dir`, se houver) e o salva. `params` (padrão:
+    parametros_atuais()) e `precompute_k` são a configuração do modelo.
+    """
+    params = params or parametros_atuais()
+    caminho = caminho or caminho_vendas()
+    fonte = _fonte(caminho) if os.path.exists(caminho) else None
+    manifest = ler_manifesto(diretorio)
+    if not rebuild and artefato_compativel(manifest, params, fonte, precompute_k):
+        modelo = carregar_modelo(diretorio, params=params)
+        salvo, atual = manifest.get("knn") or {}, ann.descrever(modelo.knn)
+        regravar = (salvo.get("backend"), salvo.get("n_listas")) != (
+            atual["backend"],
+            atual.get("n_listas"),
+        )
+        if modelo.grafo_k < params["K_VIZINHOS"]:
+            # Grafo kNN não cobre o K_VIZINHOS configurado: refaz só o grafo
+            modelo.grafo = grafo_vizinhos(modelo.matriz, params["K_VIZINHOS"], indice=modelo.knn)
+            modelo.grafo_k, regravar = params["K_VIZINHOS"], True
+        if regravar:
+            # Índice de vizinhos ou grafo trocados na configuração: persiste junto ao artefato
+            salvar_modelo(modelo, diretorio, fonte)
+        return modelo
+    cache = CacheEstagios(cache_dir) if cache_dir else None
+    modelo = construir_de_vendas(caminho, params, cache)
+    if precompute_k > 0:
+        materializar_tabela(modelo, precompute_k, params["K_VIZINHOS"])
+    salvar_modelo(modelo, diretorio, fonte)
+    return modelo
 
-logger.info("Treinando KNN (K_VIZINHOS=%d, métrica=cosine)", K_VIZINHOS)
-knn = NearestNeighbors(n_neighbors=K_VIZINHOS, metric="cosine", algorithm="brute")
-knn.fit(df_sparse)
-logger.info("Modelo KNN treinado")
 
+@dataclass
+class ModeloSobDemanda:
+    """
+    Configuração explícita de um modelo (hiperparâmetros, vendas de origem e diretório do
+    artefato); o Modelo só é carregado ou construído (obter_modelo) no primeiro acesso a
+    `.modelo`. Instâncias com configurações diferentes coexistem no mesmo processo —
+    use um `diretorio` por configuração para que cada uma reaproveite o seu artefato.
+    """
 
-def recomendar_por_cliente(client: str, k_vizinhos: int = K_VIZINHOS, k_recs: int = K_RECS) -> list:
-    if client not in tt_clientes:
+    params: dict
+    caminho: Optional[str] = None
+    diretorio: str = ARTIFACT_DIR
+    rebuild: bool = False
+    precompute_k: int = PRECOMPUTE_K
+    cache_dir: Optional[str] = CACHE_DIR
+    _modelo: Optional[Modelo] = field(default=None, init=False, repr=False)
+    _trava: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    @property
+    def carregado(self) -> bool:
+        return self._modelo is not None
+
+    @property
+    def modelo(self) -> Modelo:
+        if self._modelo is None:
+            with self._trava:
+                if self._modelo is None:
+                    self._modelo = obter_modelo(
+                        self.caminho,
+                        self.diretorio,
+                        self.rebuild,
+                        self.params,
+                        self.precompute_k,
+                        self.cache_dir,
+                    )
+        return self._modelo
+
+    def recomendar(
+        self,
+        client: str,
+        k_vizinhos: Optional[int] = None,
+        k_recs: Optional[int] = None,
+        modo: Optional[str] = None,
+    ) -> list:
+        return recomendar_por_cliente(client, k_vizinhos, k_recs, modo, modelo_ref=self.modelo)
+
+
+def criar_modelo(
+    params: Optional[dict] = None,
+    caminho: Optional[str] = None,
+    diretorio: str = ARTIFACT_DIR,
+    rebuild: bool = False,
+    precompute_k: int = PRECOMPUTE_K,
+    cache_dir: Optional[str] = CACHE_DIR,
+) -> ModeloSobDemanda:
+    """
+    Fábrica de modelos: `params` sobrescreve os padrões do módulo (parametros_atuais())
+    e `caminho` é o CSV/store de vendas (padrão: caminho_vendas()). Não lê nada do
+    disco — o artefato é carregado (ou o modelo construído) só no primeiro uso. Modelos
+    que compartilham `cache_dir` reaproveitam os estágios de build em comum.
+    """
+    desconhecidos = set(params or {}) - set(parametros_atuais())
+    if desconhecidos:
+        raise ValueError(f"Parâmetros desconhecidos: {', '.join(sorted(desconhecidos))}.")
+    return ModeloSobDemanda(
+        {**parametros_atuais(), **(params or {})},
+        caminho,
+        diretorio,
+        rebuild,
+        precompute_k,
+        cache_dir,
+    )
+
+
+def recomendar_por_cliente(
+    client: str,
+    k_vizinhos: Optional[int] = None,
+    k_recs: Optional[int] = None,
+    modo: Optional[str] = None,
+    modelo_ref: Optional[Modelo] = None,
+) -> list:
+    """
+    Top-`k_recs` produtos para o cliente. `modo` (padrão MODO_RECOMENDACAO) escolhe entre
+    "clientes" (soma das linhas dos `k_vizinhos` clientes mais similares), "itens"
+    (vetor de compras do cliente × similaridade item–item) e "fatores" (produto escalar
+    dos embeddings); k_vizinhos só se aplica a "clientes". K_VIZINHOS/K_RECS omitidos
+    vêm dos parâmetros do modelo (padrão: modelo_padrao()).
+    """
+    modo = modo or MODO_RECOMENDACAO
+    if modo not in MODOS_RECOMENDACAO:
+        raise ValueError(f"Modo de recomendação inválido: '{modo}'.")
+    modelo = modelo_ref or modelo_padrao()
+    k_vizinhos = k_vizinhos or modelo.params["K_VIZINHOS"]
+    k_recs = k_recs or modelo.params["K_RECS"]
+    matriz, produtos = modelo.matriz, modelo.produtos
+    idx = modelo.clientes.get(client)
+    if idx < 0:
         logger.error("Cliente não encontrado: %s", client)
         raise ValueError(f"Cliente '{client}' não encontrado.")
-    idx = tt_clientes.index(client)
-    dists, idxs = knn.kneighbors(df_sparse[idx], n_neighbors=k_vizinhos + 1)
-    neighbors = list(idxs[0])
-    if idx in neighbors:
-        neighbors.remove(idx)
-    neighbors = neighbors[:k_vizinhos]
-    scores = np.array(df_sparse[neighbors].sum(axis=0)).ravel()
-    top = np.argsort(scores)[::-1][:k_recs]
-    return [bursos[i] for i in top]
-
-
-def get_client_purchases(client: str) -> list[dict]:
-    if client not in tt_clientes:
+    if modo == "itens":
+        return produtos.decodificar(top_k_linhas(scores_itens(modelo, [idx]), k_recs)[0])
+    if modo == "fatores":
+        return produtos.decodificar(top_k_linhas(scores_fatores(modelo, [idx]), k_recs)[0])
+    tabela = modelo.tabela
+    if tabela is not None and k_vizinhos == modelo.tabela_k_vizinhos and k_recs <= tabela.shape[1]:
+        # Consulta O(1): prefixo da linha pré-computada, sem passar pelo KNN
+        return produtos.decodificar(tabela[idx, :k_recs])
+    if modelo.grafo is not None and k_vizinhos <= modelo.grafo_k:
+        neighbors = vizinhos_do_grafo(modelo.grafo, idx, k_vizinhos)
+    else:
+        dists, idxs = modelo.knn.kneighbors(matriz[idx], n_neighbors=k_vizinhos + 1)
+        neighbors = list(idxs[0])
+        if idx in neighbors:
+            neighbors.remove(idx)
+        neighbors = neighbors[:k_vizinhos]
+    # Soma das linhas dos vizinhos como um único produto linha indicadora × matriz
+    ind = csr_matrix(
+        (np.ones(len(neighbors)), neighbors, [0, len(neighbors)]), shape=(1, matriz.shape[0])
+    )
+    # Mesma ordenação (e desempate) da tabela e de recomendar_em_lote
+    return produtos.decodificar(top_k_linhas((ind @ matriz).toarray(), k_recs)[0])
+
+
+def similaridade_itens(matriz: csr_matrix, top_n: int = ITEM_TOP_N) -> csr_matrix:
+    """
+    Similaridade de cosseno item–item entre as colunas de produtos da matriz (sem
+    avg_feedback), em blocos de BATCH_SIZE produtos, guardando só os `top_n` vizinhos
+    positivos de cada produto (sem o próprio).
+
+    Retorna:
+        CSR (n_produtos, n_produtos).
+    """
+    X = matriz[:, : matriz.shape[1] - 1].tocsc()
+    normas = np.sqrt(np.asarray(X.multiply(X).sum(axis=0)).ravel())
+    normas[normas == 0] = 1.0
+    X = (X @ diags(1 / normas)).tocsr()
+    Xt = X.T.tocsr()
+    n = X.shape[1]
+    k = min(top_n, n - 1)
+    logger.info("Calculando similaridade item–item (%d produtos, top-%d)", n, k)
+    linhas, colunas, valores = [], [], []
+    for ini in range(0, n, BATCH_SIZE):
+        bloco = np.arange(ini, min(ini + BATCH_SIZE, n))
+        sims = (Xt[bloco] @ X).toarray()
+        sims[np.arange(len(bloco)), bloco] = 0.0
+        top = top_k_linhas(sims, k)
+        vals = np.take_along_axis(sims, top, axis=1)
+        manter = vals > 0
+        linhas.append(np.repeat(bloco, manter.sum(axis=1)))
+        colunas.append(top[manter])
+        valores.append(vals[manter])
+    return csr_matrix(
+        (np.concatenate(valores), (np.concatenate(linhas), np.concatenate(colunas))),
+        shape=(n, n),
+    )
+
+
+def scores_itens(m: Modelo, linhas) -> np.ndarray:
+    """Scores do modo item–item: vetores dos clientes (sem avg_feedback) × similares."""
+    x = m.matriz[linhas][:, : m.matriz.shape[1] - 1]
+    return (x @ m.similares).toarray()
+
+
+def fatorar(matriz: csr_matrix, rank: int = RANK_FATORES) -> tuple[np.ndarray, np.ndarray]:
+    """
+    SVD truncada (randomizada) das colunas de produtos da matriz TF–IDF/recência, sem
+    avg_feedback: X ≈ U·Σ·Vᵀ.
+
+    Retorna:
+        (embeddings dos clientes U·Σ, embeddings dos produtos V), ambos float32 C-contíguos,
+        de modo que o score cliente × produto é o produto escalar das linhas (ver
+        quantizacao.VetoresQuantizados para as versões float16/int8).
+    """
+    from sklearn.utils.extmath import randomized_svd
+
+    X = matriz[:, : matriz.shape[1] - 1]
+    rank = max(1, min(rank, min(X.shape) - 1))
+    logger.info("Fatorando a matriz (SVD truncada, rank=%d)", rank)
+    U, S, Vt = randomized_svd(X, rank, random_state=0)
+    return (U * S).astype(np.float32), np.ascontiguousarray(Vt.T, dtype=np.float32)
+
+
+def scores_fatores(m: Modelo, linhas) -> np.ndarray:
+    """
+    Scores do modo "fatores": embeddings dos clientes × embeddings dos produtos, direto
+    nos vetores quantizados (GEMM float32 ou produto int8 acumulado em int32).
+    """
+    return m.fatores_clientes.produto(m.fatores_produtos, linhas)
+
+
+def top_k_linhas(scores: np.ndarray, k: int) -> np.ndarray:
+    """Índices dos k maiores valores de cada linha, em ordem decrescente (ordenação parcial)."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int32)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    ordem = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, ordem, axis=1).astype(np.int32)
+
+
+def vizinhos_bloco(
+    matriz: csr_matrix,
+    linhas: np.ndarray,
+    k_vizinhos: int,
+    consultas: Optional[csr_matrix] = None,
+):
+    """
+    Vizinhos por cosseno de um bloco de linhas via produto esparso X[linhas] · Xᵀ
+    (as linhas já são L2-normalizadas), excluindo o próprio cliente. Com `consultas`,
+    os vetores de consulta vêm dessa matriz (mesma indexação de linhas de `matriz`). Em
+    quantizacao.CSRQuantizada (as duas), o produto roda sobre os dados int8.
+
+    Retorna:
+        (índices int32, similaridades) com shape (len(linhas), k_vizinhos).
+    """
+    fonte = matriz if consultas is None else consultas
+    if isinstance(matriz, CSRQuantizada):
+        sims = fonte.produto(matriz, linhas)
+    else:
+        sims = (fonte[linhas] @ matriz.T).toarray()
+    sims[np.arange(len(linhas)), linhas] = -np.inf
+    idx = top_k_linhas(sims, min(k_vizinhos, matriz.shape[0] - 1))
+    return idx, np.take_along_axis(sims, idx, axis=1)
+
+
+def linhas_por_bloco(n_colunas: int, itemsize: int, n_blocos: int = 1) -> int:
+    """
+    Linhas por bloco de similaridades para que `n_blocos` blocos simultâneos caibam em
+    MEMORIA_BLOCOS_MB: cada linha ocupa o bloco denso, a cópia negada e os índices int64
+    da ordenação parcial em top_k_linhas.
+    """
+    por_linha = n_colunas * (2 * itemsize + 8)
+    return max(1, MEMORIA_BLOCOS_MB * 2**20 // (por_linha * max(1, n_blocos)))
+
+
+def grafo_vizinhos(
+    matriz: csr_matrix,
+    k_vizinhos: int = K_VIZINHOS,
+    linhas: Optional[np.ndarray] = None,
+    consultas: Optional[csr_matrix] = None,
+    indice=None,
+    tamanho_bloco: int = BATCH_SIZE,
+    n_threads: Optional[int] = None,
+) -> csr_matrix:
+    """
+    Grafo kNN esparso: a linha i guarda os top-`k_vizinhos` vizinhos de `linhas[i]`
+    (padrão: todas as linhas) com a similaridade de cosseno como peso, sem o próprio
+    cliente. Os blocos de até `tamanho_bloco` linhas são processados em `n_threads` threads
+    (padrão: N_THREADS, lido na chamada), reduzidos por linhas_por_bloco para que os
+    blocos densos em voo não passem de MEMORIA_BLOCOS_MB; com um índice IVF em `indice`,
+    os vizinhos vêm dele (aproximados) em vez do produto exato. `consultas` é repassado a
+    vizinhos_bloco.
+
+    Retorna:
+        CSR (len(linhas), matriz.shape[0]).
+    """
+    linhas = np.arange(matriz.shape[0]) if linhas is None else np.asarray(linhas, dtype=np.int64)
+    k = min(k_vizinhos, matriz.shape[0] - 1)
+    usar_indice = isinstance(indice, ann.IndiceIVF) and consultas is None
+    n_threads = n_threads or N_THREADS
+    if not usar_indice:
+        fonte = matriz if consultas is None else consultas
+        itemsize = np.result_type(fonte.dtype, matriz.dtype).itemsize
+        tamanho_bloco = min(tamanho_bloco, linhas_por_bloco(matriz.shape[0], itemsize, n_threads))
+
+    def _bloco(ini: int):
+        bloco = linhas[ini : ini + tamanho_bloco]
+        if not usar_indice:
+            return vizinhos_bloco(matriz, bloco, k, consultas)
+        dists, idx = indice.kneighbors(matriz[bloco], n_neighbors=k + 1)
+        # Tira o próprio cliente (se veio entre os k + 1) mantendo a ordem dos demais
+        ordem = np.argsort(idx == bloco[:, None], axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(idx, ordem, axis=1), 1 - np.take_along_axis(dists, ordem, axis=1)
+
+    logger.info(
+        "Construindo grafo kNN (k=%d, %d clientes, %d threads, blocos de %d)",
+        k,
+        len(linhas),
+        n_threads,
+        tamanho_bloco,
+    )
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        partes = list(pool.map(_bloco, range(0, len(linhas), tamanho_bloco)))
+    idx = np.concatenate([p[0] for p in partes]) if partes else np.empty((0, k), dtype=np.int32)
+    sims = np.concatenate([p[1] for p in partes]) if partes else np.empty((0, k))
+    return csr_matrix(
+        (sims.ravel(), idx.ravel(), np.arange(len(linhas) + 1) * k),
+        shape=(len(linhas), matriz.shape[0]),
+    )
+
+
+def vizinhos_do_grafo(grafo: csr_matrix, linha: int, k_vizinhos: int) -> np.ndarray:
+    """Os `k_vizinhos` vizinhos mais similares de `linha` no grafo (prefixo do top-K)."""
+    ini, fim = grafo.indptr[linha], grafo.indptr[linha + 1]
+    viz, sims = grafo.indices[ini:fim], grafo.data[ini:fim]
+    return viz[np.argsort(-sims, kind="stable")[:k_vizinhos]]
+
+
+def _vizinhos_lote(m: Modelo, linhas: np.ndarray, k_vizinhos: int) -> np.ndarray:
+    """Vizinhos de um bloco de linhas: prefixo do grafo kNN quando possível, senão exatos."""
+    if m.grafo is None or k_vizinhos > m.grafo_k:
+        return vizinhos_bloco(m.matriz, linhas, k_vizinhos)[0]
+    g = m.grafo[linhas]  # todas as linhas têm o mesmo nº de vizinhos
+    viz, sims = g.indices.reshape(len(linhas), -1), g.data.reshape(len(linhas), -1)
+    ordem = np.argsort(-sims, axis=1, kind="stable")[:, :k_vizinhos]
+    return np.take_along_axis(viz, ordem, axis=1)
+
+
+def recomendar_em_lote(
+    clients,
+    k_vizinhos: Optional[int] = None,
+    k_recs: Optional[int] = None,
+    tamanho_bloco: int = BATCH_SIZE,
+    modelo_ref: Optional[Modelo] = None,
+    modo: Optional[str] = None,
+) -> np.ndarray:
+    """
+    Recomendações para vários clientes de uma vez, em blocos de `tamanho_bloco` linhas
+    para manter a memória limitada: vizinhos do grafo kNN (ou por produto esparso, se o
+    grafo não cobrir k_vizinhos), soma das linhas dos vizinhos e top-K por ordenação parcial.
+    Nos modos "itens" e "fatores", o score de cada bloco é o produto das linhas dos
+    clientes pela similaridade item–item ou dos embeddings (um GEMM float32 por bloco).
+
+    Retorna:
+        Array int32 (len(clients), k_recs) com códigos de produtos (ver `Modelo.produtos`).
+    """
+    m = modelo_ref or modelo_padrao()
+    k_vizinhos = k_vizinhos or m.params["K_VIZINHOS"]
+    k_recs = k_recs or m.params["K_RECS"]
+    linhas = m.clientes.codificar(clients).astype(np.int64)
+    if (linhas < 0).any():
+        faltando = list(clients)[int(np.argmax(linhas < 0))]
+        raise ValueError(f"Cliente '{faltando}' não encontrado.")
+
+    matriz = m.matriz
+    modo = modo or MODO_RECOMENDACAO
+    n_cols = matriz.shape[1] if modo == "clientes" else matriz.shape[1] - 1
+    out = np.empty((len(linhas), min(k_recs, n_cols)), dtype=np.int32)
+    for ini in range(0, len(linhas), tamanho_bloco):
+        bloco = linhas[ini : ini + tamanho_bloco]
+        if modo != "clientes":
+            scores = scores_itens(m, bloco) if modo == "itens" else scores_fatores(m, bloco)
+            out[ini : ini + len(bloco)] = top_k_linhas(scores, k_recs)
+            continue
+        viz = _vizinhos_lote(m, bloco, k_vizinhos)
+        # Matriz indicadora bloco×clientes: soma das linhas dos vizinhos num só produto
+        ind = csr_matrix(
+            (
+                np.ones(viz.size),
+                viz.ravel(),
+                np.arange(0, viz.size + 1, viz.shape[1]),
+            ),
+            shape=(len(bloco), matriz.shape[0]),
+        )
+        scores = (ind @ matriz).toarray()
+        out[ini : ini + len(bloco)] = top_k_linhas(scores, k_recs)
+    return out
+
+
+def materializar_tabela(modelo_ref: Modelo, max_k: int, k_vizinhos: Optional[int] = None):
+    """
+    Pré-computa as top-`max_k` recomendações de todos os clientes (int32, uma linha por
+    cliente); consultas com k_recs <= max_k são atendidas pelo prefixo da linha.
+    """
+    logger.info("Materializando tabela de recomendações (max_k=%d)", max_k)
+    k_vizinhos = k_vizinhos or modelo_ref.params["K_VIZINHOS"]
+    modelo_ref.tabela = recomendar_em_lote(
+        modelo_ref.clientes, k_vizinhos, max_k, modelo_ref=modelo_ref, modo="clientes"
+    )
+    modelo_ref.tabela_k_vizinhos = k_vizinhos
+
+
+def _reindexar(m: Modelo):
+    """
+    Ajusta o índice de vizinhos à matriz alterada (o IVF mantém os centróides) e refaz
+    o grafo kNN, se houver.
+    """
+    getattr(m.knn, "reatribuir", m.knn.fit)(m.matriz)
+    if m.grafo is not None:
+        m.grafo = grafo_vizinhos(m.matriz, m.grafo_k, indice=m.knn)
+    if m.similares is not None:
+        m.similares = similaridade_itens(m.matriz, m.params.get("ITEM_TOP_N", ITEM_TOP_N))
+    if m.fatores_produtos is not None:
+        # Fold-in: U·Σ = X·V, então novas linhas são projetadas nos fatores de produtos
+        x = m.matriz[:, : m.matriz.shape[1] - 1]
+        m.fatores_clientes = VetoresQuantizados.de(
+            x @ m.fatores_produtos.linhas(), m.fatores_clientes.precisao
+        )
+
+
+def remendar_grafo(
+    grafo: csr_matrix, matriz: csr_matrix, alteradas: np.ndarray, k_vizinhos: int
+) -> tuple[csr_matrix, np.ndarray]:
+    """
+    Grafo kNN de `matriz` quando só as linhas `alteradas` mudaram (linhas novas, ao final
+    da matriz, entram em `alteradas`): elas são recalculadas por completo e, nas demais, os
+    vizinhos alterados saem e as similaridades novas entram onde superam o k-ésimo vizinho
+    restante. Se um vizinho alterado se afastou a ponto de o k-ésimo ficar abaixo do
+    anterior, a linha pode ter perdido candidatos não vistos e também é recalculada — o
+    resultado é o de grafo_vizinhos sobre a matriz inteira.
+
+    Retorna:
+        (grafo, códigos das linhas cujos vizinhos — ou a ordem deles — mudaram)
+    """
+    n, n_antigo = matriz.shape[0], grafo.shape[0]
+    k = min(k_vizinhos, n - 1)
+    if n_antigo == 0 or grafo.indptr[1] != k:
+        return grafo_vizinhos(matriz, k_vizinhos), np.arange(n)
+    viz = np.zeros((n, k), dtype=grafo.indices.dtype)
+    sims = np.full((n, k), -np.inf, dtype=grafo.data.dtype)
+    viz[:n_antigo] = grafo.indices.reshape(n_antigo, k)
+    sims[:n_antigo] = grafo.data.reshape(n_antigo, k)
+    antes, limiar = viz.copy(), sims[:, -1].copy()
+    alterada = np.zeros(n, dtype=bool)
+    alterada[alteradas] = True
+    sims[alterada[viz]] = -np.inf  # voltam abaixo com a similaridade nova
+
+    novos_viz, novos_sims = [], []
+    passo = min(BATCH_SIZE, linhas_por_bloco(n, sims.itemsize, 2))
+    for ini in range(0, len(alteradas), passo):
+        bloco = alteradas[ini : ini + passo]
+        s = (matriz[bloco] @ matriz.T).toarray().astype(sims.dtype, copy=False)
+        s[np.arange(len(bloco)), bloco] = -np.inf
+        top = top_k_linhas(s, k)
+        novos_viz.append(top)
+        novos_sims.append(np.take_along_axis(s, top, axis=1))
+        # Similaridade (simétrica) das linhas do bloco como candidata de todas as outras
+        cand_viz = np.concatenate([viz, np.broadcast_to(bloco, (n, len(bloco)))], axis=1)
+        cand = np.concatenate([sims, s.T], axis=1)
+        sel = top_k_linhas(cand, k)
+        viz = np.take_along_axis(cand_viz, sel, axis=1).astype(antes.dtype)
+        sims = np.take_along_axis(cand, sel, axis=1)
+    if len(alteradas):
+        viz[alteradas] = np.concatenate(novos_viz)
+        sims[alteradas] = np.concatenate(novos_sims)
+
+    refazer = np.flatnonzero(~alterada & (sims[:, -1] < limiar))
+    if len(refazer):
+        g = grafo_vizinhos(matriz, k, linhas=refazer)
+        viz[refazer] = g.indices.reshape(len(refazer), k)
+        sims[refazer] = g.data.reshape(len(refazer), k)
+    logger.info(
+        "Grafo kNN remendado (%d linhas alteradas, %d recalculadas por vizinhos perdidos)",
+        len(alteradas),
+        len(refazer),
+    )
+    mudaram = np.flatnonzero((viz != antes).any(axis=1) | (np.arange(n) >= n_antigo))
+    grafo = csr_matrix((sims.ravel(), viz.ravel(), np.arange(n + 1) * k), shape=(n, n))
+    return grafo, mudaram
+
+
+def _reindexar_linhas(m: Modelo, alteradas: np.ndarray, n_antigo: int):
+    """
+    Versão incremental de _reindexar para atualizar_modelo: o grafo kNN é remendado só nas
+    linhas `alteradas` e nos vizinhos delas (refeito inteiro se passarem de
+    REGRAFO_FRACTION dos clientes), e a tabela pré-computada só é recalculada para os
+    clientes cujos vizinhos mudaram ou incluem uma linha alterada. `similares` fica como
+    está até a próxima reconstrução (o suporte item–item de um dia de vendas é marginal).
+    """
+    getattr(m.knn, "reatribuir", m.knn.fit)(m.matriz)
+    n = m.matriz.shape[0]
+    refazer_tabela = m.grafo is None or m.tabela_k_vizinhos > m.grafo_k
+    if m.grafo is not None:
+        if len(alteradas) > REGRAFO_FRACTION * n:
+            m.grafo = grafo_vizinhos(m.matriz, m.grafo_k, indice=m.knn)
+            refazer_tabela = True
+        else:
+            m.grafo, mudaram = remendar_grafo(m.grafo, m.matriz, alteradas, m.grafo_k)
+    if m.fatores_produtos is not None:
+        # Fold-in: U·Σ = X·V, então novas linhas são projetadas nos fatores de produtos
+        x = m.matriz[:, : m.matriz.shape[1] - 1]
+        m.fatores_clientes = VetoresQuantizados.de(
+            x @ m.fatores_produtos.linhas(), m.fatores_clientes.precisao
+        )
+    if m.tabela is None:
+        return
+    if refazer_tabela:
+        materializar_tabela(m, m.tabela.shape[1], m.tabela_k_vizinhos)
+        return
+    alterada = np.zeros(n, dtype=bool)
+    alterada[alteradas] = True
+    viz = _vizinhos_lote(m, np.arange(n), m.tabela_k_vizinhos)
+    linhas = np.union1d(mudaram, np.flatnonzero(alterada[viz].any(axis=1)))
+    tabela = np.empty((n, m.tabela.shape[1]), dtype=np.int32)
+    tabela[:n_antigo] = m.tabela
+    tabela[linhas] = recomendar_em_lote(
+        m.clientes.decodificar(linhas),
+        m.tabela_k_vizinhos,
+        m.tabela.shape[1],
+        modelo_ref=m,
+        modo="clientes",
+    )
+    m.tabela = tabela
+    logger.info("Tabela de recomendações atualizada em %d de %d clientes", len(linhas), n)
+
+
+def atualizar_modelo(new_rows: pd.DataFrame, modelo_ref: Optional[Modelo] = None) -> Modelo:
+    """
+    Incorpora vendas novas sem reler a fonte: soma os agregados por par no estado,
+    recalcula suporte de produtos e transações por cliente, reescreve só as linhas dos
+    clientes afetados (e as que mudam com o IDF) e atualiza IDF e normas; o grafo kNN e a
+    tabela pré-computada são remendados só onde essas linhas alcançam (ver
+    _reindexar_linhas). Se o conjunto de produtos mudar ou mais de REBUILD_FRACTION dos
+    clientes entrarem no filtro, reconstrói a partir dos agregados.
+    A recência das vendas novas usa a data âncora do modelo (no modo hiperbólico, vendas
+    posteriores a ela têm peso 1).
+
+    Como em reancorar_modelo, o modelo recebido não é alterado: a atualização é feita numa
+    cópia, que quem serve o modelo troca pela antiga (sem `modelo_ref`, a cópia passa a ser
+    o modelo padrão).
+
+    Retorna:
+        O modelo atualizado (o próprio modelo recebido se não houver vendas válidas).
+    """
+    m = modelo_ref or modelo_padrao()
+    p = m.params
+    novos = new_rows[new_rows["quantity"] >= p["MIN_QUANTITY"]].copy()
+    if novos.empty:
+        return m
+    ancora = pd.Timestamp(m.estado["ancora"])
+    novos["date"] = pd.to_datetime(novos["date"])
+    dias = (ancora - novos["date"]).dt.days
+    modo = p.get("RECENCY_MODE", "hiperbolico")
+    if modo != "exponencial":
+        dias = dias.clip(lower=0)
+    novos["weighted_quantity"] = novos["quantity"] * peso_recencia(dias, p["ALPHA"], modo)
+    novos["feedback_score"] = novos["customerFeedback"].map(FEEDBACK_MAP).astype("float64")
+    delta = agregar_pares(novos)
+
+    brutos = mesclar_pares(_pares_de_estado(m.estado), delta)
+    pares = filtrar_pares(brutos, p["MIN_PRODUCT_SUPPORT"], p["MIN_CLIENT_TRANSACTIONS"])
+    entrantes = [c for c in pares["client"].cat.categories if c not in m.clientes]
+    if list(pares["product"].cat.categories) != m.produtos.tolist()[:-1] or len(
+        entrantes
+    ) > REBUILD_FRACTION * len(m.clientes):
+        logger.info("Filtros mudaram muitas linhas/colunas — reconstruindo dos agregados")
+        novo = construir_modelo(brutos, p, ancora)
+        if m.tabela is not None:
+            materializar_tabela(novo, m.tabela.shape[1], m.tabela_k_vizinhos)
+    else:
+        # Cópia rasa: os campos trocados abaixo recebem arrays novos, o vocabulário é copiado
+        novo = replace(
+            m,
+            clientes=Vocabulario(m.clientes.nomes),
+            indice_salvo=m.knn.estado() if isinstance(m.knn, ann.IndiceIVF) else None,
+        )
+        n_antigo = len(m.clientes)
+        alteradas = _atualizar_linhas(novo, pares, delta, entrantes)
+        novo.estado = _estado_de_pares(brutos, ancora)
+        _reindexar_linhas(novo, alteradas, n_antigo)
+
+    logger.info("Modelo atualizado com %d vendas novas", len(novos))
+    if modelo_ref is None:
+        with _trava_padrao:
+            if _padrao is not None and _padrao._modelo is m:
+                _padrao._modelo = novo
+    return novo
+
+
+def reancorar_modelo(agora=None, modelo_ref: Optional[Modelo] = None) -> Optional[Modelo]:
+    """
+    No modo de recência exponencial, devolve uma cópia do modelo com a data âncora avançada
+    até `agora` (padrão: o instante atual), sem reconstruí-lo: todos os pesos de vendas caem
+    pelo mesmo fator exp(-ALPHA·Δdias), então basta reescalar as colunas de produtos
+    (avg_feedback não decai) a partir das normas salvas e renormalizar as linhas — O(nnz).
+
+    O modelo recebido não é alterado: quem o serve troca a referência pela cópia (uma
+    atribuição, atômica), então consultas concorrentes veem o modelo antigo ou o novo
+    inteiro, nunca matriz, normas e tabela misturadas. Sem `modelo_ref`, a cópia passa a
+    ser o modelo padrão.
+
+    Retorna:
+        O modelo re-ancorado, ou None no modo hiperbólico ou sem dias a avançar.
+    """
+    m = modelo_ref or modelo_padrao()
+    if m.params.get("RECENCY_MODE") != "exponencial" or not (m.estado and m.estado["ancora"]):
+        return None
+    ancora = pd.Timestamp(m.estado["ancora"])
+    dias = ((pd.Timestamp(agora) if agora is not None else pd.Timestamp.now()) - ancora).days
+    if dias <= 0:
+        return None
+    fator = float(peso_recencia(dias, m.params["ALPHA"], "exponencial"))
+
+    matriz = m.matriz
+    data = np.asarray(matriz.data, dtype=np.float64) * np.repeat(
+        np.asarray(m.normas), np.diff(matriz.indptr)
+    )
+    data[matriz.indices < matriz.shape[1] - 1] *= fator
+    nova = csr_matrix((data, np.array(matriz.indices), np.array(matriz.indptr)), shape=matriz.shape)
+    normas = normalizar_linhas_(nova)
+    # Índice novo (o IVF parte dos centróides atuais e só tem as listas reatribuídas)
+    novo = replace(
+        m,
+        matriz=nova.astype(matriz.dtype),
+        normas=normas,
+        estado={
+            **m.estado,
+            "weighted_quantity": np.asarray(m.estado["weighted_quantity"]) * fator,
+            "ancora": (ancora + pd.Timedelta(days=dias)).isoformat(),
+        },
+        indice_salvo=m.knn.estado() if isinstance(m.knn, ann.IndiceIVF) else None,
+    )
+    _reindexar(novo)
+    if novo.tabela is not None:
+        materializar_tabela(novo, novo.tabela.shape[1], novo.tabela_k_vizinhos)
+    logger.info(
+        "Recência re-ancorada em %s (+%d dias, fator %.4g)", novo.estado["ancora"], dias, fator
+    )
+    if modelo_ref is None:
+        with _trava_padrao:
+            if _padrao is not None and _padrao._modelo is m:
+                _padrao._modelo = novo
+    return novo
+
+
+def _atualizar_linhas(
+    m: Modelo, pares: pd.DataFrame, delta: pd.DataFrame, entrantes: list
+) -> np.ndarray:
+    """
+    Reescreve as linhas dos clientes afetados por `delta` e ajusta IDF/normas.
+
+    Retorna:
+        Códigos das linhas cujo vetor mudou: as afetadas e as que têm alguma coluna de IDF
+        alterado (todas, se entrarem clientes novos, pois o IDF depende do nº de clientes).
+    """
+    n_antigo = len(m.clientes)
+    m.clientes.adicionar(entrantes)  # clientes novos entram ao final; códigos antigos mantidos
+    n, n_cols = len(m.clientes), m.matriz.shape[1]
+
+    nomes = set(delta["client"].astype(str)) & set(pares["client"].cat.categories)
+    sub = pares[pares["client"].isin(nomes)]
+    linhas = m.clientes.codificar(sub["client"])
+    afetadas = np.unique(linhas)
+    fb_sum = np.bincount(linhas, weights=sub["feedback_sum"].to_numpy(), minlength=n)[afetadas]
+    fb_cnt = np.bincount(linhas, weights=sub["feedback_n"].to_numpy(), minlength=n)[afetadas]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_feedback = fb_sum / fb_cnt
+    tf = coo_matrix(
+        (
+            np.concatenate([sub["weighted_quantity"].to_numpy(dtype=np.float64), avg_feedback]),
+            (
+                np.concatenate([linhas, afetadas]),
+                np.concatenate(
+                    [m.produtos.codificar(sub["product"]), np.full(len(afetadas), n_cols - 1)]
+                ),
+            ),
+        ),
+        shape=(n, n_cols),
+    ).tocsr()
+    tf.eliminate_zeros()
+
+    # Linhas antigas mantidas (as afetadas saem e voltam recalculadas)
+    velha = m.matriz.tocoo()
+    manter = ~np.isin(velha.row, afetadas)
+    antigas = afetadas[afetadas < n_antigo]
+    docfreq = np.asarray(m.docfreq, dtype=np.int64).copy()
+    docfreq -= np.bincount(m.matriz[antigas].indices, minlength=n_cols)
+    docfreq += np.bincount(tf.indices, minlength=n_cols)
+    idf = calcular_idf(docfreq, n)
+
+    data = velha.data[manter].astype(np.float64)
+    rows, cols = velha.row[manter], velha.col[manter]
+    normas = np.ones(n)
+    normas[:n_antigo] = m.normas
+    alteradas = afetadas
+    if not np.allclose(idf, m.idf):
+        mudou = ~np.isclose(idf, m.idf)
+        alteradas = np.union1d(afetadas, rows[mudou[cols]])
+        # Reescala as demais linhas pelo novo IDF a partir das normas salvas
+        data *= normas[rows] * (idf / m.idf)[cols]
+        parcial = csr_matrix((data, (rows, cols)), shape=(n, n_cols))
+        normas = normalizar_linhas_(parcial)
+        velha = parcial.tocoo()
+        data, rows, cols = velha.data, velha.row, velha.col
+
+    tf.data *= idf[tf.indices]
+    normas[afetadas] = normalizar_linhas_(tf)[afetadas]
+    nova = tf.tocoo()
+    m.matriz = csr_matrix(
+        (
+            np.concatenate([data, nova.data]),
+            (np.concatenate([rows, nova.row]), np.concatenate([cols, nova.col])),
+        ),
+        shape=(n, n_cols),
+    ).astype(m.matriz.dtype)
+    m.idf, m.docfreq, m.normas = idf, docfreq, normas
+    m.compras = indice_compras(
+        m.clientes.codificar(pares["client"]),
+        m.produtos.codificar(pares["product"]),
+        pares["quantity"].to_numpy(dtype=np.int64),
+        n,
+    )
+    return alteradas
+
+
+def _faixa_compras(client: str, m: Modelo) -> tuple[int, int]:
+    idx = m.clientes.get(client)
+    if idx < 0:
         raise ValueError(f"Cliente '{client}' não encontrado.")
-    df_c = df_comp[df_comp["client"] == client]
-    df_s = df_c.sort_values("quantity", ascending=False)
-    return df_s[["product", "quantity"]].to_dict("records")
+    indptr = m.compras["indptr"]
+    return int(indptr[idx]), int(indptr[idx + 1])
+
+
+def get_client_purchases(
+    client: str,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    modelo_ref: Optional[Modelo] = None,
+) -> list[dict]:
+    """
+    Histórico de compras do cliente, uma linha por produto com a quantidade total
+    (maior primeiro), como fatia do índice.
+    `offset`/`limit` paginam o resultado sem materializar o histórico inteiro.
+    """
+    m = modelo_ref or modelo_padrao()
+    ini, fim = _faixa_compras(client, m)
+    ini = min(ini + max(offset, 0), fim)
+    if limit is not None:
+        fim = min(fim, ini + max(limit, 0))
+    compras = m.compras
+    return [
+        {"product": p, "quantity": int(q)}
+        for p, q in zip(
+            m.produtos.decodificar(compras["produto"][ini:fim]), compras["quantidade"][ini:fim]
+        )
+    ]
+
+
+def count_client_purchases(client: str, modelo_ref: Optional[Modelo] = None) -> int:
+    """Número de produtos no histórico do cliente (para paginação)."""
+    ini, fim = _faixa_compras(client, modelo_ref or modelo_padrao())
+    return fim - ini
+
+
+# === Modelo padrão (configuração do módulo), criado no primeiro uso ===
+_padrao: Optional[ModeloSobDemanda] = None
+_trava_padrao = threading.Lock()
+
+
+def configurar_padrao(
+    best_params: Optional[str] = None, rebuild: bool = False, precompute_k: Optional[int] = None
+) -> ModeloSobDemanda:
+    """
+    (Re)define o modelo padrão: constantes do módulo sobrescritas pelo best_params.json
+    (ver ler_best_params). O modelo em si só é carregado no primeiro uso.
+    """
+    global _padrao
+    padrao = criar_modelo(
+        ler_best_params(best_params),
+        rebuild=rebuild,
+        precompute_k=PRECOMPUTE_K if precompute_k is None else precompute_k,
+    )
+    with _trava_padrao:
+        _padrao = padrao
+    return padrao
+
+
+def modelo_padrao() -> Modelo:
+    """Modelo usado pelas funções chamadas sem `modelo_ref`."""
+    with _trava_padrao:
+        padrao = _padrao
+    return (padrao or configurar_padrao()).modelo
+
+
+def parser_modelo() -> argparse.ArgumentParser:
+    """Flags de configuração do modelo padrão, compartilhadas por ai.py, app.py e evaluate_v2.py."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        "-f",
+        "--best-params",
+        help="Caminho para JSON com melhores parâmetros (precision@K, recall@K, params)",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Ignora o artefato salvo e reconstrói o modelo a partir do CSV",
+    )
+    parser.add_argument(
+        "--update",
+        metavar="CSV",
+        help="Acrescenta as vendas do CSV à fonte e atualiza o modelo incrementalmente",
+    )
+    parser.add_argument(
+        "--precompute",
+        type=int,
+        metavar="MAX_K",
+        help="Materializa as top-MAX_K recomendações de todos os clientes no artefato",
+    )
+    return parser
+
+
+def configurar_de_argv(argv: Optional[list] = None):
+    """
+    Configura o modelo padrão a partir das flags de parser_modelo() em `argv` (padrão:
+    sys.argv), com parse_known_args para não interferir em outros usos de argparse.
+
+    Retorna:
+        (ModeloSobDemanda padrão, argumentos lidos)
+    """
+    args, _ = parser_modelo().parse_known_args(argv)
+    return configurar_padrao(args.best_params, args.rebuild, args.precompute), args
+
+
+def __getattr__(nome: str):
+    """
+    Nomes legados do modelo padrão, sob demanda: modelo, df_sparse, tt_clientes, knn e
+    bursos (nome antigo de Modelo.produtos, mantido só para compatibilidade).
+    """
+    campos = {
+        "df_sparse": "matriz",
+        "tt_clientes": "clientes",
+        "bursos": "produtos",
+        "knn": "knn",
+    }
+    if nome == "modelo":
+        return modelo_padrao()
+    if nome in campos:
+        return getattr(modelo_padrao(), campos[nome])
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
 
 
 if __name__ == "__main__":
-    sample = tt_clientes[0] if tt_clientes else None
+    configurar_logging()
+    padrao, args = configurar_de_argv()
+    modelo = padrao.modelo
+    if args.update:
+        fonte_vendas = caminho_vendas()
+        novas_vendas = carregar_vendas(args.update)
+        anexar_vendas(novas_vendas, fonte_vendas)
+        modelo = atualizar_modelo(novas_vendas, modelo)
+        salvar_modelo(modelo, padrao.diretorio, _fonte(fonte_vendas))
+    sample = modelo.clientes[0] if len(modelo.clientes) else None
     if sample:
         print(f"Recomendações para {sample}:")
-        print(recomendar_por_cliente(sample))
+        print(recomendar_por_cliente(sample, modelo_ref=modelo))
@@ -0,0 +1,176 @@
+"""
+ann.py
+
+Busca aproximada de vizinhos por cosseno (IVF) em NumPy puro, como alternativa ao
+NearestNeighbors(algorithm="brute") do scikit-learn. As linhas (já L2-normalizadas) são
+agrupadas por k-means esférico em `n_listas` listas invertidas; cada consulta compara o
+vetor só com os clientes das `n_sondas` listas de centróide mais próximo. `n_listas` e
+`n_sondas` são os ajustes de recall × latência (n_sondas = n_listas equivale à busca exata).
+
+A interface segue a do NearestNeighbors (fit/kneighbors com distância 1 - cosseno), então
+ai.py troca o backend só pela configuração (ANN_BACKEND).
+"""
+
+import logging
+import numpy as np
+from scipy.sparse import csr_matrix
+
+BACKENDS = ("brute", "ivf")
+N_ITER = 10  # iterações do k-means esférico
+AMOSTRA_TREINO = 50_000  # máx. linhas usadas para treinar os centróides
+BLOCO = 8192  # linhas por bloco na atribuição às listas
+
+logger = logging.getLogger(__name__)
+
+
+def listas_padrao(n: int) -> int:
+    """Nº de listas quando não configurado: ~sqrt(n), como de costume em índices IVF."""
+    return max(1, int(round(np.sqrt(n))))
+
+
+def _atribuir(X: csr_matrix, centroides: np.ndarray) -> np.ndarray:
+    """Lista (centróide de maior cosseno) de cada linha, em blocos de BLOCO linhas."""
+    out = np.empty(X.shape[0], dtype=np.int32)
+    for ini in range(0, X.shape[0], BLOCO):
+        out[ini : ini + BLOCO] = np.asarray(X[ini : ini + BLOCO] @ centroides.T).argmax(axis=1)
+    return out
+
+
+def _normalizar(c: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(c, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return c / normas
+
+
+def kmeans_esferico(X: csr_matrix, n_listas: int, n_iter: int = N_ITER, semente: int = 0):
+    """Centróides unitários (n_listas × n_colunas) por k-means com similaridade de cosseno."""
+    rng = np.random.default_rng(semente)
+    if X.shape[0] > AMOSTRA_TREINO:
+        X = X[np.sort(rng.choice(X.shape[0], AMOSTRA_TREINO, replace=False))]
+    n_listas = min(n_listas, X.shape[0])
+    centroides = X[rng.choice(X.shape[0], n_listas, replace=False)].toarray()
+    for _ in range(n_iter):
+        rotulos = _atribuir(X, centroides)
+        # Soma das linhas por lista via matriz indicadora (listas × linhas)
+        ind = csr_matrix(
+            (np.ones(len(rotulos)), (rotulos, np.arange(len(rotulos)))),
+            shape=(n_listas, X.shape[0]),
+        )
+        soma = np.asarray((ind @ X).todense())
+        vazias = np.flatnonzero(np.bincount(rotulos, minlength=n_listas) == 0)
+        if len(vazias):
+            # Listas vazias recebem linhas aleatórias para não desperdiçar centróides
+            soma[vazias] = X[rng.choice(X.shape[0], len(vazias), replace=False)].toarray()
+        centroides = _normalizar(soma)
+    return centroides
+
+
+class IndiceIVF:
+    """
+    Índice de listas invertidas sobre uma CSR de linhas L2-normalizadas.
+    - fit(X): treina os centróides e distribui as linhas nas listas.
+    - reatribuir(X): redistribui as linhas de X (ex.: após atualizar_modelo) mantendo os
+      centróides, sem retreinar.
+    - kneighbors(X, n_neighbors): (distâncias 1 - cosseno, índices), mais próximos primeiro.
+    """
+
+    def __init__(
+        self, n_neighbors: int = 5, n_listas: int = 0, n_sondas: int = 8, semente: int = 0
+    ):
+        self.n_neighbors = n_neighbors
+        self.n_listas = n_listas
+        self.n_sondas = n_sondas
+        self.semente = semente
+        self.centroides = None
+        self.indptr = None  # offsets das listas em `membros` (estilo CSR)
+        self.membros = None  # códigos das linhas agrupados por lista
+        self._X = None
+
+    def fit(self, X: csr_matrix) -> "IndiceIVF":
+        n_listas = self.n_listas or listas_padrao(X.shape[0])
+        logger.info("Treinando índice IVF (%d listas, %d sondas)", n_listas, self.n_sondas)
+        self.centroides = kmeans_esferico(X, n_listas, semente=self.semente)
+        return self.reatribuir(X)
+
+    def reatribuir(self, X: csr_matrix) -> "IndiceIVF":
+        if self.centroides is None or self.centroides.shape[1] != X.shape[1]:
+            return self.fit(X)
+        rotulos = _atribuir(X, self.centroides)
+        self.membros = np.argsort(rotulos, kind="stable").astype(np.int32)
+        self.indptr = np.zeros(len(self.centroides) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rotulos, minlength=len(self.centroides)), out=self.indptr[1:])
+        self._X = X
+        return self
+
+    def kneighbors(self, X, n_neighbors: int = None, return_distance: bool = True):
+        k = min(n_neighbors or self.n_neighbors, self._X.shape[0])
+        X = csr_matrix(X)
+        ordem_listas = np.argsort(-np.asarray(X @ self.centroides.T), axis=1)
+        tam = np.diff(self.indptr)
+        dists = np.full((X.shape[0], k), np.inf)
+        idxs = np.zeros((X.shape[0], k), dtype=np.int64)
+        for i, ordem in enumerate(ordem_listas):
+            # Sonda n_sondas listas, e mais se ainda não houver k candidatos
+            n = max(self.n_sondas, int(np.searchsorted(np.cumsum(tam[ordem]), k)) + 1)
+            cand = np.concatenate(
+                [self.membros[self.indptr[l] : self.indptr[l + 1]] for l in ordem[:n]]
+            )
+            sims = np.asarray((X[i] @ self._X[cand].T).todense()).ravel()
+            top = np.argpartition(-sims, min(k, len(cand)) - 1)[:k]
+            top = top[np.argsort(-sims[top], kind="stable")]
+            dists[i, : len(top)] = 1 - sims[top]
+            idxs[i, : len(top)] = cand[top]
+        return (dists, idxs) if return_distance else idxs
+
+    def estado(self) -> dict:
+        """Arrays a persistir junto ao artefato do modelo."""
+        return {"centroides": self.centroides, "indptr": self.indptr, "membros": self.membros}
+
+    @classmethod
+    def restaurar(cls, estado: dict, X: csr_matrix, **kwargs) -> "IndiceIVF":
+        """Reconstrói o índice a partir do estado salvo, sem treinar nem reatribuir."""
+        indice = cls(**kwargs)
+        indice.centroides = np.asarray(estado["centroides"])
+        indice.indptr = estado["indptr"]
+        indice.membros = estado["membros"]
+        indice._X = X
+        return indice
+
+
+def criar_indice(params: dict, matriz: csr_matrix, estado: dict = None):
+    """
+    Índice de vizinhos conforme params["ANN_BACKEND"], já ajustado a `matriz`:
+    - "brute": NearestNeighbors exato do scikit-learn;
+    - "ivf": IndiceIVF com ANN_LISTS/ANN_PROBES, restaurado de `estado` se fornecido.
+    """
+    backend = params.get("ANN_BACKEND", "brute")
+    if backend not in BACKENDS:
+        raise ValueError(f"ANN_BACKEND inválido: '{backend}' (use {' ou '.join(BACKENDS)}).")
+    if backend == "brute":
+        from sklearn.neighbors import NearestNeighbors  # importado só quando usado (~1 s)
+
+        # Com algorithm="brute" o fit apenas referencia a matriz (custo O(1))
+        return NearestNeighbors(
+            n_neighbors=params["K_VIZINHOS"], metric="cosine", algorithm="brute"
+        ).fit(matriz)
+    kwargs = {
+        "n_neighbors": params["K_VIZINHOS"],
+        "n_listas": params.get("ANN_LISTS", 0),
+        "n_sondas": params.get("ANN_PROBES", 8),
+    }
+    if estado is not None:
+        return IndiceIVF.restaurar(estado, matriz, **kwargs)
+    return IndiceIVF(**kwargs).fit(matriz)
+
+
+def descrever(indice) -> dict:
+    """Resumo do índice para o manifesto do artefato."""
+    if isinstance(indice, IndiceIVF):
+        return {
+            "backend": "ivf",
+            "n_neighbors": indice.n_neighbors,
+            "metric": "cosine",
+            "n_listas": len(indice.centroides),
+            "n_sondas": indice.n_sondas,
+        }
+    return {"backend": "brute", "n_neighbors": indice.n_neighbors, "metric": "cosine"}
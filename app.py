@@ -4,37 +4,94 @@ app.py
 Aplicação Flask que fornece:
 - Interface web para selecionar clientes e visualizar recomendações e histórico de compras.
 - Endpoint RESTful (/api/recommend) para obter recomendações via JSON.
+
+Com `--precompute MAX_K` as recomendações vêm da tabela pré-computada no artefato do modelo.
+Com RECENCY_MODE = "exponencial", uma thread em segundo plano re-ancora a recência no dia
+corrente (sem reconstruir o modelo) e troca a referência do modelo servido; as requisições
+não pagam o custo da re-ancoragem e cada uma usa um único modelo do início ao fim.
 """
 
+import threading
+import time
 from flask import Flask, jsonify, request, render_template
-from ai import recomendar_por_cliente, K_VIZINHOS, K_RECS, localidades, get_client_purchases
+from ai import (
+    MODOS_RECOMENDACAO,
+    configurar_de_argv,
+    configurar_logging,
+    recomendar_por_cliente,
+    get_client_purchases,
+    count_client_purchases,
+    reancorar_modelo,
+)
 
 # Inicializa a aplicação Flask
 enable_debug = True  # Ative em desenvolvimento
 app = Flask(__name__)
 app.config["DEBUG"] = enable_debug
 
+# Modelo servido (flags -f/--rebuild/--precompute), carregado na inicialização do servidor
+configurar_logging()
+modelo = configurar_de_argv()[0].modelo
+K_VIZINHOS, K_RECS = modelo.params["K_VIZINHOS"], modelo.params["K_RECS"]
+
+# Lista do dropdown ordenada uma única vez (o vocabulário já faz a busca O(1) por nome)
+CLIENTES_ORDENADOS = sorted(modelo.clientes)
+HISTORY_PAGE_SIZE = 50  # compras por página no histórico
+REANCORAGEM_INTERVALO = 3600  # segundos entre verificações da data âncora da recência
+
+
+def reancorar_periodicamente():
+    """
+    Mantém a recência do modelo ancorada no dia atual: o modelo re-ancorado é construído
+    aqui, fora das requisições, e publicado trocando a referência global `modelo`.
+    """
+    global modelo
+    while True:
+        try:
+            novo = reancorar_modelo(modelo_ref=modelo)
+            if novo is not None:
+                modelo = novo
+        except Exception:
+            app.logger.exception("Falha ao re-ancorar a recência do modelo")
+        time.sleep(REANCORAGEM_INTERVALO)
+
+
+if modelo.params.get("RECENCY_MODE") == "exponencial":
+    threading.Thread(target=reancorar_periodicamente, name="reancoragem", daemon=True).start()
+
 
 @app.route("/")
 def index():
     """
     Renderiza a página principal com:
     - Dropdown de clientes
-    - Recomendações e histórico de compras, se um cliente estiver selecionado
+    - Recomendações e histórico de compras (paginado via ?page=), se um cliente estiver
+      selecionado
     """
     client_name = request.args.get("client")
+    page = max(request.args.get("page", 1, type=int), 1)
     error = None
     recommendations = None
     purchases = None
+    n_pages = 1
+    m = modelo  # um único modelo durante toda a requisição, mesmo se re-ancorado no meio
 
     if client_name:
         try:
             # Obtém recomendações e histórico de compras para o cliente
             recommendations = recomendar_por_cliente(
-                client=client_name, k_vizinhos=K_VIZINHOS, k_recs=K_RECS
+                client=client_name, k_vizinhos=K_VIZINHOS, k_recs=K_RECS, modelo_ref=m
+            )
+            # Obtém apenas a página pedida do histórico de compras do cliente
+            n_compras = count_client_purchases(client_name, modelo_ref=m)
+            n_pages = max(-(-n_compras // HISTORY_PAGE_SIZE), 1)
+            page = min(page, n_pages)
+            purchases = get_client_purchases(
+                client_name,
+                limit=HISTORY_PAGE_SIZE,
+                offset=(page - 1) * HISTORY_PAGE_SIZE,
+                modelo_ref=m,
             )
-            # Obtém o histórico de compras do cliente
-            purchases = get_client_purchases(client_name)
         except ValueError as e:
             # Cliente não encontrado
             error = str(e)
@@ -45,10 +102,13 @@ def index():
     # Renderiza template passando lista de clientes e resultados
     return render_template(
         "index.html",
-        clients=sorted(localidades),
+        clients=CLIENTES_ORDENADOS,
         selected_client=client_name,
         recommendations=recommendations,
         purchases=purchases,
+        page=page,
+        n_pages=n_pages,
+        page_offset=(page - 1) * HISTORY_PAGE_SIZE,
         error=error,
     )
 
@@ -59,22 +119,28 @@ def get_recommendations():
     Endpoint API que retorna recomendações via JSON.
     Parâmetros de query:
       - client: nome ou ID do cliente
+      - modo (opcional): "clientes" (KNN entre clientes), "itens" (item–item) ou
+        "fatores" (embeddings da SVD truncada); omitido, vale ai.MODO_RECOMENDACAO
     Respostas:
       - 200: {'client': ..., 'recommendations': [...]}
-      - 400: {'error': 'Client name is required'}
+      - 400: {'error': 'Client name is required'}, ou {'error': 'Invalid mode, ...'} com os
+        modos aceitos se `modo` não for um de MODOS_RECOMENDACAO
       - 404: {'error': 'Cliente não encontrado'}
       - 500: {'error': 'Internal server error'}
     """
     client_name = request.args.get("client")
+    modo = request.args.get("modo")
 
     if not client_name:
         # Parâmetro obrigatório não fornecido
         return jsonify({"error": "Client name is required"}), 400
+    if modo is not None and modo not in MODOS_RECOMENDACAO:
+        return jsonify({"error": f"Invalid mode, use one of {list(MODOS_RECOMENDACAO)}"}), 400
 
     try:
         # Gera e retorna recomendações em JSON
         recommendations = recomendar_por_cliente(
-            client=client_name, k_vizinhos=K_VIZINHOS, k_recs=K_RECS
+            client=client_name, k_vizinhos=K_VIZINHOS, k_recs=K_RECS, modo=modo, modelo_ref=modelo
         )
         return jsonify({"client": client_name, "recommendations": recommendations})
     except ValueError as e:
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+benchmark_ann.py
+
+Compara o índice aproximado IVF (ann.py) com a busca exata por força bruta: recall dos
+vizinhos (fração dos k vizinhos exatos recuperados) e latência por consulta, variando o nº
+de listas sondadas. Por padrão usa uma matriz sintética com a mesma forma da do modelo
+(linhas esparsas L2-normalizadas, clientes agrupados por perfil de compra); com --modelo,
+usa a matriz do artefato em model/.
+
+    python benchmark_ann.py --clientes 200000 --sondas 1 4 8 16
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.neighbors import NearestNeighbors
+import ann
+
+
+def matriz_sintetica(n_clientes: int, n_produtos: int, por_cliente: int, semente: int = 0):
+    """CSR L2-normalizada: cada cliente compra sobretudo produtos do seu grupo de perfil."""
+    rng = np.random.default_rng(semente)
+    n_grupos = max(1, int(np.sqrt(n_clientes) / 4))
+    preferidos = rng.integers(0, n_produtos, size=(n_grupos, max(por_cliente * 2, 1)))
+    grupo = rng.integers(0, n_grupos, size=n_clientes)
+    do_grupo = rng.random((n_clientes, por_cliente)) < 0.8
+    cols = np.where(
+        do_grupo,
+        preferidos[grupo[:, None], rng.integers(0, preferidos.shape[1], (n_clientes, por_cliente))],
+        rng.integers(0, n_produtos, (n_clientes, por_cliente)),
+    )
+    rows = np.repeat(np.arange(n_clientes), por_cliente)
+    m = csr_matrix(
+        (rng.gamma(2.0, 1.0, rows.size), (rows, cols.ravel())), shape=(n_clientes, n_produtos)
+    )
+    m.sum_duplicates()
+    normas = np.sqrt(np.asarray(m.multiply(m).sum(axis=1)).ravel())
+    m.data /= np.repeat(normas, np.diff(m.indptr))
+    return m
+
+
+def vizinhos_exatos(X: csr_matrix, consultas: np.ndarray, k: int) -> np.ndarray:
+    """Top-k por cosseno (produto interno de linhas normalizadas), excluindo a própria linha."""
+    sims = (X[consultas] @ X.T).toarray()
+    sims[np.arange(len(consultas)), consultas] = -np.inf
+    part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    return part
+
+
+def medir(indice, X: csr_matrix, consultas: np.ndarray, k: int):
+    """Vizinhos (sem a própria linha) e latência média por consulta em ms."""
+    res = []
+    ini = time.perf_counter()
+    for q in consultas:
+        _, idx = indice.kneighbors(X[q], n_neighbors=k + 1)
+        res.append([i for i in idx[0] if i != q][:k])
+    return res, (time.perf_counter() - ini) * 1000 / len(consultas)
+
+
+def recall(aprox: list, exatos: np.ndarray) -> float:
+    return float(np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(aprox, exatos)]))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Recall × latência do índice IVF vs força bruta")
+    p.add_argument("--modelo", action="store_true", help="Usa a matriz do artefato em model/")
+    p.add_argument("--clientes", type=int, default=50_000, help="Clientes na matriz sintética")
+    p.add_argument("--produtos", type=int, default=2_000, help="Produtos na matriz sintética")
+    p.add_argument("--por-cliente", type=int, default=30, help="Produtos por cliente (sintética)")
+    p.add_argument("-k", type=int, default=20, help="Vizinhos por consulta (K_VIZINHOS)")
+    p.add_argument("--consultas", type=int, default=200, help="Nº de clientes consultados")
+    p.add_argument("--listas", type=int, default=0, help="Listas do IVF (0 = ~sqrt(n))")
+    p.add_argument("--sondas", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    p.add_argument("--saida", help="Grava os resultados em JSON")
+    a = p.parse_args()
+
+    if a.modelo:
+        import ai
+
+        X = ai.carregar_modelo(mmap=False).matriz
+    else:
+        X = matriz_sintetica(a.clientes, a.produtos, a.por_cliente)
+    k = min(a.k, X.shape[0] - 1)
+    rng = np.random.default_rng(1)
+    consultas = rng.choice(X.shape[0], min(a.consultas, X.shape[0]), replace=False)
+    print(
+        f"Matriz {X.shape[0]}×{X.shape[1]} ({X.nnz} não-nulos), k={k}, {len(consultas)} consultas"
+    )
+
+    exatos = vizinhos_exatos(X, consultas, k)
+    bruto = NearestNeighbors(metric="cosine", algorithm="brute").fit(X)
+    _, ms_bruto = medir(bruto, X, consultas, k)
+    resultados = [{"backend": "brute", "sondas": None, "recall": 1.0, "ms_consulta": ms_bruto}]
+
+    ini = time.perf_counter()
+    ivf = ann.IndiceIVF(n_listas=a.listas).fit(X)
+    s_treino = time.perf_counter() - ini
+    print(f"IVF: {len(ivf.centroides)} listas treinadas em {s_treino:.2f}s")
+    for sondas in a.sondas:
+        ivf.n_sondas = sondas
+        viz, ms = medir(ivf, X, consultas, k)
+        resultados.append(
+            {"backend": "ivf", "sondas": sondas, "recall": recall(viz, exatos), "ms_consulta": ms}
+        )
+
+    print(f"{'backend':<8}{'sondas':>8}{'recall@k':>10}{'ms/consulta':>13}{'speedup':>9}")
+    for r in resultados:
+        sondas = "-" if r["sondas"] is None else r["sondas"]
+        print(
+            f"{r['backend']:<8}{sondas:>8}{r['recall']:>10.3f}{r['ms_consulta']:>13.3f}"
+            f"{ms_bruto / r['ms_consulta']:>9.1f}x"
+        )
+    if a.saida:
+        with open(a.saida, "w", encoding="utf-8") as f:
+            json.dump({"shape": list(X.shape), "k": k, "resultados": resultados}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+cache_estagios.py
+
+Cache endereçado por conteúdo dos estágios do build do modelo. Cada estágio (agregados →
+matriz TF–IDF → índice/grafo, similares, fatores) é gravado em disco sob uma chave que é o
+hash da chave do estágio anterior com os parâmetros que o afetam; a raiz da cadeia é o hash
+do conteúdo das vendas. Assim, combinações de hiperparâmetros que compartilham um prefixo
+(ex.: mesmos ALPHA/MIN_QUANTITY e limiares de suporte) reaproveitam a mesma matriz, e um
+rebuild recomeça do estágio mais longo já em cache.
+
+Cada entrada é um diretório <raiz>/<estagio>-<chave>/ com arrays .npy e um meta.json,
+escrito em diretório temporário e trocado atomicamente. Quando o total passa de `max_bytes`,
+as entradas menos usadas recentemente (mtime, atualizado a cada leitura) são removidas.
+"""
+
+import os
+import hashlib
+import json
+import logging
+import shutil
+import threading
+from typing import Optional
+import numpy as np
+
+CACHE_DIR = "cache"  # raiz do cache de estágios
+CACHE_MAX_BYTES = 2 * 1024**3  # tamanho máximo antes de despejar entradas (LRU)
+BLOCO_HASH = 1 << 20  # bytes lidos por vez ao calcular o hash das vendas
+
+logger = logging.getLogger(__name__)
+
+_hashes = {}  # (caminho, tamanho, mtime) → hash já calculado neste processo
+_trava_hashes = threading.Lock()
+
+
+def _arquivos(caminho: str) -> list:
+    """O próprio CSV, ou os arquivos de um store particionado em ordem estável."""
+    if not os.path.isdir(caminho):
+        return [caminho]
+    return sorted(
+        os.path.join(raiz, nome)
+        for raiz, _, nomes in os.walk(caminho)
+        for nome in nomes
+        if not nome.startswith(".")
+    )
+
+
+def hash_dados(caminho: str) -> str:
+    """
+    Hash (blake2b) do conteúdo das vendas em `caminho` (CSV ou store). Memorizado por
+    tamanho e mtime de cada arquivo, então só é recalculado quando os dados mudam.
+    """
+    arquivos = _arquivos(caminho)
+    assinatura = tuple(
+        (os.path.relpath(a, caminho) if a != caminho else "", st.st_size, st.st_mtime_ns)
+        for a, st in ((a, os.stat(a)) for a in arquivos)
+    )
+    memo = (os.path.abspath(caminho), assinatura)
+    with _trava_hashes:
+        if memo in _hashes:
+            return _hashes[memo]
+    h = hashlib.blake2b(digest_size=16)
+    for arquivo, (rel, _, _) in zip(arquivos, assinatura):
+        h.update(rel.encode("utf-8") + b"\0")
+        with open(arquivo, "rb") as f:
+            for bloco in iter(lambda: f.read(BLOCO_HASH), b""):
+                h.update(bloco)
+    digest = h.hexdigest()
+    with _trava_hashes:
+        _hashes[memo] = digest
+    return digest
+
+
+def chave(anterior: str, params: dict) -> str:
+    """Chave de um estágio: hash da chave do estágio anterior + parâmetros que o afetam."""
+    texto = json.dumps([anterior, params], sort_keys=True, default=str)
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _tamanho(diretorio: str) -> int:
+    return sum(e.stat().st_size for e in os.scandir(diretorio) if e.is_file())
+
+
+class CacheEstagios:
+    """
+    Entradas (arrays + metadados) por estágio e chave, com despejo LRU por tamanho.
+    - ler(estagio, chave): (arrays, meta) ou None; marca a entrada como usada.
+    - gravar(estagio, chave, arrays, meta): grava atomicamente e despeja se preciso.
+    """
+
+    def __init__(self, raiz: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.raiz = raiz
+        self.max_bytes = max_bytes
+
+    def _dir(self, estagio: str, chave: str) -> str:
+        return os.path.join(self.raiz, f"{estagio}-{chave}")
+
+    def ler(self, estagio: str, chave: str) -> Optional[tuple]:
+        diretorio = self._dir(estagio, chave)
+        try:
+            with open(os.path.join(diretorio, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            arrays = {
+                nome: np.load(os.path.join(diretorio, f"{nome}.npy"), allow_pickle=False)
+                for nome in meta.pop("_arrays")
+            }
+            os.utime(diretorio)  # LRU: mtime do diretório = último uso
+        except (OSError, ValueError, KeyError):
+            return None
+        logger.info("Estágio '%s' reaproveitado do cache (%s)", estagio, chave[:12])
+        return arrays, meta
+
+    def gravar(self, estagio: str, chave: str, arrays: dict, meta: Optional[dict] = None):
+        diretorio = self._dir(estagio, chave)
+        tmp = f"{diretorio}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(tmp, exist_ok=True)
+        for nome, arr in arrays.items():
+            np.save(os.path.join(tmp, f"{nome}.npy"), np.asarray(arr))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({**(meta or {}), "_arrays": list(arrays)}, f, ensure_ascii=False)
+        try:
+            os.replace(tmp, diretorio)
+        except OSError:
+            # Outro processo gravou a mesma entrada antes (conteúdo idêntico)
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.despejar()
+
+    def despejar(self):
+        """Remove as entradas menos usadas até o total caber em `max_bytes`."""
+        entradas = []
+        for e in os.scandir(self.raiz):
+            if e.is_dir() and ".tmp-" not in e.name:
+                entradas.append((e.stat().st_mtime, _tamanho(e.path), e.path))
+        total = sum(t for _, t, _ in entradas)
+        for _, tam, caminho in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(caminho, ignore_errors=True)
+            total -= tam
+            logger.info("Cache: entrada '%s' despejada (%d bytes)", os.path.basename(caminho), tam)
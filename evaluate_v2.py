@@ -1,26 +1,296 @@
-from ai import K_VIZINHOS, K_RECS, recomendar_por_cliente, df_comp, knn
+from ai import (
+    BATCH_SIZE,
+    RANK_FATORES,
+    Modelo,
+    fatorar,
+    grafo_vizinhos,
+    matriz_interacoes,
+    normalizar_linhas_,
+    preparar_dados,
+    tfidf_l2_,
+    top_k_linhas,
+)
+import ai
+import ann
+from ingest import agregar_pares
+from quantizacao import (
+    PRECISOES,
+    PRECISOES_ESPARSAS,
+    CSRQuantizada,
+    VetoresQuantizados,
+    dtype_busca,
+    dtype_esparso,
+)
+import argparse
+import json
+import os
+import time
+from dataclasses import replace
+from typing import Optional, Sequence, Union
 import pandas as pd
-from scipy.sparse import csr_matrix
 import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def ranquear_pelo_grafo(
+    mat_train,
+    clientes,
+    ks_vizinhos: Sequence[int],
+    k_recs: int,
+    dtype=None,
+    modelo_ref: Optional[Modelo] = None,
+    n_threads: Optional[int] = None,
+) -> dict:
+    """
+    Rankings top-`k_recs` (códigos de produtos do modelo) de todos os `clientes` para cada
+    K de `ks_vizinhos`, com uma única consulta de vizinhos: grafo kNN (em blocos,
+    multi-thread) no maior K dos vetores do modelo contra as linhas de treino. `mat_train`
+    está nos códigos de clientes/produtos do modelo (ver treino_no_modelo). Os vizinhos
+    vêm em ordem decrescente de similaridade, então os scores do prefixo de K vizinhos são
+    os do prefixo anterior somados às linhas dos vizinhos novos (indicadora × matriz).
+    `dtype` força a precisão das matrizes (float32/64, ou int8: CSRQuantizada com escala
+    por linha, busca e scores sobre os dados int8); `n_threads` vai a grafo_vizinhos.
+
+    Retorna:
+        {k_vizinhos: array (len(clientes), k_recs)}
+    """
+    m = modelo_ref or ai.modelo_padrao()
+    base = _base_treino(mat_train)
+    matriz = m.matriz
+    if dtype is not None and np.dtype(dtype) == np.int8:
+        base, matriz = CSRQuantizada.de(base), CSRQuantizada.de(matriz)
+    elif dtype is not None:
+        base, matriz = base.astype(dtype), matriz.astype(dtype)
+    linhas = m.clientes.codificar(clientes).astype(np.int64)
+    if (linhas < 0).any():
+        faltando = list(clientes)[int(np.argmax(linhas < 0))]
+        raise ValueError(f"Cliente '{faltando}' não encontrado.")
+    ks = sorted(set(ks_vizinhos))
+    grafo = grafo_vizinhos(base, ks[-1], linhas=linhas, consultas=matriz, n_threads=n_threads)
+    viz = grafo.indices.reshape(len(linhas), -1)  # todas as linhas têm o mesmo nº de vizinhos
+    k_recs = min(k_recs, matriz.shape[1])
+    rankings = {k: np.empty((len(linhas), k_recs), dtype=np.int64) for k in ks}
+    for ini in range(0, len(linhas), BATCH_SIZE):
+        bloco = viz[ini : ini + BATCH_SIZE]
+        scores = np.zeros((len(bloco), matriz.shape[1]))
+        anterior = 0
+        for k in ks:
+            novos = bloco[:, anterior:k]
+            if novos.size:
+                ind = csr_matrix(
+                    (
+                        np.ones(novos.size),
+                        novos.ravel(),
+                        np.arange(0, novos.size + 1, novos.shape[1]),
+                    ),
+                    shape=(len(bloco), matriz.shape[0]),
+                )
+                if isinstance(matriz, CSRQuantizada):
+                    scores += matriz.combinacao(ind).toarray()
+                else:
+                    scores += (ind @ matriz).toarray()
+            anterior = k
+            rankings[k][ini : ini + len(bloco)] = top_k_linhas(scores, k_recs)
+    return rankings
+
+
+def treino_no_modelo(divisao: dict, modelo_ref: Optional[Modelo] = None) -> csr_matrix:
+    """
+    Matriz de treino do split reindexada nos vocabulários do modelo: linha = código do
+    cliente em `m.clientes`, coluna = código do produto em `m.produtos`. A ordem dos dois
+    não precisa coincidir (atualizar_modelo acrescenta clientes novos ao final); clientes
+    ou produtos do treino fora do modelo são descartados, e os do modelo sem interações no
+    treino (ex.: produto que só aparece no teste) ficam vazios.
+    """
+    m = modelo_ref or ai.modelo_padrao()
+    mat = divisao["mat_train"].tocoo()
+    linhas = m.clientes.codificar(divisao["clientes"].tolist())[mat.row]
+    colunas = m.produtos.codificar(divisao["produtos"].tolist())[mat.col]
+    manter = (linhas >= 0) & (colunas >= 0)
+    return csr_matrix(
+        (mat.data[manter], (linhas[manter], colunas[manter])),
+        shape=(len(m.clientes), len(m.produtos)),
+    )
+
+
+def _base_treino(mat_train) -> csr_matrix:
+    """Cópia float64 L2-normalizada da matriz de treino (o cosseno do KNN normaliza as linhas)."""
+    base = mat_train.astype(np.float64)
+    normalizar_linhas_(base)
+    return base
+
+
+def modelo_de_treino(mat_train, k_vizinhos: int, modelo_ref: Optional[Modelo] = None) -> Modelo:
+    """
+    Cópia do modelo para avaliar um `recomendar_fn` no split: grafo kNN (vetores do modelo
+    contra as linhas de `mat_train`, nos códigos do modelo, como em ranquear_pelo_grafo) e
+    índice de vizinhos refeitos só com o treino, sem tabela pré-computada. O modelo
+    recebido não é alterado.
+    """
+    m = modelo_ref or ai.modelo_padrao()
+    base = _base_treino(mat_train)
+    linhas = np.arange(m.matriz.shape[0])
+    treino = replace(
+        m,
+        tabela=None,
+        tabela_k_vizinhos=0,
+        grafo=grafo_vizinhos(base, k_vizinhos, linhas=linhas, consultas=m.matriz),
+        grafo_k=k_vizinhos,
+        # O IVF restaurado evita retreinar o índice que é trocado logo abaixo
+        indice_salvo=m.knn.estado() if isinstance(m.knn, ann.IndiceIVF) else None,
+    )
+    treino.knn = ann.criar_indice(m.params, base)
+    return treino
+
+
+def recomendar_pelo_grafo(
+    mat_train,
+    clientes,
+    k_vizinhos: int,
+    k_recs: int,
+    dtype=None,
+    modelo_ref: Optional[Modelo] = None,
+) -> dict:
+    """
+    Recomendações de todos os `clientes` de uma vez (ver ranquear_pelo_grafo) — mesmo
+    resultado de recomendar_por_cliente com o modelo de modelo_de_treino, sem uma consulta
+    ao grafo por cliente.
+    """
+    m = modelo_ref or ai.modelo_padrao()
+    top = ranquear_pelo_grafo(mat_train, clientes, [k_vizinhos], k_recs, dtype, m)[k_vizinhos]
+    return {cliente: m.produtos.decodificar(linha) for cliente, linha in zip(clientes, top)}
+
+
+def ranquear_por_fatores(
+    mat_train, clientes_train, clientes, rank, k_recs, precisao="float32"
+) -> np.ndarray:
+    """
+    Ranking top-`k_recs` (códigos de produtos do treino) do modo "fatores" ajustado só no
+    treino: TF–IDF + L2 da matriz de treino, SVD truncada, embeddings quantizados em
+    `precisao` e top-K do produto escalar.
+    """
+    base = mat_train.astype(np.float64)
+    tfidf_l2_(base)
+    emb_clientes, emb_produtos = (VetoresQuantizados.de(f, precisao) for f in fatorar(base, rank))
+    linhas = clientes_train.codificar(clientes)
+    if (linhas < 0).any():
+        faltando = list(clientes)[int(np.argmax(linhas < 0))]
+        raise ValueError(f"Cliente '{faltando}' não encontrado no treino.")
+    return top_k_linhas(emb_clientes.produto(emb_produtos, linhas), k_recs)
+
+
+def recomendar_por_fatores(
+    mat_train, clientes_train, produtos_train, clientes, rank, k_recs, precisao="float32"
+):
+    """Recomendações do modo "fatores" ajustado só no treino (ver ranquear_por_fatores)."""
+    top = ranquear_por_fatores(mat_train, clientes_train, clientes, rank, k_recs, precisao)
+    return {c: produtos_train.decodificar(t) for c, t in zip(clientes, top)}
+
+
+def _metricas(recs_por_cliente: dict, itens_por_cliente: pd.Series, k_recs: int) -> dict:
+    """precision@K e recall@K médios dos clientes de teste."""
+    precisions, recalls = [], []
+    for cliente, itens_test in itens_por_cliente.items():
+        itens_test = list(itens_test)
+        if not itens_test:
+            continue
+        hits = set(recs_por_cliente[cliente]) & set(itens_test)
+        precisions.append(len(hits) / k_recs)
+        recalls.append(len(hits) / len(itens_test))
+    return {
+        "precision@K": float(np.mean(precisions)) if precisions else 0.0,
+        "recall@K": float(np.mean(recalls)) if recalls else 0.0,
+    }
+
+
+def _metricas_ranking(
+    top: np.ndarray, produtos, itens_por_cliente: pd.Series, ks_recs: Sequence[int]
+) -> dict:
+    """
+    _metricas para cada K de `ks_recs` a partir de um único ranking (códigos em `produtos`,
+    uma linha por cliente de `itens_por_cliente`): acertos acumulados ao longo do ranking,
+    lidos na posição K.
+
+    Retorna:
+        {k_recs: {"precision@K", "recall@K"}}
+    """
+    n_itens = itens_por_cliente.map(len).to_numpy()
+    acertos = np.zeros(top.shape, dtype=bool)
+    for ini in range(0, len(top), BATCH_SIZE):
+        itens = itens_por_cliente.iloc[ini : ini + BATCH_SIZE]
+        codigos = produtos.codificar(np.concatenate([np.asarray(i) for i in itens]))
+        linhas = np.repeat(np.arange(len(itens)), n_itens[ini : ini + BATCH_SIZE])
+        alvo = np.zeros((len(itens), len(produtos)), dtype=bool)
+        alvo[linhas[codigos >= 0], codigos[codigos >= 0]] = True
+        fim = ini + len(itens)
+        acertos[ini:fim] = np.take_along_axis(alvo, top[ini:fim], axis=1)
+    acumulados = np.cumsum(acertos, axis=1)
+    validos = n_itens > 0
+    out = {}
+    for k in ks_recs:
+        pos = min(k, top.shape[1]) - 1
+        hits = acumulados[validos, pos] if pos >= 0 else np.zeros(validos.sum())
+        out[k] = {
+            "precision@K": float(np.mean(hits / k)) if validos.any() else 0.0,
+            "recall@K": float(np.mean(hits / n_itens[validos])) if validos.any() else 0.0,
+        }
+    return out
 
 
 def avaliar_knn_v2(
     df_comp: pd.DataFrame,
-    recomendar_fn,
-    k_vizinhos: int = K_VIZINHOS,
-    k_recs: int = K_RECS,
+    recomendar_fn=None,
+    k_vizinhos: Union[int, Sequence[int], None] = None,
+    k_recs: Union[int, Sequence[int], None] = None,
     test_frac: float = 0.1,
-) -> dict:
+    rank_fatores: int = 0,
+    precisao: Optional[str] = None,
+    modelo_ref: Optional[Modelo] = None,
+) -> Union[dict, list]:
     """
     Avalia o desempenho do modelo KNN considerando recência e feedback:
       - Separa uma fração de interações de cada cliente para teste.
       - Reajusta o KNN nos dados de treino (ponderados por recência e com feedback médio).
       - Gera recomendações e calcula precision@K e recall@K.
+    Sem `recomendar_fn`, as recomendações saem de um único grafo kNN (recomendar_pelo_grafo);
+    com ele, `recomendar_fn(cliente, k_vizinhos=, k_recs=, modelo_ref=)` recebe a cópia de
+    treino do modelo (modelo_de_treino), e as métricas coincidem com as do grafo.
+    Com `rank_fatores` > 0 (padrão 0: só KNN), o modo "fatores" (SVD) é avaliado no mesmo
+    split e reportado lado a lado em "fatores". `precisao` (ver quantizacao.PRECISOES)
+    avalia os embeddings na precisão indicada; o KNN usa dtype_busca(precisao), ou seja,
+    int8 quantizado em int8 e float32 em float16. `modelo_ref` (padrão: ai.modelo_padrao())
+    fornece os vetores consultados e, se omitidos, K_VIZINHOS/K_RECS.
+
+    `k_vizinhos` e `k_recs` também aceitam listas: os vizinhos são consultados uma só vez
+    no maior K_VIZINHOS e cada K_RECS é lido do mesmo ranking; o retorno passa a ser uma
+    lista de métricas, uma por par (K_VIZINHOS, K_RECS), com essas chaves.
+    """
+    divisao = dividir_treino_teste(df_comp, test_frac)
+
+    # Atualiza globais usados por recomendar_por_cliente
+    global localidades, itens, mat_sparse
+    localidades = divisao["clientes"]
+    itens = divisao["produtos"]
+    mat_sparse = divisao["mat_train"]
+
+    return avaliar_divisao(
+        divisao, recomendar_fn, k_vizinhos, k_recs, rank_fatores, precisao, modelo_ref
+    )
+
+
+def dividir_treino_teste(df_comp: pd.DataFrame, test_frac: float = 0.1) -> dict:
+    """
+    Separa uma fração das interações de cada cliente para teste (semente fixa) e monta a
+    matriz esparsa de treino — a parte de avaliar_knn_v2 que não depende de K_VIZINHOS,
+    K_RECS nem do modelo, reaproveitável entre configurações (ver grid_search.py).
+
+    Retorna:
+        {"mat_train", "clientes", "produtos", "itens_por_cliente"} (itens de teste por cliente)
     """
-    # Cópia dos dados e marcação de amostras de teste
+    # Cópia dos dados e marcação de amostras de teste (o store lê na ordem do CSV)
     df = df_comp.copy()
     df["is_test"] = False
-    for cliente, grp in df.groupby("client"):
+    for cliente, grp in df.groupby("client", observed=True):
         n_test = max(1, int(len(grp) * test_frac))
         idxs = grp.sample(n=n_test, random_state=42).index
         df.loc[idxs, "is_test"] = True
@@ -29,43 +299,197 @@ def avaliar_knn_v2(
     df_train = df[~df["is_test"]]
     df_test = df[df["is_test"]]
 
-    # Pivot dos dados de treino: utiliza weighted_quantity (recência) e adiciona avg_feedback
-    pivot_train = df_train.pivot_table(
-        index="client", columns="product", values="weighted_quantity", aggfunc="sum", fill_value=0
-    )
-    feedback_avg = df_train.groupby("client")["feedback_score"].mean().rename("avg_feedback")
-    pivot_train = pivot_train.merge(feedback_avg, left_index=True, right_index=True)
+    # Matriz esparsa de treino: weighted_quantity (recência) + avg_feedback, sem pivot denso
+    mat_train, clientes, produtos = matriz_interacoes(agregar_pares(df_train))
+    return {
+        "mat_train": mat_train,
+        "clientes": clientes,
+        "produtos": produtos,
+        "itens_por_cliente": df_test.groupby("client", observed=True)["product"].unique(),
+    }
 
-    # Converte para matriz esparsa e refaz o KNN
-    clientes = pivot_train.index.to_list()
-    produtos = pivot_train.columns.to_list()
-    mat_train = csr_matrix(pivot_train.values)
-    knn.fit(mat_train)
 
-    # Atualiza globais usados por recomendar_por_cliente
-    global pivot, localidades, itens, mat_sparse
-    pivot = pivot_train
-    localidades = clientes
-    itens = produtos
-    mat_sparse = mat_train
+def avaliar_divisao(
+    divisao: dict,
+    recomendar_fn=None,
+    k_vizinhos: Union[int, Sequence[int], None] = None,
+    k_recs: Union[int, Sequence[int], None] = None,
+    rank_fatores: int = 0,
+    precisao: Optional[str] = None,
+    modelo_ref: Optional[Modelo] = None,
+    n_threads: Optional[int] = None,
+) -> Union[dict, list]:
+    """
+    Métricas de avaliar_knn_v2 sobre um split já calculado por dividir_treino_teste;
+    `n_threads` (padrão: ai.N_THREADS) são as threads do grafo kNN.
+    """
+    m = modelo_ref or ai.modelo_padrao()
+    escalar = not isinstance(k_vizinhos, (list, tuple)) and not isinstance(k_recs, (list, tuple))
+    ks_vizinhos = _lista_k(k_vizinhos, m.params["K_VIZINHOS"])
+    ks_recs = _lista_k(k_recs, m.params["K_RECS"])
+    mat_train, itens_por_cliente = treino_no_modelo(divisao, m), divisao["itens_por_cliente"]
 
-    precisions, recalls = [], []
     # Avaliação de cada cliente no teste
-    for cliente in df_test["client"].unique():
-        itens_test = df_test.loc[df_test["client"] == cliente, "product"].unique().tolist()
-        if not itens_test:
-            continue
-        recs = recomendar_fn(cliente, k_vizinhos=k_vizinhos, k_recs=k_recs)
-        hits = set(recs) & set(itens_test)
-        precisions.append(len(hits) / k_recs)
-        recalls.append(len(hits) / len(itens_test))
+    clientes_teste = list(itens_por_cliente.index)
+    if recomendar_fn is None:
+        dtype = dtype_busca(precisao) if precisao else None
+        rankings = ranquear_pelo_grafo(
+            mat_train, clientes_teste, ks_vizinhos, max(ks_recs), dtype, m, n_threads
+        )
+        knn = {
+            kv: _metricas_ranking(top, m.produtos, itens_por_cliente, ks_recs)
+            for kv, top in rankings.items()
+        }
+    else:
+        treino = modelo_de_treino(mat_train, max(ks_vizinhos), m)
+        knn = {
+            kv: {
+                kr: _metricas(
+                    {
+                        c: recomendar_fn(c, k_vizinhos=kv, k_recs=kr, modelo_ref=treino)
+                        for c in clientes_teste
+                    },
+                    itens_por_cliente,
+                    kr,
+                )
+                for kr in ks_recs
+            }
+            for kv in ks_vizinhos
+        }
 
-    return {
-        "precision@K": float(np.mean(precisions)) if precisions else 0.0,
-        "recall@K": float(np.mean(recalls)) if recalls else 0.0,
-    }
+    fatores = {}
+    if rank_fatores:
+        top = ranquear_por_fatores(
+            divisao["mat_train"],
+            divisao["clientes"],
+            clientes_teste,
+            rank_fatores,
+            max(ks_recs),
+            precisao or "float32",
+        )
+        fatores = _metricas_ranking(top, divisao["produtos"], itens_por_cliente, ks_recs)
+
+    linhas = []
+    for kv in ks_vizinhos:
+        for kr in ks_recs:
+            metrics = dict(knn[kv][kr])
+            if rank_fatores:
+                metrics["fatores"] = fatores[kr]
+            linhas.append(metrics if escalar else {"K_VIZINHOS": kv, "K_RECS": kr, **metrics})
+    return linhas[0] if escalar else linhas
+
+
+def _lista_k(k, padrao: int) -> list:
+    """K único ou lista de Ks (None = `padrao`) como lista sem repetições, em ordem."""
+    if k is None:
+        return [padrao]
+    return list(dict.fromkeys(k)) if isinstance(k, (list, tuple)) else [k]
+
+
+def relatorio_precisao(df_comp: pd.DataFrame, modelo_ref: Optional[Modelo] = None) -> list:
+    """
+    Precisão × memória: precision@K/recall@K de KNN e "fatores" em cada uma das PRECISOES,
+    com os bytes dos vetores (CSR do KNN e embeddings de clientes + produtos), todas no
+    mesmo split. A busca KNN roda sobre a CSR, que só existe em PRECISOES_ESPARSAS (int8
+    como CSRQuantizada): em float16, que scipy.sparse não aceita, a linha "knn" é None.
+    """
+    m = modelo_ref or ai.modelo_padrao()
+    nnz, n_indices = m.matriz.nnz, m.matriz.indices.nbytes + m.matriz.indptr.nbytes
+    fatores = [m.fatores_clientes.linhas(), m.fatores_produtos.linhas()]
+    rank, k_recs = m.params.get("RANK_FATORES", RANK_FATORES), m.params["K_RECS"]
+    divisao = dividir_treino_teste(df_comp)
+    itens_por_cliente = divisao["itens_por_cliente"]
+    linhas = []
+    for precisao in PRECISOES:
+        knn = None
+        if precisao in PRECISOES_ESPARSAS:
+            met = avaliar_divisao(divisao, precisao=precisao, modelo_ref=m)
+            if precisao == "int8":
+                bytes_knn = CSRQuantizada.de(m.matriz).nbytes
+            else:
+                bytes_knn = nnz * np.dtype(dtype_esparso(precisao)).itemsize + n_indices
+            knn = {**met, "bytes": bytes_knn}
+        top = ranquear_por_fatores(
+            divisao["mat_train"],
+            divisao["clientes"],
+            list(itens_por_cliente.index),
+            rank,
+            k_recs,
+            precisao,
+        )
+        met = _metricas_ranking(top, divisao["produtos"], itens_por_cliente, [k_recs])[k_recs]
+        bytes_fatores = sum(VetoresQuantizados.de(f, precisao).nbytes for f in fatores)
+        linhas.append(
+            {"precisao": precisao, "knn": knn, "fatores": {**met, "bytes": bytes_fatores}}
+        )
+    return linhas
+
+
+def gravar_resultado(caminho: str, resultado: dict):
+    """
+    Grava `resultado` em JSON em `caminho` atomicamente (arquivo temporário + rename): quem
+    lê (testbench) encontra o arquivo completo ou nenhum, nunca um pela metade.
+    """
+    tmp = f"{caminho}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, default=float)
+    os.replace(tmp, caminho)
 
 
 if __name__ == "__main__":
-    metrics = avaliar_knn_v2(df_comp, recomendar_por_cliente)
+    p = argparse.ArgumentParser(description="Avaliação precision@K/recall@K", add_help=False)
+    p.add_argument(
+        "--precisoes",
+        metavar="JSON",
+        help="Gera o relatório precisão × memória (float64/32/16, int8) e o grava em JSON",
+    )
+    p.add_argument(
+        "--fatores",
+        action="store_true",
+        help='Avalia também o modo "fatores" (SVD de RANK_FATORES) no mesmo split',
+    )
+    p.add_argument(
+        "--resultado",
+        metavar="JSON",
+        help="Grava as métricas, os parâmetros e os tempos de cada etapa neste arquivo JSON",
+    )
+    a, _ = p.parse_known_args()
+    ai.configurar_logging()
+    inicio = time.perf_counter()
+    modelo = ai.configurar_de_argv()[0].modelo
+    t_modelo = time.perf_counter()
+    df_comp = preparar_dados(params=modelo.params)
+    t_dados = time.perf_counter()
+    if a.precisoes:
+        relatorio = relatorio_precisao(df_comp, modelo)
+        print(f"{'precisão':<10}{'modo':<9}{'precision@K':>12}{'recall@K':>10}{'bytes':>12}")
+        for linha in relatorio:
+            for modo in ("knn", "fatores"):
+                r = linha[modo]
+                if r is None:
+                    print(f"{linha['precisao']:<10}{modo:<9}{'— (CSR sem float16)':>34}")
+                    continue
+                print(
+                    f"{linha['precisao']:<10}{modo:<9}{r['precision@K']:>12.4f}"
+                    f"{r['recall@K']:>10.4f}{r['bytes']:>12d}"
+                )
+        with open(a.precisoes, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, indent=2)
+    rank = modelo.params.get("RANK_FATORES", RANK_FATORES) if a.fatores else 0
+    metrics = avaliar_knn_v2(df_comp, rank_fatores=rank, modelo_ref=modelo)
+    fim = time.perf_counter()
+    if a.resultado:
+        gravar_resultado(
+            a.resultado,
+            {
+                "metricas": metrics,
+                "params": modelo.params,
+                "tempo": {
+                    "modelo": t_modelo - inicio,
+                    "dados": t_dados - t_modelo,
+                    "avaliacao": fim - t_dados,
+                    "total": fim - inicio,
+                },
+            },
+        )
     print(metrics)  # Exemplo: {'precision@K': 0.2188, 'recall@K': 0.3808}
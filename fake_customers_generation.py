@@ -10,12 +10,14 @@ Gera um dataset de vendas fictícias para teste, considerando:
 
 import random
 import pandas as pd
+import sales_store
 from data.source import CLIENTS, PRODUCTS, ORIGINAL_LOCATIONS, LOCATIONS_PRODUCTS, FEEDBACK_OPTIONS
 
 # === Configurações de geração ===
 NUM_ORDERS_PER_CLIENT = 100  # Quantidade de pedidos por cliente
 MAX_DATE_OFFSET_DAYS = 365  # Intervalo máximo para datas futuras
-OUTPUT_CSV_PATH = "data/sells_data.csv"  # Caminho de saída
+OUTPUT_CSV_PATH = "data/sells_data.csv"  # Caminho de saída (CSV)
+OUTPUT_STORE_PATH = sales_store.STORE_DIR  # Store colunar particionado por mês (requer pyarrow)
 
 
 def generate_fake_sales() -> list[dict]:
@@ -81,7 +83,10 @@ def generate_fake_sales() -> list[dict]:
 
 
 if __name__ == "__main__":
-    # Gera dados e salva em CSV
+    # Gera dados e salva no store colunar (se disponível) e em CSV
     df_sales = pd.DataFrame(generate_fake_sales())
+    if sales_store.disponivel():
+        sales_store.escrever_vendas(df_sales, OUTPUT_STORE_PATH)
+        print(f"Store colunar salvo em '{OUTPUT_STORE_PATH}/'.")
     df_sales.to_csv(OUTPUT_CSV_PATH, index=False, encoding="utf-8-sig")
     print(f"Geração de dados concluída. Arquivo salvo em '{OUTPUT_CSV_PATH}'.")
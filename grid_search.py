@@ -2,15 +2,38 @@
 """
 grid_search.py
 
-Busca exaustiva de hiperparâmetros com N runs por combinação (padrão=10),
-paralelizado via threading e isolando cada run em seu próprio workspace.
-Ao final, salva métricas de tempo detalhadas.
+Busca exaustiva de hiperparâmetros com N runs por combinação (padrão=10), no próprio
+processo: cada run gera um dataset fictício, compartilhado por todas as combinações daquela
+run, e o pipeline é chamado direto (ai.py / evaluate_v2.py), sem subprocessos.
+
+As combinações são agrupadas pelo primeiro estágio do pipeline em que diferem
+(ESTAGIOS_GRID): vendas filtradas e agregados por par dependem só de ALPHA/MIN_QUANTITY;
+matriz TF–IDF e split treino/teste, também dos limiares de suporte; K_VIZINHOS/K_RECS só da
+consulta. Cada estágio compartilhado é calculado uma vez por grupo, e os grupos do primeiro
+estágio (com toda a sua cauda) são distribuídos num pool de processos.
+
+Com --halving (successive halving, como no Hyperband), todas as combinações recebem só
+--reps-iniciais runs; a cada rodada ficam as melhores 1/--eta pela média de precision@K,
+mais as que ainda podem ser a melhor dentro do intervalo de confiança, e as sobreviventes
+recebem --eta vezes mais runs, até --reps.
+
+Cada worker usa --threads threads de BLAS/OpenMP (padrão: núcleos / workers), e os grupos de
+cada run são enviados do mais caro para o mais barato pelo avg_time por combo de um
+grid_metrics.json anterior (--custos; padrão: o do próprio --out, lido antes de limpá-lo).
+Ao final, salva métricas de tempo detalhadas, com ocupação dos workers e makespan contra a
+ordem ingênua.
+
+Cada (combo, run) concluído é acrescentado a <out>/journal.jsonl assim que termina; com
+--resume, o diretório não é limpo, as runs já no journal são puladas (os datasets de cada run
+são reaproveitados) e o resumo e as métricas de tempo são refeitos a partir do journal. As
+runs também são registradas no histórico SQLite (--db, ver resultados_db.py); o --resume
+continua a mesma execução do histórico, cujo id fica em cada linha do journal. Um
+(combo, run) que falha entra no journal, no histórico e no resumo ("falhas") com o erro, em
+vez de sumir dos resultados; o --resume tenta de novo os que falharam.
 """
 
 import os
 import sys
-import subprocess
-import ast
 import json
 import time
 import signal
@@ -18,9 +41,13 @@ import argparse
 import shutil
 import logging
 import threading
-import queue
 import itertools
-import re
+import math
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import pandas as pd
+
+import agendador
+from resultados_db import RESULTADOS_DB, BancoResultados
 
 
 # ANSI colors for level tags
@@ -41,10 +68,14 @@ PARAM_GRID = {
     "MIN_CLIENT_TRANSACTIONS": [5, 10],
 }
 
-FAKE_SCRIPT = "fake_customers_generation.py"
-AI_SCRIPT = "ai.py"
-EVAL_SCRIPT = "evaluate_v2.py"
-SOURCE_IN = "data/source.py"
+JOURNAL = "journal.jsonl"  # uma linha JSON por (combo, run) concluído ou com erro, em <out>/
+
+# Estágios do pipeline, na ordem, com os hiperparâmetros que entram em cada um
+ESTAGIOS_GRID = (
+    ("ALPHA", "MIN_QUANTITY"),  # vendas filtradas/ponderadas + agregados por par
+    ("MIN_PRODUCT_SUPPORT", "MIN_CLIENT_TRANSACTIONS"),  # matriz TF–IDF + split treino/teste
+    ("K_VIZINHOS", "K_RECS"),  # consulta: grafo kNN + top-K
+)
 
 
 # Logging setup
@@ -82,6 +113,49 @@ def parse_args():
     p.add_argument(
         "--reps", "-r", type=int, default=10, help="Número de runs por combinação (padrão: 10)"
     )
+    p.add_argument(
+        "--workers", "-w", type=int, default=0, help="Processos no pool (padrão: nº de CPUs)"
+    )
+    p.add_argument(
+        "--threads",
+        "-t",
+        type=int,
+        default=0,
+        help="Threads de BLAS/OpenMP por worker (padrão: nº de CPUs / workers)",
+    )
+    p.add_argument(
+        "--custos",
+        default=None,
+        help="grid_metrics.json com o avg_time por combo de uma execução anterior "
+        "(padrão: <out>/grid_metrics.json)",
+    )
+    p.add_argument(
+        "--resume",
+        action="store_true",
+        help="Retoma a partir do journal em <out>/ em vez de limpar o diretório",
+    )
+    p.add_argument(
+        "--halving",
+        action="store_true",
+        help="Successive halving: descarta combinações atrás e dá mais runs às sobreviventes",
+    )
+    p.add_argument(
+        "--reps-iniciais", type=int, default=2, help="Runs por combo na 1ª rodada (padrão: 2)"
+    )
+    p.add_argument(
+        "--eta", type=int, default=3, help="Fator de corte/aumento de runs por rodada (padrão: 3)"
+    )
+    p.add_argument(
+        "--z",
+        type=float,
+        default=1.96,
+        help="Largura (em erros-padrão) do intervalo de confiança da média (padrão: 1.96)",
+    )
+    p.add_argument(
+        "--db",
+        default=RESULTADOS_DB,
+        help=f"Banco SQLite do histórico de resultados (padrão: {RESULTADOS_DB})",
+    )
     return p.parse_args()
 
 
@@ -106,55 +180,151 @@ def save_best(best, base):
     logger.info("→ Novo melhor salvo em '%s'", path)
 
 
-def patch_ai_script(ws, params):
-    text = open(AI_SCRIPT, "r", encoding="utf-8").read()
-    for k, v in params.items():
-        pattern = rf"^{k}\s*=.*$"
-        repl = f"{k} = {repr(v)}"
-        text = re.sub(pattern, repl, text, flags=re.MULTILINE)
-    open(os.path.join(ws, "ai.py"), "w", encoding="utf-8").write(text)
+def carregar_custos(caminho, combos):
+    """avg_time por combo (idx 1-based em `combos`) de um grid_metrics.json anterior."""
+    if not caminho or not os.path.isfile(caminho):
+        return {}
+    with open(caminho, "r", encoding="utf-8") as f:
+        anteriores = json.load(f).get("combos", [])
+    idx_de = {combo: i for i, combo in enumerate(combos, start=1)}
+    custos = {}
+    for c in anteriores:
+        combo = tuple(c["params"].get(k) for k in PARAM_GRID)
+        if c.get("runs") and combo in idx_de:
+            custos[idx_de[combo]] = c["avg_time"]
+    return custos
+
+
+def ler_journal(caminho, combos):
+    """
+    (combo_idx, rep_idx, precision@K, recall@K, tempo) de cada linha do journal, com o idx
+    recalculado pelos params; linhas truncadas (queda no meio da escrita) e as de runs que
+    falharam (com "erro") são ignoradas.
+    """
+    if not os.path.isfile(caminho):
+        return
+    idx_de = {combo: i for i, combo in enumerate(combos, start=1)}
+    with open(caminho, "r", encoding="utf-8") as f:
+        for linha in f:
+            try:
+                e = json.loads(linha)
+                combo = tuple(e["params"][k] for k in PARAM_GRID)
+                run = e["rep"], e["precision@K"], e["recall@K"], e["time"]
+            except (ValueError, KeyError):
+                continue
+            if combo in idx_de:
+                yield (idx_de[combo], *run)
 
 
-def extract_metrics(logfile):
-    try:
-        lines = open(logfile, "r", encoding="utf-8", errors="ignore").read().splitlines()
-    except Exception as e:
-        logger.error("Erro ao ler log '%s': %s", logfile, e)
+def execucao_do_journal(caminho):
+    """Id da execução no histórico (campo "execucao") da última linha do journal que o traz."""
+    if not os.path.isfile(caminho):
         return None
-    for line in reversed(lines):
-        t = line.strip()
-        if t.startswith("{") and t.endswith("}"):
+    execucao_id = None
+    with open(caminho, "r", encoding="utf-8") as f:
+        for linha in f:
             try:
-                d = ast.literal_eval(t)
-            except (SyntaxError, ValueError) as e:
-                logger.error("Erro ao avaliar linha '%s' em '%s': %s", t, logfile, e)
+                execucao_id = json.loads(linha).get("execucao", execucao_id)
+            except ValueError:
                 continue
-            if isinstance(d, dict) and "precision@K" in d:
-                return d
-    return None
-
+    return execucao_id
 
-def run_rep(combo_idx, rep_idx, params, base):
-    """Executa fake + eval em workspace isolado e retorna métricas e tempo."""
-    ws = os.path.join(base, "logs", f"combo_{combo_idx:03d}", f"run_{rep_idx:02d}")
-    os.makedirs(ws, exist_ok=True)
-    data_dir = os.path.join(ws, "data")
-    os.makedirs(data_dir, exist_ok=True)
-    shutil.copy(os.path.abspath(SOURCE_IN), os.path.join(data_dir, "source.py"))
-    patch_ai_script(ws, params)
-    shutil.copy(os.path.abspath(FAKE_SCRIPT), os.path.join(ws, FAKE_SCRIPT))
-    shutil.copy(os.path.abspath(EVAL_SCRIPT), os.path.join(ws, EVAL_SCRIPT))
 
-    logp = os.path.join(ws, "run.log")
-    start = time.time()
-    with open(logp, "w", encoding="utf-8") as log:
-        subprocess.run([sys.executable, FAKE_SCRIPT], cwd=ws, stdout=log, stderr=log, check=True)
-    with open(logp, "a", encoding="utf-8") as log:
-        subprocess.run([sys.executable, EVAL_SCRIPT], cwd=ws, stdout=log, stderr=log, check=True)
+def gerar_dados(base, rep_idx):
+    """
+    Dataset fictício da run `rep_idx` (compartilhado por todas as combinações). Se já
+    existe (--resume), é reaproveitado, para que as combinações restantes da run vejam os
+    mesmos dados; a escrita é atômica.
+    """
+    from fake_customers_generation import generate_fake_sales
 
-    mets = extract_metrics(logp) or {"precision@K": 0.0, "recall@K": 0.0}
-    elapsed = time.time() - start
-    return combo_idx, rep_idx, mets["precision@K"], mets["recall@K"], elapsed
+    ws = os.path.join(base, "logs", f"run_{rep_idx:02d}")
+    os.makedirs(ws, exist_ok=True)
+    caminho = os.path.join(ws, "sells_data.csv")
+    if not os.path.isfile(caminho):
+        tmp = caminho + ".tmp"
+        pd.DataFrame(generate_fake_sales()).to_csv(tmp, index=False, encoding="utf-8-sig")
+        os.replace(tmp, caminho)
+    return caminho
+
+
+def agrupar_combos(combos, indices=None):
+    """
+    Árvore de combinações por estágio: {prefixo do 1º estágio: {prefixo do 2º: [(idx,
+    params do último estágio), ...]}}, com idx 1-based na ordem de `combos`. Com `indices`,
+    só essas combinações entram na árvore.
+    """
+    chaves = list(PARAM_GRID.keys())
+    if indices is None:
+        indices = range(1, len(combos) + 1)
+    arvore = {}
+    for idx in sorted(indices):
+        params = dict(zip(chaves, combos[idx - 1]))
+        prefixos = [tuple(params[k] for k in estagio) for estagio in ESTAGIOS_GRID[:-1]]
+        no = arvore
+        for prefixo in prefixos[:-1]:
+            no = no.setdefault(prefixo, {})
+        no.setdefault(prefixos[-1], []).append((idx, {k: params[k] for k in ESTAGIOS_GRID[-1]}))
+    return arvore
+
+
+def _ignorar_sigint():
+    # Ctrl+C é tratado só pelo processo principal, que deixa as tarefas em curso terminarem
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _iniciar_worker(n_threads):
+    _ignorar_sigint()
+    agendador.limitar_threads(n_threads)
+
+
+def avaliar_grupo(rep_idx, caminho, prefixo, subgrupos, n_threads=None):
+    """
+    Avalia todas as combinações de um grupo do 1º estágio numa run: carrega as vendas e
+    agrega os pares uma vez, monta matriz + split uma vez por subgrupo do 2º estágio e
+    avalia todos os K_VIZINHOS/K_RECS do subgrupo com uma só consulta de vizinhos, em
+    `n_threads` threads (as do worker; padrão: ai.N_THREADS). O tempo de cada estágio
+    compartilhado é rateado entre as combinações que o usam. Um erro num subgrupo não
+    descarta os demais: as combinações dele vão para as falhas, com a mensagem.
+
+    Retorna:
+        (lista de (combo_idx, rep_idx, precision@K, recall@K, tempo atribuído),
+         lista de (combo_idx, rep_idx, erro)).
+    """
+    import ai
+    import evaluate_v2
+    from ingest import agregar_vendas_brutas
+
+    base = {**ai.parametros_atuais(), **dict(zip(ESTAGIOS_GRID[0], prefixo))}
+    ini = time.perf_counter()
+    vendas = ai.preparar_vendas(caminho, base)
+    brutos, ancora = agregar_vendas_brutas(caminho, base)
+    t_prefixo = (time.perf_counter() - ini) / sum(len(c) for c in subgrupos.values())
+
+    out, falhas = [], []
+    for sub, caudas in subgrupos.items():
+        params = {**base, **dict(zip(ESTAGIOS_GRID[1], sub))}
+        try:
+            ini = time.perf_counter()
+            modelo = ai.construir_modelo(brutos, params, ancora, somente_matriz=True)
+            divisao = evaluate_v2.dividir_treino_teste(ai.filtrar_suporte(vendas, params))
+            # Toda a cauda (K_VIZINHOS × K_RECS) sai de uma única consulta de vizinhos
+            linhas = evaluate_v2.avaliar_divisao(
+                divisao,
+                k_vizinhos=sorted({c["K_VIZINHOS"] for _, c in caudas}),
+                k_recs=sorted({c["K_RECS"] for _, c in caudas}),
+                modelo_ref=modelo,
+                n_threads=n_threads,
+            )
+            mets = {(r["K_VIZINHOS"], r["K_RECS"]): r for r in linhas}
+            elapsed = t_prefixo + (time.perf_counter() - ini) / len(caudas)
+            for combo_idx, cauda in caudas:
+                r = mets[cauda["K_VIZINHOS"], cauda["K_RECS"]]
+                out.append((combo_idx, rep_idx, r["precision@K"], r["recall@K"], elapsed))
+        except Exception as e:
+            logger.error("Erro run %d, params %s: %s", rep_idx, params, e)
+            falhas.extend((combo_idx, rep_idx, repr(e)) for combo_idx, _ in caudas)
+    return out, falhas
 
 
 def print_progress(combo_idx, done, reps, avg_p, avg_r, avg_t):
@@ -165,55 +335,134 @@ def print_progress(combo_idx, done, reps, avg_p, avg_r, avg_t):
     print(f"{Colors.INFO}{msg}{Colors.RESET}", end="\r", flush=True)
 
 
+def executar_runs(
+    pool,
+    base,
+    combos,
+    indices,
+    reps_idx,
+    ao_resultado,
+    custos,
+    feitos=(),
+    n_threads=None,
+    ao_falha=None,
+):
+    """
+    Avalia as combinações `indices` nas runs `reps_idx` (dados gerados aqui enquanto o pool
+    já avalia as runs anteriores), pulando os pares (combo_idx, rep_idx) em `feitos` e
+    chamando `ao_resultado(combo_idx, rep_idx, p, r, t)` a cada resultado e
+    `ao_falha(combo_idx, rep_idx, erro)` a cada combinação que falhou, inclusive todas as de
+    um grupo cujo worker levantou exceção. Em cada run, os grupos vão ao pool do mais caro
+    para o mais barato segundo `custos` (avg_time por combo; combos sem histórico recebem a
+    média); `n_threads` é repassado a avaliar_grupo.
+
+    Retorna:
+        (nº de (combo, run) avaliados, (durações por envio, ordem ingênua dos envios)).
+    """
+    padrao = sum(custos.values()) / len(custos) if custos else 1.0
+    envio_de, posicoes = {}, []  # future → nº do envio; posição de cada envio na ordem ingênua
+    combos_de = {}  # future → [(combo_idx, rep_idx)] do grupo enviado
+    for rep in reps_idx:
+        if stop_event.is_set():
+            break
+        pendentes = [idx for idx in indices if (idx, rep) not in feitos]
+        if not pendentes:
+            continue
+        grupos = list(agrupar_combos(combos, pendentes).items())
+        custo_grupo = [
+            sum(custos.get(idx, padrao) for caudas in subgrupos.values() for idx, _ in caudas)
+            for _, subgrupos in grupos
+        ]
+        caminho = gerar_dados(base, rep)
+        inicio_rep = len(posicoes)
+        for pos in agendador.ordenar_por_custo(grupos, custo_grupo):
+            prefixo, subgrupos = grupos[pos]
+            fut = pool.submit(avaliar_grupo, rep, caminho, prefixo, subgrupos, n_threads)
+            envio_de[fut] = len(posicoes)
+            combos_de[fut] = [(idx, rep) for c in subgrupos.values() for idx, _ in c]
+            posicoes.append(inicio_rep + pos)
+
+    pending = set(envio_de)
+    duracoes = [0.0] * len(posicoes)
+    completed = 0
+    while pending:
+        if stop_event.is_set():
+            for fut in pending:
+                fut.cancel()
+        done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.cancelled():
+                continue
+            try:
+                out, falhas = fut.result()
+            except Exception as e:
+                logger.error("Erro em grupo: %s", e)
+                out, falhas = [], [(idx, rep, repr(e)) for idx, rep in combos_de[fut]]
+            duracoes[envio_de[fut]] = sum(t for *_, t in out)
+            for res in out:
+                completed += 1
+                ao_resultado(*res)
+            for falha in falhas:
+                if ao_falha:
+                    ao_falha(*falha)
+    ingenua = sorted(range(len(posicoes)), key=posicoes.__getitem__)
+    return completed, (duracoes, ingenua)
+
+
+def intervalo_precisao(lst, z):
+    """(média, limite inferior, limite superior) da precision@K das runs em `lst`."""
+    n = len(lst)
+    media = sum(p for p, _, _ in lst) / n
+    if n < 2:
+        return media, float("-inf"), float("inf")
+    var = sum((p - media) ** 2 for p, _, _ in lst) / (n - 1)
+    meia = z * math.sqrt(var / n)
+    return media, media - meia, media + meia
+
+
+def selecionar_sobreviventes(results, candidatos, eta, z):
+    """
+    Mantém as melhores ceil(n/eta) combinações pela média de precision@K e, além delas,
+    toda combinação cujo limite superior ainda alcança o limite inferior da líder (não dá
+    para descartá-la como possível melhor com as runs feitas até aqui).
+    """
+    stats = {i: intervalo_precisao(results[i], z) for i in candidatos if results[i]}
+    ordem = sorted(stats, key=lambda i: stats[i][0], reverse=True)
+    if not ordem:
+        return []
+    manter = set(ordem[: max(1, math.ceil(len(ordem) / eta))])
+    piso = stats[ordem[0]][1]
+    manter.update(i for i in ordem if stats[i][2] >= piso)
+    return sorted(manter)
+
+
 def main():
     args = parse_args()
     base = args.out
     reps = args.reps
-    setup_base_dir(base)
-
-    best = load_global_best(base)
     combos = list(itertools.product(*PARAM_GRID.values()))
     total = len(combos)
-    logger.info("Total combos: %d. Runs por combo: %d", total, reps)
+    custos = carregar_custos(args.custos or os.path.join(base, "grid_metrics.json"), combos)
+    journal_path = os.path.join(base, JOURNAL)
+    if args.resume:
+        os.makedirs(os.path.join(base, "logs"), exist_ok=True)
+    else:
+        setup_base_dir(base)
 
-    # Prepare task queue
-    task_q = queue.Queue()
-    for idx, combo in enumerate(combos, start=1):
-        params = dict(zip(PARAM_GRID.keys(), combo))
-        for rep in range(1, reps + 1):
-            task_q.put((idx, rep, params))
+    best = load_global_best(base)
+    logger.info(
+        "Total combos: %d. Runs por combo: %d. Grupos por run: %d",
+        total,
+        reps,
+        len(agrupar_combos(combos)),
+    )
 
     # Result storage
     results = {i: [] for i in range(1, total + 1)}
-    completed = 0
+    por_run = {}  # (combo_idx, rep_idx) → (p, r, t), inclusive os retomados do journal
+    falhas = {}  # (combo_idx, rep_idx) → erro, das runs que falharam nesta execução
     expected = total * reps
 
-    # Worker thread
-    def worker():
-        while not stop_event.is_set():
-            try:
-                combo_idx, rep_idx, params = task_q.get(block=False)
-            except queue.Empty:
-                return
-            try:
-                out = run_rep(combo_idx, rep_idx, params, base)
-                result_q.put(out)
-            except Exception as e:
-                logger.error("Erro combo %d run %d: %s", combo_idx, rep_idx, e)
-            finally:
-                task_q.task_done()
-
-    # Result queue
-    result_q = queue.Queue()
-
-    # Start threads
-    n_workers = os.cpu_count() or 1
-    threads = []
-    for _ in range(n_workers):
-        t = threading.Thread(target=worker, daemon=True)
-        t.start()
-        threads.append(t)
-
     # Handle Ctrl+C
     def sigint_handler(sig, frame):
         stop_event.set()
@@ -222,22 +471,19 @@ def main():
 
     signal.signal(signal.SIGINT, sigint_handler)
 
-    # Collect results
-    while completed < expected and not stop_event.is_set():
-        try:
-            combo_idx, rep_idx, p, r, t = result_q.get(timeout=0.5)
-        except queue.Empty:
-            continue
-        completed += 1
+    def registrar(combo_idx, rep_idx, p, r, t, mostrar=True):
+        nonlocal best
+        por_run[combo_idx, rep_idx] = (p, r, t)
         lst = results[combo_idx]
         lst.append((p, r, t))
-        done = len(lst)
-        avg_p = sum(x for x, _, _ in lst) / done
-        avg_r = sum(y for _, y, _ in lst) / done
-        avg_t = sum(z for *_, z in lst) / done
-        print_progress(combo_idx, done, reps, avg_p, avg_r, avg_t)
-
-        if done == reps and avg_p > best["precision@K"]:
+        done_n = len(lst)
+        avg_p = sum(x for x, _, _ in lst) / done_n
+        avg_r = sum(y for _, y, _ in lst) / done_n
+        avg_t = sum(z for *_, z in lst) / done_n
+        if mostrar:
+            print_progress(combo_idx, done_n, reps, avg_p, avg_r, avg_t)
+
+        if done_n == reps and avg_p > best["precision@K"]:
             best = {
                 "precision@K": avg_p,
                 "recall@K": avg_r,
@@ -246,11 +492,127 @@ def main():
             }
             save_best(best, base)
 
-    # Wait threads finish
-    for t in threads:
-        t.join()
+    if args.resume:
+        for combo_idx, rep_idx, p, r, t in ler_journal(journal_path, combos):
+            if (combo_idx, rep_idx) not in por_run and rep_idx <= reps:
+                registrar(combo_idx, rep_idx, p, r, t, mostrar=False)
+        logger.info("Retomando: %d runs já no journal '%s'", len(por_run), journal_path)
+    retomadas = len(por_run)
+    banco = BancoResultados(args.db)
+    rotulo = os.path.abspath(base)
+    execucao_id = execucao_do_journal(journal_path) if args.resume else None
+    if execucao_id is not None and banco.tem_execucao(execucao_id, rotulo):
+        logger.info("Retomando a execução %d do histórico '%s'", execucao_id, args.db)
+    else:
+        execucao_id = banco.nova_execucao("grid_search", rotulo)
+
+    def ao_resultado(combo_idx, rep_idx, p, r, t):
+        params = dict(zip(PARAM_GRID.keys(), combos[combo_idx - 1]))
+        banco.registrar(execucao_id, rep_idx, p, r, params, t)
+        if args.resume:
+            banco.descartar_falhas(execucao_id, rep_idx, params)
+        entrada = {
+            "execucao": execucao_id,
+            "combo": combo_idx,
+            "rep": rep_idx,
+            "params": params,
+            "precision@K": p,
+            "recall@K": r,
+            "time": t,
+        }
+        journal.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        journal.flush()
+        falhas.pop((combo_idx, rep_idx), None)
+        registrar(combo_idx, rep_idx, p, r, t)
+
+    def ao_falha(combo_idx, rep_idx, erro):
+        params = dict(zip(PARAM_GRID.keys(), combos[combo_idx - 1]))
+        banco.registrar_falha(execucao_id, rep_idx, params, erro)
+        entrada = {
+            "execucao": execucao_id,
+            "combo": combo_idx,
+            "rep": rep_idx,
+            "params": params,
+            "erro": erro,
+        }
+        journal.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        journal.flush()
+        falhas[combo_idx, rep_idx] = erro
+
+    n_workers = args.workers or os.cpu_count() or 1
+    n_threads = agendador.threads_por_worker(n_workers, args.threads)
+    logger.info(
+        "%d workers × %d threads de BLAS; custos conhecidos de %d combos",
+        n_workers,
+        n_threads,
+        len(custos),
+    )
+    inicio = time.time()
+    rodadas, lotes = [], []
+    with open(journal_path, "a", encoding="utf-8") as journal, ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_iniciar_worker, initargs=(n_threads,)
+    ) as pool:
+        if not args.halving:
+            _, lote = executar_runs(
+                pool,
+                base,
+                combos,
+                results.keys(),
+                range(1, reps + 1),
+                ao_resultado,
+                custos,
+                por_run,
+                n_threads,
+                ao_falha,
+            )
+            lotes.append(lote)
+        else:
+            # Successive halving: as runs de cada rodada são novas (rep_idx contínuo) e
+            # compartilhadas por todas as sobreviventes, como no grid completo
+            feitas = 0
+            alvo = max(1, min(args.reps_iniciais, reps))
+            candidatos = list(results.keys())
+            while candidatos and not stop_event.is_set():
+                _, lote = executar_runs(
+                    pool,
+                    base,
+                    combos,
+                    candidatos,
+                    range(feitas + 1, alvo + 1),
+                    ao_resultado,
+                    custos,
+                    por_run,
+                    n_threads,
+                    ao_falha,
+                )
+                lotes.append(lote)
+                print()
+                logger.info(
+                    "Rodada %d: %d combos com %d runs", len(rodadas) + 1, len(candidatos), alvo
+                )
+                rodadas.append({"combos": len(candidatos), "runs_por_combo": alvo})
+                feitas = alvo
+                if alvo >= reps:
+                    break
+                # Só as runs até esta rodada, mesmo que o journal já traga runs seguintes
+                amostras = {
+                    i: [por_run[i, rep] for rep in range(1, feitas + 1) if (i, rep) in por_run]
+                    for i in candidatos
+                }
+                candidatos = selecionar_sobreviventes(amostras, candidatos, args.eta, args.z)
+                alvo = min(reps, alvo * args.eta)
+    wall_time = time.time() - inicio
 
     print()  # newline after progress
+    logger.info(
+        "%d/%d runs avaliadas em %.1fs (%d retomadas do journal)",
+        len(por_run),
+        expected,
+        wall_time,
+        retomadas,
+    )
+    if falhas:
+        logger.error('%d runs falharam (ver "falhas" no resumo)', len(falhas))
 
     # Build summary
     summary = {"best": best, "combos": []}
@@ -276,19 +638,23 @@ def main():
     # total grid time
     total_grid_time = sum(combo_times.values())
     # percent of grid per combo
-    combo_percent = {idx: (t / total_grid_time) * 100 for idx, t in combo_times.items()}
-    # locate best combo index from best["params"]
-    params_tuple = tuple(best["params"][k] for k in PARAM_GRID.keys())
+    combo_percent = {
+        idx: (t / total_grid_time) * 100 if total_grid_time else 0.0
+        for idx, t in combo_times.items()
+    }
+    # locate best combo index from best["params"] (None se interrompido antes de algum
+    # combo completar as runs)
+    params_tuple = tuple(best["params"].get(k) for k in PARAM_GRID.keys())
     combo_index_map = {
         tuple(c): i for i, c in enumerate(itertools.product(*PARAM_GRID.values()), start=1)
     }
-    best_combo_idx = combo_index_map[params_tuple]
+    best_combo_idx = combo_index_map.get(params_tuple)
     # winner run time
     winner_run_time = best["time"]
     # total time of winner’s combo
-    winner_combo_time = combo_times[best_combo_idx]
+    winner_combo_time = combo_times.get(best_combo_idx, 0.0)
     # percent that combo took of the whole grid
-    winner_combo_pct = combo_percent[best_combo_idx]
+    winner_combo_pct = combo_percent.get(best_combo_idx, 0.0)
 
     time_metrics = {
         "winner_run_time": winner_run_time,
@@ -299,26 +665,73 @@ def main():
             for idx, t in combo_times.items()
         },
         "total_grid_time": total_grid_time,
+        "wall_time": wall_time,
+        "agendamento": agendador.relatorio(lotes, n_workers, wall_time),
     }
     summary["time_metrics"] = time_metrics
     # --- Time metrics block END ---
 
+    summary["falhas"] = [
+        {
+            "combo": idx,
+            "rep": rep,
+            "params": dict(zip(PARAM_GRID.keys(), combos[idx - 1])),
+            "erro": erro,
+        }
+        for (idx, rep), erro in sorted(falhas.items())
+    ]
+
+    if args.halving:
+        # Custo do grid completo estimado pelo tempo médio por run de cada combo
+        tempo_completo = sum(c["avg_time"] * reps for c in summary["combos"])
+        summary["halving"] = {
+            "eta": args.eta,
+            "z": args.z,
+            "rodadas": rodadas,
+            "runs_executadas": len(por_run),
+            "runs_grid_completo": expected,
+            "economia_runs_pct": (1 - len(por_run) / expected) * 100,
+            "tempo_grid_completo_estimado": tempo_completo,
+            "economia_tempo_pct": (
+                (1 - total_grid_time / tempo_completo) * 100 if tempo_completo else 0.0
+            ),
+        }
+
     # Save summary to disk
     metrics_path = os.path.join(base, "grid_metrics.json")
     with open(metrics_path, "w", encoding="utf-8") as f:
         json.dump(summary, f, indent=2, ensure_ascii=False)
     logger.info("Grid search completo. Resumo em '%s'", metrics_path)
+    banco.atualizar_resumo(
+        execucao_id, {k: v for k, v in summary.items() if k not in ("combos", "falhas")}
+    )
+    banco.fechar()
 
     # Print final best and time metrics
     print("\nMelhor configuração encontrada:")
     print(json.dumps(best, indent=2, ensure_ascii=False))
     print("\n=== Time Metrics ===")
     print(f"Run vencedor: {winner_run_time:.2f}s")
+    if best_combo_idx is not None:
+        print(
+            f"Combo #{best_combo_idx:03d} total: {winner_combo_time:.2f}s "
+            f"({winner_combo_pct:.2f}% do grid)"
+        )
+    print(f"Tempo total do grid: {total_grid_time:.2f}s (parede: {wall_time:.2f}s)")
+    ag = time_metrics["agendamento"]
     print(
-        f"Combo #{best_combo_idx:03d} total: {winner_combo_time:.2f}s "
-        f"({winner_combo_pct:.2f}% do grid)"
+        f"Ocupação dos workers: {ag['ocupacao_workers'] * 100:.1f}% ({ag['workers']} workers); "
+        f"makespan agendado {ag['makespan_agendado']:.2f}s vs ingênuo "
+        f"{ag['makespan_ingenuo']:.2f}s (limite inferior {ag['limite_inferior']:.2f}s)\n"
     )
-    print(f"Tempo total do grid: {total_grid_time:.2f}s\n")
+    if args.halving:
+        hv = summary["halving"]
+        print(
+            f"Halving: {hv['runs_executadas']}/{hv['runs_grid_completo']} runs "
+            f"({hv['economia_runs_pct']:.1f}% a menos), tempo estimado do grid completo "
+            f"{hv['tempo_grid_completo_estimado']:.2f}s "
+            f"({hv['economia_tempo_pct']:.1f}% economizado)\n"
+        )
     print("Detalhe por combo:")
     for idx, tm in time_metrics["combo_times"].items():
         print(f"  Combo {idx:03d}: {tm['total_time']:.2f}s ({tm['pct_of_grid']:.2f}% do grid)")
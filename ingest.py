@@ -0,0 +1,249 @@
+"""
+ingest.py
+
+Leitura em blocos (streaming) das vendas — CSV ou store colunar particionado por mês
+(sales_store.py) — com dtypes explícitos e só as colunas usadas no treino. Cada bloco passa
+pelo filtro MIN_QUANTITY e pela ponderação de recência e é reduzido a agregados por
+(cliente, produto); os agregados são compactados incrementalmente, de modo que a memória
+depende do número de pares distintos e do tamanho do bloco, não do tamanho do arquivo.
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+import sales_store
+
+CHUNK_SIZE = 200_000  # linhas por bloco lido do CSV
+COMPACT_ROWS = 2_000_000  # agregados parciais acumulados antes de recompactar
+
+SALES_DTYPES = {
+    "client": "category",
+    "location": "category",
+    "product": "category",
+    "customerFeedback": "category",
+    "quantity": "int16",
+}
+TRAIN_COLUMNS = ["client", "product", "quantity", "date", "customerFeedback"]
+FEEDBACK_MAP = {"Excelente": 5, "Bom": 4, "Regular": 3, "Ruim": 2, "Péssimo": 1}
+PAIR_COLUMNS = ["weighted_quantity", "quantity", "n", "feedback_sum", "feedback_n"]
+RECENCY_MODES = ("hiperbolico", "exponencial")
+
+logger = logging.getLogger(__name__)
+
+
+def _tipar(df: pd.DataFrame) -> pd.DataFrame:
+    """Aplica SALES_DTYPES às colunas presentes (lotes vindos do store)."""
+    tipos = {c: t for c, t in SALES_DTYPES.items() if c in df.columns}
+    df = df.astype(tipos)
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"])
+    return df.drop(columns=[sales_store.PARTITION_COL], errors="ignore")
+
+
+def ler_em_blocos(caminho: str, usecols=None, chunksize: int = CHUNK_SIZE, desde=None):
+    """
+    Itera sobre as vendas em blocos tipados (categóricos, int16, datetime). `caminho` pode
+    ser o CSV ou a raiz do store; no store, `desde` poda partições mensais inteiras.
+    """
+    cols = usecols or list(SALES_DTYPES) + ["date"]
+    if sales_store.eh_store(caminho):
+        for lote in sales_store.ler_vendas_em_lotes(caminho, cols, desde, chunksize):
+            yield _tipar(lote)
+        return
+    for bloco in pd.read_csv(
+        caminho,
+        usecols=cols,
+        dtype={c: t for c, t in SALES_DTYPES.items() if c in cols},
+        parse_dates=["date"] if "date" in cols else False,
+        chunksize=chunksize,
+    ):
+        yield bloco if desde is None else bloco[bloco["date"] >= desde]
+
+
+def carregar_vendas(caminho: str, usecols=None) -> pd.DataFrame:
+    """Lê as vendas inteiras (CSV ou store) em um DataFrame tipado."""
+    if sales_store.eh_store(caminho):
+        return _tipar(sales_store.ler_vendas(caminho, usecols))
+    return pd.read_csv(caminho, usecols=usecols, dtype=SALES_DTYPES, parse_dates=["date"])
+
+
+def data_maxima(caminho: str, min_quantity: int, chunksize: int = CHUNK_SIZE):
+    """
+    Maior data entre as interações com quantity >= min_quantity. No store basta a
+    partição mais recente; no CSV é uma passada pelas colunas quantity/date.
+    """
+    if sales_store.eh_store(caminho):
+        return sales_store.data_maxima(caminho, sales_store.ds.field("quantity") >= min_quantity)
+    max_date = None
+    for bloco in ler_em_blocos(caminho, ["quantity", "date"], chunksize):
+        datas = bloco.loc[bloco["quantity"] >= min_quantity, "date"]
+        if len(datas):
+            m = datas.max()
+            max_date = m if max_date is None or m > max_date else max_date
+    return max_date
+
+
+def peso_recencia(dias, alpha: float, modo: str = "hiperbolico") -> np.ndarray:
+    """
+    Peso de recência para `dias` desde a data âncora: 1 / (1 + α·d) no modo hiperbólico
+    (padrão) ou exp(-α·d) no exponencial. No exponencial, mudar a âncora em Δ dias
+    multiplica todos os pesos pelo mesmo fator exp(-α·Δ).
+    """
+    if modo not in RECENCY_MODES:
+        raise ValueError(f"RECENCY_MODE inválido: '{modo}' (use {' ou '.join(RECENCY_MODES)}).")
+    dias = np.asarray(dias, dtype=np.float64)
+    if modo == "exponencial":
+        return np.exp(-alpha * dias)
+    return 1 / (1 + alpha * dias)
+
+
+def agregar_pares(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduz interações (já com weighted_quantity e feedback_score) a uma linha por
+    (cliente, produto): soma ponderada, quantidade, nº de transações e soma/contagem
+    de feedback válido.
+    """
+    fb = df["feedback_score"]
+    tmp = pd.DataFrame(
+        {
+            "client": df["client"],
+            "product": df["product"],
+            "weighted_quantity": df["weighted_quantity"].astype(np.float64),
+            "quantity": df["quantity"].astype(np.int64),
+            "n": np.ones(len(df), dtype=np.int64),
+            "feedback_sum": fb.fillna(0).astype(np.float64),
+            "feedback_n": fb.notna().astype(np.int64),
+        }
+    )
+    return tmp.groupby(["client", "product"], observed=True, sort=False).sum().reset_index()
+
+
+def filtrar_pares(pares: pd.DataFrame, min_product_support: int, min_client_transactions: int):
+    """
+    Aplica MIN_PRODUCT_SUPPORT (clientes distintos por produto) e, sobre os produtos
+    mantidos, MIN_CLIENT_TRANSACTIONS (transações por cliente), como em preparar_dados.
+    """
+    support = pares.groupby("product", observed=True).size()
+    pares = pares[pares["product"].isin(support[support >= min_product_support].index)]
+    txn_counts = pares.groupby("client", observed=True)["n"].sum()
+    pares = pares[pares["client"].isin(txn_counts[txn_counts >= min_client_transactions].index)]
+    return _categorias_ordenadas(pares)
+
+
+def _categorias_ordenadas(pares: pd.DataFrame) -> pd.DataFrame:
+    """Garante categorias ordenadas e sem sobras (a ordem define os códigos do modelo)."""
+    pares = pares.copy()
+    for col in ("client", "product"):
+        cat = pd.Categorical(pares[col]).remove_unused_categories()
+        pares[col] = cat.reorder_categories(sorted(cat.categories))
+    return pares.reset_index(drop=True)
+
+
+def mesclar_pares(*partes: pd.DataFrame) -> pd.DataFrame:
+    """Soma agregados por par vindos de fontes diferentes (une as categorias antes)."""
+    cats = {
+        col: sorted(set().union(*(pd.Categorical(p[col]).categories for p in partes)))
+        for col in ("client", "product")
+    }
+    alinhadas = [
+        p.assign(**{col: pd.Categorical(p[col], categories=c) for col, c in cats.items()})
+        for p in partes
+    ]
+    df = pd.concat(alinhadas, ignore_index=True)
+    return df.groupby(["client", "product"], observed=True)[PAIR_COLUMNS].sum().reset_index()
+
+
+def anexar_vendas(df: pd.DataFrame, caminho: str):
+    """Acrescenta vendas novas à fonte (partições do store ou final do CSV)."""
+    if sales_store.eh_store(caminho):
+        sales_store.escrever_vendas(df, caminho, append=True)
+        return
+    colunas = pd.read_csv(caminho, nrows=0).columns
+    df[list(colunas)].to_csv(caminho, mode="a", header=False, index=False, encoding="utf-8")
+
+
+def _compactar(partes: list) -> pd.DataFrame:
+    df = pd.concat(partes, ignore_index=True)
+    return df.groupby(["client", "product"], sort=False)[PAIR_COLUMNS].sum().reset_index()
+
+
+def agregar_vendas_brutas(caminho: str, params: dict, chunksize: int = CHUNK_SIZE):
+    """
+    Lê as vendas (CSV ou store) em blocos e devolve os agregados por (cliente, produto)
+    com quantity >= MIN_QUANTITY, ponderados por recência (ALPHA e RECENCY_MODE, relativa
+    à maior data), ainda sem os filtros de suporte/transações. Com RECENCY_WINDOW_DAYS, só entram
+    vendas dos últimos N dias.
+
+    Retorna:
+        (agregados por par, data âncora da recência)
+    """
+    min_quantity = params["MIN_QUANTITY"]
+    alpha = params["ALPHA"]
+    modo = params.get("RECENCY_MODE", "hiperbolico")
+    janela = params.get("RECENCY_WINDOW_DAYS")
+
+    logger.info("Lendo vendas de '%s' em blocos de %d linhas", caminho, chunksize)
+    max_date = data_maxima(caminho, min_quantity, chunksize)
+    if max_date is None:
+        raise ValueError(f"Nenhuma interação com quantity >= {min_quantity} em '{caminho}'.")
+    desde = max_date - pd.Timedelta(days=janela) if janela else None
+
+    # Códigos globais estáveis entre blocos (cada bloco tem suas próprias categorias)
+    cli_codes, prod_codes = {}, {}
+    partes, n_partes, n_linhas = [], 0, 0
+    for bloco in ler_em_blocos(caminho, TRAIN_COLUMNS, chunksize, desde):
+        n_linhas += len(bloco)
+        bloco = bloco[bloco["quantity"] >= min_quantity]
+        if bloco.empty:
+            continue
+        days_since = (max_date - bloco["date"]).dt.days.to_numpy()
+        fb = bloco["customerFeedback"].map(FEEDBACK_MAP).astype("float64").to_numpy()
+        quantity = bloco["quantity"].to_numpy(dtype=np.int64)
+
+        cmap = np.array(
+            [cli_codes.setdefault(c, len(cli_codes)) for c in bloco["client"].cat.categories],
+            dtype=np.int32,
+        )
+        pmap = np.array(
+            [prod_codes.setdefault(p, len(prod_codes)) for p in bloco["product"].cat.categories],
+            dtype=np.int32,
+        )
+        parte = pd.DataFrame(
+            {
+                "client": cmap[bloco["client"].cat.codes.to_numpy()],
+                "product": pmap[bloco["product"].cat.codes.to_numpy()],
+                "weighted_quantity": quantity * peso_recencia(days_since, alpha, modo),
+                "quantity": quantity,
+                "n": np.ones(len(bloco), dtype=np.int64),
+                "feedback_sum": np.nan_to_num(fb),
+                "feedback_n": (~np.isnan(fb)).astype(np.int64),
+            }
+        )
+        partes.append(_compactar([parte]))
+        n_partes += len(partes[-1])
+        if n_partes > COMPACT_ROWS:
+            partes = [_compactar(partes)]
+            n_partes = len(partes[0])
+
+    if not partes:
+        raise ValueError(f"Nenhuma interação com quantity >= {min_quantity} em '{caminho}'.")
+    pares = _compactar(partes)
+    pares["client"] = pd.Categorical.from_codes(pares["client"], categories=list(cli_codes))
+    pares["product"] = pd.Categorical.from_codes(pares["product"], categories=list(prod_codes))
+    logger.info("%d linhas agregadas em %d pares cliente×produto", n_linhas, len(pares))
+    return pares, max_date
+
+
+def agregar_vendas(caminho: str, params: dict, chunksize: int = CHUNK_SIZE) -> pd.DataFrame:
+    """
+    Agregados por (cliente, produto) já filtrados por MIN_QUANTITY, MIN_PRODUCT_SUPPORT e
+    MIN_CLIENT_TRANSACTIONS (ver agregar_vendas_brutas). Clientes/produtos são
+    categóricos ordenados.
+    """
+    pares, _ = agregar_vendas_brutas(caminho, params, chunksize)
+    logger.info(
+        "Filtrando produtos com suporte < %d e clientes com < %d transações",
+        params["MIN_PRODUCT_SUPPORT"],
+        params["MIN_CLIENT_TRANSACTIONS"],
+    )
+    return filtrar_pares(pares, params["MIN_PRODUCT_SUPPORT"], params["MIN_CLIENT_TRANSACTIONS"])
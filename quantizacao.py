@@ -0,0 +1,155 @@
+"""
+quantizacao.py
+
+Vetores de clientes/produtos em precisão reduzida para servir com menos memória:
+float32 (padrão), float16 ou int8 com uma escala float32 por linha (x ≈ q · escala,
+q ∈ [-127, 127]). Os embeddings densos do modo "fatores" são guardados na precisão
+escolhida e desquantizados para float32 bloco a bloco no produto escalar (GEMM via BLAS),
+sem reconstruir a matriz float inteira. A CSR do KNN também tem versão int8
+(CSRQuantizada): o produto esparso roda sobre os dados int8, acumulado em int32 por bloco,
+e as escalas entram só no resultado. scipy.sparse não aceita float16, então em float16 a
+CSR fica em float32.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+from scipy.sparse import csr_matrix
+
+PRECISOES = ("float64", "float32", "float16", "int8")
+PRECISOES_ESPARSAS = ("float64", "float32", "int8")  # precisões em que a busca KNN roda
+BLOCO_PRODUTO = 4096  # linhas de `outros` desquantizadas por vez em VetoresQuantizados.produto
+
+
+def dtype_esparso(precisao: str):
+    """
+    dtype da matriz CSR float do modelo servido: float64 ou float32. O ANN, a similaridade
+    item–item e a atualização incremental operam sobre essa matriz, então em int8 ela
+    continua float32 (a busca int8 usa CSRQuantizada, ver dtype_busca) e em float16 —
+    dtype que scipy.sparse rejeita — também.
+    """
+    return np.float64 if precisao == "float64" else np.float32
+
+
+def dtype_busca(precisao: str):
+    """dtype da busca KNN em `precisao`: int8 (CSRQuantizada) ou o de dtype_esparso."""
+    return np.int8 if precisao == "int8" else dtype_esparso(precisao)
+
+
+def _escalas(maximos: np.ndarray) -> np.ndarray:
+    escalas = maximos / 127
+    escalas[escalas == 0] = 1.0
+    return escalas
+
+
+@dataclass
+class VetoresQuantizados:
+    """Matriz densa (linhas = vetores) em `dados`, com `escalas` por linha no modo int8."""
+
+    dados: np.ndarray
+    escalas: Optional[np.ndarray] = None
+
+    @classmethod
+    def de(cls, x: np.ndarray, precisao: str = "float32") -> "VetoresQuantizados":
+        if precisao not in PRECISOES:
+            raise ValueError(f"PRECISAO inválida: '{precisao}' (use {', '.join(PRECISOES)}).")
+        x = np.asarray(x)
+        if precisao != "int8":
+            return cls(np.ascontiguousarray(x, dtype=precisao))
+        escalas = _escalas(np.abs(x).max(axis=1))
+        q = np.rint(x / escalas[:, None]).clip(-127, 127).astype(np.int8)
+        return cls(np.ascontiguousarray(q), escalas.astype(np.float32))
+
+    @property
+    def precisao(self) -> str:
+        return str(self.dados.dtype)
+
+    @property
+    def shape(self) -> tuple:
+        return self.dados.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.dados.nbytes + (self.escalas.nbytes if self.escalas is not None else 0)
+
+    def __len__(self) -> int:
+        return len(self.dados)
+
+    def linhas(self, idx=slice(None)) -> np.ndarray:
+        """Linhas desquantizadas em float32 (float64 se for essa a precisão)."""
+        x = self.dados[idx]
+        if self.escalas is None:
+            return x if x.dtype == np.float64 else x.astype(np.float32, copy=False)
+        return x.astype(np.float32) * self.escalas[idx, None]
+
+    def produto(
+        self, outros: "VetoresQuantizados", idx=slice(None), tamanho_bloco: int = BLOCO_PRODUTO
+    ) -> np.ndarray:
+        """
+        Produtos escalares das linhas `idx` contra todas as linhas de `outros`
+        (self[idx] · outrosᵀ). Os dois lados são desquantizados para float32 — `outros` em
+        blocos de `tamanho_bloco` linhas — e multiplicados por GEMM float32: um matmul
+        inteiro int8/int32 em numpy não usa BLAS e sai mais lento, e a cópia float32 em voo
+        fica limitada a um bloco.
+        """
+        a = self.linhas(idx)
+        out = np.empty((len(a), len(outros)), dtype=np.result_type(a.dtype, np.float32))
+        for ini in range(0, len(outros), tamanho_bloco):
+            fim = ini + tamanho_bloco
+            out[:, ini:fim] = a @ outros.linhas(slice(ini, fim)).T
+        return out
+
+
+@dataclass
+class CSRQuantizada:
+    """
+    CSR com os valores em int8 (`dados`, mesma estrutura de índices da original) e uma
+    escala float32 por linha (`escalas`): x ≈ q · escala.
+    """
+
+    dados: csr_matrix
+    escalas: np.ndarray
+
+    precisao = "int8"
+
+    @classmethod
+    def de(cls, x: csr_matrix) -> "CSRQuantizada":
+        x = csr_matrix(x)
+        escalas = _escalas(abs(x).max(axis=1).toarray().ravel().astype(np.float64))
+        por_valor = np.repeat(escalas, np.diff(x.indptr))
+        q = np.rint(x.data / por_valor).clip(-127, 127).astype(np.int8)
+        return cls(csr_matrix((q, x.indices, x.indptr), shape=x.shape), escalas.astype(np.float32))
+
+    @property
+    def shape(self) -> tuple:
+        return self.dados.shape
+
+    @property
+    def dtype(self):
+        """dtype das similaridades/scores calculados (os dados ficam em int8)."""
+        return np.dtype(np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        d = self.dados
+        return d.data.nbytes + d.indices.nbytes + d.indptr.nbytes + self.escalas.nbytes
+
+    def produto(self, outros: "CSRQuantizada", idx=slice(None)) -> np.ndarray:
+        """
+        self[idx] · outrosᵀ denso em float32. O bloco de linhas `idx` sobe para int32 e o
+        produto esparso acumula em int32 (int8 × int8 em scipy acumula em int8 e
+        transborda); as escalas das duas matrizes são aplicadas só no resultado.
+        """
+        out = (self.dados[idx].astype(np.int32) @ outros.dados.T).toarray().astype(np.float32)
+        out *= self.escalas[idx, None]
+        out *= outros.escalas[None, :]
+        return out
+
+    def combinacao(self, pesos: csr_matrix) -> csr_matrix:
+        """
+        pesos · X (soma ponderada de linhas): as escalas entram nos pesos de cada coluna de
+        `pesos` e o produto roda sobre os dados int8.
+        """
+        pesos = csr_matrix(pesos, dtype=np.float64, copy=True)
+        pesos.data *= self.escalas[pesos.indices]
+        return pesos @ self.dados
@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+"""
+resultados_db.py
+
+Histórico de resultados do testbench e do grid search num SQLite local (RESULTADOS_DB),
+em vez de JSONs monolíticos que precisam ser carregados inteiros para qualquer pergunta.
+
+Tabelas:
+- execucoes: uma linha por execução de testbench/grid (origem, rótulo, início, resumo JSON).
+- params: cada combinação de hiperparâmetros (JSON canônico) com um id inteiro.
+- runs: uma linha por run (run_id = Exec do testbench ou rep do grid, params_id,
+  precision@K, recall@K, tempo, retries, timestamp). Resumos importados do
+  grid_metrics.json, que só guardam médias, entram como uma linha por combo com
+  n_runs = nº de runs da média, e os agregados ponderam por n_runs.
+- agregados / histograma: somas por (execução, params) e contagens por faixa de
+  precision@K (LARGURA_FAIXA) por execução, mantidas a cada inserção. As consultas de
+  melhores combinações, tempos e distribuição leem só essas tabelas, então custam
+  milissegundos mesmo com centenas de milhares de runs; percentis e histograma têm a
+  resolução de LARGURA_FAIXA.
+- falhas: uma linha por run que falhou (run_id, params_id, erro, timestamp); não entram
+  nos agregados, mas a listagem de execuções mostra quantas houve.
+
+Índices em runs (execucao_id, run_id), (params_id) e (ts).
+
+Uso:
+    python resultados_db.py importar baseline/testbench_10000/metrics.json ...
+    python resultados_db.py melhores --origem grid_search --top 5
+    python resultados_db.py distribuicao --origem testbench
+    python resultados_db.py tempos --execucao 3
+    python resultados_db.py execucoes
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import logging
+from collections import defaultdict
+from typing import Optional
+import numpy as np
+
+RESULTADOS_DB = "resultados.db"  # banco padrão (no diretório atual)
+INTERVALO_COMMIT = 1.0  # segundos entre commits durante a escrita contínua
+LARGURA_FAIXA = 1e-3  # resolução do histograma de precision@K (percentis/distribuição)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS execucoes (
+    id INTEGER PRIMARY KEY,
+    origem TEXT NOT NULL,
+    rotulo TEXT NOT NULL,
+    inicio REAL NOT NULL,
+    resumo TEXT
+);
+CREATE TABLE IF NOT EXISTS params (
+    id INTEGER PRIMARY KEY,
+    chave TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    execucao_id INTEGER NOT NULL REFERENCES execucoes(id),
+    run_id INTEGER,
+    params_id INTEGER REFERENCES params(id),
+    precisao REAL NOT NULL,
+    recall REAL,
+    tempo REAL,
+    retries INTEGER,
+    n_runs INTEGER NOT NULL DEFAULT 1,
+    ts REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agregados (
+    execucao_id INTEGER NOT NULL,
+    params_id INTEGER NOT NULL,  -- 0 = runs sem params (testbench)
+    n INTEGER NOT NULL,
+    soma_p REAL NOT NULL,
+    soma_p2 REAL NOT NULL,
+    soma_r REAL NOT NULL,
+    n_t INTEGER NOT NULL,  -- runs com tempo medido
+    soma_t REAL NOT NULL,
+    PRIMARY KEY (execucao_id, params_id)
+);
+CREATE TABLE IF NOT EXISTS histograma (
+    execucao_id INTEGER NOT NULL,
+    faixa INTEGER NOT NULL,  -- floor(precisao / LARGURA_FAIXA)
+    n INTEGER NOT NULL,
+    PRIMARY KEY (execucao_id, faixa)
+);
+CREATE TABLE IF NOT EXISTS falhas (
+    id INTEGER PRIMARY KEY,
+    execucao_id INTEGER NOT NULL REFERENCES execucoes(id),
+    run_id INTEGER,
+    params_id INTEGER REFERENCES params(id),
+    erro TEXT NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_execucao_run ON runs(execucao_id, run_id);
+CREATE INDEX IF NOT EXISTS runs_params ON runs(params_id);
+CREATE INDEX IF NOT EXISTS runs_ts ON runs(ts);
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def chave_params(params: Optional[dict]) -> Optional[str]:
+    """JSON canônico (chaves ordenadas) dos params, usado para agrupar e indexar."""
+    return json.dumps(params, sort_keys=True) if params else None
+
+
+class BancoResultados:
+    """
+    Escrita incremental (commits a cada INTERVALO_COMMIT segundos e em fechar()) e
+    consultas agregadas, filtráveis por origem e/ou execução.
+    """
+
+    def __init__(self, caminho: str = RESULTADOS_DB):
+        self.caminho = caminho
+        self.con = sqlite3.connect(caminho)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.executescript(ESQUEMA)
+        self._ids_params = {}
+        self._ultimo_commit = time.time()
+
+    def nova_execucao(
+        self,
+        origem: str,
+        rotulo: str,
+        resumo: Optional[dict] = None,
+        inicio: Optional[float] = None,
+    ) -> int:
+        cur = self.con.execute(
+            "INSERT INTO execucoes (origem, rotulo, inicio, resumo) VALUES (?, ?, ?, ?)",
+            (origem, rotulo, inicio or time.time(), json.dumps(resumo) if resumo else None),
+        )
+        self.con.commit()
+        return cur.lastrowid
+
+    def atualizar_resumo(self, execucao_id: int, resumo: dict):
+        self.con.execute(
+            "UPDATE execucoes SET resumo = ? WHERE id = ?",
+            (json.dumps(resumo, default=float), execucao_id),
+        )
+        self.con.commit()
+
+    def _id_params(self, params: Optional[dict]) -> Optional[int]:
+        chave = chave_params(params)
+        if chave is None:
+            return None
+        if chave not in self._ids_params:
+            self.con.execute("INSERT OR IGNORE INTO params (chave) VALUES (?)", (chave,))
+            (self._ids_params[chave],) = self.con.execute(
+                "SELECT id FROM params WHERE chave = ?", (chave,)
+            ).fetchone()
+        return self._ids_params[chave]
+
+    def registrar(
+        self,
+        execucao_id: int,
+        run_id: Optional[int],
+        precisao: float,
+        recall: Optional[float] = None,
+        params: Optional[dict] = None,
+        tempo: Optional[float] = None,
+        retries: Optional[int] = None,
+        n_runs: int = 1,
+        ts: Optional[float] = None,
+    ):
+        self.registrar_varios(
+            execucao_id, [(run_id, precisao, recall, params, tempo, retries, n_runs, ts)]
+        )
+
+    def registrar_varios(self, execucao_id: int, linhas: list):
+        """`linhas`: (run_id, precisao, recall, params, tempo, retries, n_runs, ts)."""
+        agora = time.time()
+        runs = []
+        agg = defaultdict(lambda: [0, 0.0, 0.0, 0.0, 0, 0.0])
+        hist = defaultdict(int)
+        for run_id, p, r, params, t, tries, n, ts in linhas:
+            pid = self._id_params(params)
+            runs.append((execucao_id, run_id, pid, p, r, t, tries, n, ts or agora))
+            a = agg[pid or 0]
+            a[0] += n
+            a[1] += p * n
+            a[2] += p * p * n
+            a[3] += (r or 0.0) * n
+            if t is not None:
+                a[4] += n
+                a[5] += t * n
+            hist[int(p / LARGURA_FAIXA + 1e-9)] += n  # 1e-9: 0.392 cai na faixa 392, não 391
+        self.con.executemany(
+            "INSERT INTO runs (execucao_id, run_id, params_id, precisao, recall, tempo,"
+            " retries, n_runs, ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            runs,
+        )
+        self.con.executemany(
+            "INSERT INTO agregados VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (execucao_id, params_id) DO UPDATE SET n = n + excluded.n,"
+            " soma_p = soma_p + excluded.soma_p, soma_p2 = soma_p2 + excluded.soma_p2,"
+            " soma_r = soma_r + excluded.soma_r, n_t = n_t + excluded.n_t,"
+            " soma_t = soma_t + excluded.soma_t",
+            [(execucao_id, pid, *a) for pid, a in agg.items()],
+        )
+        self.con.executemany(
+            "INSERT INTO histograma VALUES (?, ?, ?) "
+            "ON CONFLICT (execucao_id, faixa) DO UPDATE SET n = n + excluded.n",
+            [(execucao_id, faixa, n) for faixa, n in hist.items()],
+        )
+        if agora - self._ultimo_commit >= INTERVALO_COMMIT:
+            self.con.commit()
+            self._ultimo_commit = agora
+
+    def registrar_falha(
+        self,
+        execucao_id: int,
+        run_id: Optional[int],
+        params: Optional[dict],
+        erro: str,
+        ts: Optional[float] = None,
+    ):
+        self.con.execute(
+            "INSERT INTO falhas (execucao_id, run_id, params_id, erro, ts) VALUES (?, ?, ?, ?, ?)",
+            (execucao_id, run_id, self._id_params(params), erro, ts or time.time()),
+        )
+        self.con.commit()
+
+    def descartar_falhas(self, execucao_id: int, run_id: Optional[int], params: Optional[dict]):
+        """Apaga as falhas de uma run que foi refeita com sucesso (grid search retomado)."""
+        self.con.execute(
+            "DELETE FROM falhas WHERE execucao_id = ? AND run_id IS ? AND params_id IS ?",
+            (execucao_id, run_id, self._id_params(params)),
+        )
+
+    def fechar(self):
+        self.con.commit()
+        self.con.close()
+
+    def ja_importado(self, rotulo: str) -> bool:
+        return (
+            self.con.execute(
+                "SELECT 1 FROM execucoes WHERE rotulo = ? LIMIT 1", (rotulo,)
+            ).fetchone()
+            is not None
+        )
+
+    def tem_execucao(self, execucao_id: int, rotulo: str) -> bool:
+        return (
+            self.con.execute(
+                "SELECT 1 FROM execucoes WHERE id = ? AND rotulo = ?", (execucao_id, rotulo)
+            ).fetchone()
+            is not None
+        )
+
+    # ------------------------------------------------------------------ consultas
+    @staticmethod
+    def _filtro(
+        tabela: str, origem: Optional[str], execucao: Optional[int], juncao: str = ""
+    ) -> tuple:
+        cond, args = [], []
+        if origem:
+            cond.append("e.origem = ?")
+            args.append(origem)
+        if execucao:
+            cond.append("a.execucao_id = ?")
+            args.append(execucao)
+        where = " AND ".join(cond) or "1"
+        return (
+            f"FROM {tabela} a JOIN execucoes e ON e.id = a.execucao_id {juncao} WHERE {where}",
+            args,
+        )
+
+    def execucoes(self) -> list:
+        sql = (
+            "SELECT e.id, e.origem, e.rotulo, e.inicio, SUM(a.n),"
+            " (SELECT COUNT(*) FROM falhas f WHERE f.execucao_id = e.id) "
+            "FROM execucoes e LEFT JOIN agregados a ON a.execucao_id = e.id "
+            "GROUP BY e.id ORDER BY e.id"
+        )
+        return [
+            {"id": i, "origem": o, "rotulo": rot, "inicio": ini, "runs": n or 0, "falhas": nf}
+            for i, o, rot, ini, n, nf in self.con.execute(sql)
+        ]
+
+    def melhores(
+        self,
+        origem: Optional[str] = None,
+        execucao: Optional[int] = None,
+        top: int = 10,
+        min_runs: int = 1,
+    ) -> list:
+        """Combinações de params pela média de precision@K (ponderada por n_runs)."""
+        base, args = self._filtro(
+            "agregados", origem, execucao, "JOIN params p ON p.id = a.params_id"
+        )
+        sql = (
+            "SELECT p.chave, SUM(a.n) AS n, SUM(a.soma_p) / SUM(a.n), SUM(a.soma_r) / SUM(a.n),"
+            " SUM(a.soma_t) / NULLIF(SUM(a.n_t), 0) "
+            f"{base} AND a.params_id != 0 "
+            "GROUP BY a.params_id HAVING n >= ? ORDER BY 3 DESC LIMIT ?"
+        )
+        return [
+            {"params": json.loads(p), "runs": n, "precision@K": pr, "recall@K": rc, "avg_time": t}
+            for p, n, pr, rc, t in self.con.execute(sql, (*args, min_runs, top))
+        ]
+
+    def distribuicao(
+        self, origem: Optional[str] = None, execucao: Optional[int] = None, bins: int = 10
+    ) -> dict:
+        """Contagem, média, desvio, percentis e histograma da precision@K das runs."""
+        base, args = self._filtro("agregados", origem, execucao)
+        n, soma_p, soma_p2 = self.con.execute(
+            f"SELECT SUM(a.n), SUM(a.soma_p), SUM(a.soma_p2) {base}", args
+        ).fetchone()
+        if not n:
+            return {"runs": 0}
+        base, args = self._filtro("histograma", origem, execucao)
+        faixas = self.con.execute(
+            f"SELECT a.faixa, SUM(a.n) {base} GROUP BY a.faixa ORDER BY a.faixa", args
+        ).fetchall()
+        faixa, contagem = np.array(faixas, dtype=np.float64).T
+        centros = (faixa + 0.5) * LARGURA_FAIXA
+        acumulado = np.cumsum(contagem) / contagem.sum()
+        media = soma_p / n
+        contagens, bordas = np.histogram(
+            centros,
+            bins=bins,
+            weights=contagem,
+            range=(faixa[0] * LARGURA_FAIXA, (faixa[-1] + 1) * LARGURA_FAIXA),
+        )
+        return {
+            "runs": int(n),
+            "media": media,
+            "desvio": float(np.sqrt(max(soma_p2 / n - media**2, 0.0))),
+            "min": float(faixa[0] * LARGURA_FAIXA),
+            "max": float((faixa[-1] + 1) * LARGURA_FAIXA),
+            "percentis": {
+                q: float(centros[min(np.searchsorted(acumulado, q / 100), len(centros) - 1)])
+                for q in (5, 25, 50, 75, 95)
+            },
+            "histograma": [
+                {"de": float(a), "ate": float(b), "runs": int(c)}
+                for a, b, c in zip(bordas[:-1], bordas[1:], contagens)
+            ],
+        }
+
+    def tempos(
+        self, origem: Optional[str] = None, execucao: Optional[int] = None, top: int = 20
+    ) -> list:
+        """Tempo total e médio por combinação de params, do maior total para o menor."""
+        base, args = self._filtro(
+            "agregados", origem, execucao, "LEFT JOIN params p ON p.id = a.params_id"
+        )
+        sql = (
+            "SELECT p.chave, SUM(a.n_t), SUM(a.soma_t), SUM(a.soma_t) / SUM(a.n_t) "
+            f"{base} AND a.n_t > 0 GROUP BY a.params_id ORDER BY 3 DESC"
+        )
+        linhas = self.con.execute(sql, args).fetchall()
+        total = sum(t for _, _, t, _ in linhas) or 1.0
+        return [
+            {
+                "params": json.loads(p) if p else None,
+                "runs": n,
+                "total_time": t,
+                "avg_time": m,
+                "pct_of_total": t / total * 100,
+            }
+            for p, n, t, m in linhas[:top]
+        ]
+
+
+def _linha_testbench(r: dict, ts: float) -> tuple:
+    # Formato atual (Exec/retries/tempo) e o antigo (iteracao/tentativas)
+    return (
+        r.get("Exec", r.get("iteracao")),
+        r["precision@K"],
+        r.get("recall@K"),
+        None,
+        (r.get("tempo") or {}).get("total"),
+        r.get("retries", r.get("tentativas")),
+        1,
+        ts,
+    )
+
+
+def importar(banco: BancoResultados, caminho: str, forcar: bool = False) -> Optional[int]:
+    """
+    Importa um metrics.json do testbench, um grid_metrics.json, um journal.jsonl do grid
+    search ou um results.jsonl do testbench -i como uma nova execução. Arquivos já
+    importados (mesmo caminho) são pulados, a não ser com `forcar`. Retorna o id da
+    execução (None se pulado).
+    """
+    rotulo = os.path.abspath(caminho)
+    if not forcar and banco.ja_importado(rotulo):
+        logger.warning("'%s' já importado; pulando", caminho)
+        return None
+    ts = os.path.getmtime(caminho)
+
+    if caminho.endswith(".jsonl"):
+        with open(caminho, "r", encoding="utf-8") as f:
+            entradas = []
+            for linha in f:
+                try:
+                    entradas.append(json.loads(linha))
+                except ValueError:
+                    continue
+        if entradas and "params" not in entradas[0]:
+            exec_id = banco.nova_execucao("testbench", rotulo, inicio=ts)
+            linhas = [_linha_testbench(e, ts) for e in entradas]
+        else:
+            exec_id = banco.nova_execucao("grid_search", rotulo, inicio=ts)
+            linhas = [
+                (e["rep"], e["precision@K"], e["recall@K"], e["params"], e["time"], None, 1, ts)
+                for e in entradas
+                if "erro" not in e
+            ]
+            for e in entradas:
+                if "erro" in e:
+                    banco.registrar_falha(exec_id, e["rep"], e["params"], e["erro"], ts)
+    else:
+        with open(caminho, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        resumo = {k: v for k, v in dados.items() if k not in ("results", "combos")}
+        if "combos" in dados:
+            exec_id = banco.nova_execucao("grid_search", rotulo, resumo, inicio=ts)
+            linhas = [
+                (
+                    None,
+                    c["avg_precision@K"],
+                    c["avg_recall@K"],
+                    c["params"],
+                    c["avg_time"],
+                    None,
+                    c["runs"],
+                    ts,
+                )
+                for c in dados["combos"]
+                if c.get("runs")
+            ]
+        else:
+            exec_id = banco.nova_execucao("testbench", rotulo, resumo, inicio=ts)
+            linhas = [_linha_testbench(r, ts) for r in dados.get("results", [])]
+    banco.registrar_varios(exec_id, linhas)
+    banco.con.commit()
+    logger.info("'%s' importado como execução %d (%d linhas)", caminho, exec_id, len(linhas))
+    return exec_id
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Histórico de resultados (testbench/grid search)")
+    p.add_argument("--db", default=RESULTADOS_DB, help=f"Banco SQLite (padrão: {RESULTADOS_DB})")
+    sub = p.add_subparsers(dest="comando", required=True)
+
+    imp = sub.add_parser(
+        "importar", help="Importa metrics.json, grid_metrics.json, journal.jsonl ou results.jsonl"
+    )
+    imp.add_argument("arquivos", nargs="+")
+    imp.add_argument("--forcar", action="store_true", help="Reimporta arquivos já importados")
+
+    ex = sub.add_parser("execucoes", help="Lista as execuções registradas")
+    ex.add_argument("--json", action="store_true", help="Saída em JSON")
+    for nome, ajuda in (
+        ("melhores", "Melhores combinações pela média de precision@K"),
+        ("distribuicao", "Distribuição da precision@K"),
+        ("tempos", "Tempo por combinação"),
+    ):
+        q = sub.add_parser(nome, help=ajuda)
+        q.add_argument("--origem", choices=("testbench", "grid_search"))
+        q.add_argument("--execucao", type=int, help="Só a execução com este id")
+        q.add_argument("--json", action="store_true", help="Saída em JSON")
+        if nome != "distribuicao":
+            q.add_argument("--top", type=int, default=10)
+        if nome == "melhores":
+            q.add_argument("--min-runs", type=int, default=1)
+        if nome == "distribuicao":
+            q.add_argument("--bins", type=int, default=10)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_args(argv)
+    banco = BancoResultados(args.db)
+    ini = time.perf_counter()
+    try:
+        if args.comando == "importar":
+            for caminho in args.arquivos:
+                importar(banco, caminho, args.forcar)
+            return
+        if args.comando == "execucoes":
+            saida = banco.execucoes()
+        elif args.comando == "melhores":
+            saida = banco.melhores(args.origem, args.execucao, args.top, args.min_runs)
+        elif args.comando == "distribuicao":
+            saida = banco.distribuicao(args.origem, args.execucao, args.bins)
+        else:
+            saida = banco.tempos(args.origem, args.execucao, args.top)
+    finally:
+        banco.fechar()
+    ms = (time.perf_counter() - ini) * 1000
+
+    if args.json:
+        print(json.dumps(saida, indent=2, ensure_ascii=False))
+        return
+    if args.comando == "execucoes":
+        print(f"{'id':>4}  {'origem':<12}{'runs':>8}{'falhas':>8}  rótulo")
+        for e in saida:
+            print(f"{e['id']:>4}  {e['origem']:<12}{e['runs']:>8}{e['falhas']:>8}  {e['rotulo']}")
+    elif args.comando == "melhores":
+        print(f"{'precision@K':>12}{'recall@K':>10}{'avg_time':>10}{'runs':>7}  params")
+        for m in saida:
+            print(
+                f"{m['precision@K']:>12.4f}{m['recall@K'] or 0:>10.4f}"
+                f"{m['avg_time'] or 0:>10.3f}{m['runs']:>7}  {json.dumps(m['params'])}"
+            )
+    elif args.comando == "distribuicao":
+        if not saida["runs"]:
+            print("Nenhuma run encontrada.")
+        else:
+            print(
+                f"runs={saida['runs']} média={saida['media']:.4f} desvio={saida['desvio']:.4f} "
+                f"min={saida['min']:.4f} max={saida['max']:.4f}"
+            )
+            print("  ".join(f"p{q}={v:.4f}" for q, v in saida["percentis"].items()))
+            maior = max(h["runs"] for h in saida["histograma"]) or 1
+            for h in saida["histograma"]:
+                barra = "#" * round(40 * h["runs"] / maior)
+                print(f"  [{h['de']:.4f}, {h['ate']:.4f}) {h['runs']:>8} {barra}")
+    else:
+        print(f"{'total':>10}{'médio':>9}{'%':>7}{'runs':>7}  params")
+        for t in saida:
+            print(
+                f"{t['total_time']:>10.2f}{t['avg_time']:>9.3f}{t['pct_of_total']:>7.2f}"
+                f"{t['runs']:>7}  {json.dumps(t['params'])}"
+            )
+    print(f"({ms:.1f} ms)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+sales_store.py
+
+Armazenamento colunar das vendas (Parquet via pyarrow), particionado por mês de `date`
+no layout hive: <raiz>/month=AAAA-MM/*.parquet. Consumidores leem só as colunas que usam
+e só as partições dentro de uma janela de recência; o CSV continua disponível como formato
+de importação/exportação:
+
+    python sales_store.py import data/sells_data.csv   # CSV → store
+    python sales_store.py export data/sells_data.csv   # store → CSV
+"""
+
+import os
+import argparse
+import logging
+import shutil
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow é opcional: sem ele, apenas o CSV é usado
+    pa = pc = ds = pq = None
+
+STORE_DIR = "data/sells_store"  # raiz do store particionado
+PARTITION_COL = "month"
+ROW_COL = "row"  # posição da linha na fonte original (as leituras voltam nessa ordem)
+BATCH_ROWS = 200_000  # linhas por lote na leitura em streaming
+
+logger = logging.getLogger(__name__)
+
+
+def disponivel() -> bool:
+    """True se pyarrow estiver instalado."""
+    return pq is not None
+
+
+def _exigir_pyarrow():
+    if pq is None:
+        raise ImportError("O store colunar requer pyarrow (pip install pyarrow).")
+
+
+def eh_store(caminho: str) -> bool:
+    """Um store é um diretório (o CSV é um arquivo)."""
+    return os.path.isdir(caminho)
+
+
+def escrever_vendas(df: pd.DataFrame, raiz: str = STORE_DIR, append: bool = False):
+    """
+    Grava as vendas particionadas por mês. Sem `append` o store é substituído;
+    com `append` novos arquivos são adicionados às partições existentes, numerados depois
+    das linhas já gravadas (como linhas acrescentadas ao final do CSV).
+    """
+    _exigir_pyarrow()
+    inicio = _dataset(raiz).count_rows() if append and os.path.isdir(raiz) else 0
+    df = df.copy()
+    df[ROW_COL] = np.arange(inicio, inicio + len(df), dtype=np.int64)
+    df["date"] = pd.to_datetime(df["date"])
+    df[PARTITION_COL] = df["date"].dt.strftime("%Y-%m")
+    if not append and os.path.isdir(raiz):
+        shutil.rmtree(raiz)
+    pq.write_to_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        root_path=raiz,
+        partition_cols=[PARTITION_COL],
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    logger.info("%d vendas gravadas em '%s/'", len(df), raiz)
+
+
+def _dataset(raiz: str):
+    _exigir_pyarrow()
+    return ds.dataset(
+        raiz,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([(PARTITION_COL, pa.string())]), flavor="hive"),
+    )
+
+
+def _filtro(desde) -> "ds.Expression":
+    if desde is None:
+        return None
+    desde = pd.Timestamp(desde)
+    # A partição (string AAAA-MM) poda arquivos inteiros; a data refina dentro do mês
+    return (ds.field(PARTITION_COL) >= desde.strftime("%Y-%m")) & (
+        ds.field("date") >= pa.scalar(desde.to_pydatetime())
+    )
+
+
+def ler_vendas_em_lotes(raiz: str, columns=None, desde=None, batch_rows: int = BATCH_ROWS):
+    """
+    Itera DataFrames lidos do store, só com `columns` e partições a partir de `desde`. Os
+    lotes saem na ordem dos arquivos, não na da fonte original (ver ler_vendas).
+    """
+    dataset = _dataset(raiz)
+    scanner = dataset.scanner(columns=columns, filter=_filtro(desde), batch_size=batch_rows)
+    for lote in scanner.to_batches():
+        if lote.num_rows:
+            yield lote.to_pandas().drop(columns=[ROW_COL], errors="ignore")
+
+
+def ler_vendas(raiz: str = STORE_DIR, columns=None, desde=None) -> pd.DataFrame:
+    """
+    Lê o store inteiro (ou a janela a partir de `desde`) como um DataFrame, na ordem das
+    linhas da fonte original — a mesma do CSV importado, de modo que amostragens por
+    posição (o split de evaluate_v2.py) coincidem entre CSV e store.
+    """
+    dataset = _dataset(raiz)
+    ordenar = ROW_COL in dataset.schema.names
+    if columns is not None and ordenar:
+        columns = list(columns) + [ROW_COL]
+    df = dataset.to_table(columns=columns, filter=_filtro(desde)).to_pandas()
+    if not ordenar:  # store gravado antes de ROW_COL: ordem dos arquivos
+        return df
+    df = df.sort_values(ROW_COL, kind="stable").drop(columns=[ROW_COL])
+    return df.reset_index(drop=True)
+
+
+def particoes(raiz: str = STORE_DIR) -> list:
+    """Meses (AAAA-MM) presentes no store, em ordem crescente."""
+    prefixo = f"{PARTITION_COL}="
+    return sorted(
+        d[len(prefixo) :]
+        for d in os.listdir(raiz)
+        if d.startswith(prefixo) and os.path.isdir(os.path.join(raiz, d))
+    )
+
+
+def data_maxima(raiz: str, columns_filter=None):
+    """Maior `date` do store, lendo apenas a partição mais recente (e o filtro dado)."""
+    for mes in reversed(particoes(raiz)):
+        filtro = ds.field(PARTITION_COL) == mes
+        if columns_filter is not None:
+            filtro = filtro & columns_filter
+        datas = _dataset(raiz).to_table(columns=["date"], filter=filtro).column("date")
+        if len(datas):
+            return pd.Timestamp(pc.max(datas).as_py())
+    return None
+
+
+def fonte(raiz: str) -> dict:
+    """Identificação do conteúdo do store (arquivos, tamanho total e mtime mais recente)."""
+    n, tamanho, mtime = 0, 0, 0
+    for dirpath, _, arquivos in os.walk(raiz):
+        for nome in arquivos:
+            st = os.stat(os.path.join(dirpath, nome))
+            n, tamanho, mtime = n + 1, tamanho + st.st_size, max(mtime, st.st_mtime_ns)
+    return {"caminho": os.path.abspath(raiz), "arquivos": n, "tamanho": tamanho, "mtime_ns": mtime}
+
+
+def importar_csv(csv_path: str, raiz: str = STORE_DIR):
+    """Converte um CSV de vendas no store particionado."""
+    escrever_vendas(pd.read_csv(csv_path, parse_dates=["date"]), raiz)
+
+
+def exportar_csv(csv_path: str, raiz: str = STORE_DIR):
+    """Exporta o store para CSV (mesmo layout gerado por fake_customers_generation.py)."""
+    df = ler_vendas(raiz).drop(columns=[PARTITION_COL]).sort_values(["client", "date"])
+    df.to_csv(csv_path, index=False, encoding="utf-8-sig")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    p = argparse.ArgumentParser(description="Importa/exporta o store colunar de vendas")
+    p.add_argument("acao", choices=["import", "export"])
+    p.add_argument("csv", help="Caminho do CSV de vendas")
+    p.add_argument("--store", default=STORE_DIR, help="Raiz do store particionado")
+    a = p.parse_args()
+    if a.acao == "import":
+        importar_csv(a.csv, a.store)
+    else:
+        exportar_csv(a.csv, a.store)
+    logger.info("Concluído: %s '%s' ↔ '%s/'", a.acao, a.csv, a.store)
@@ -2,7 +2,6 @@
 import os
 import sys
 import subprocess
-import ast
 import json
 import time
 import signal
@@ -11,6 +10,9 @@ import shutil
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import agendador
+from resultados_db import RESULTADOS_DB, BancoResultados
+
 
 # ANSI colors for level tags
 class Colors:
@@ -22,6 +24,9 @@ class Colors:
 
 SCRIPTS = ["fake_customers_generation.py", "ai.py", "evaluate_v2.py"]
 MAX_RETRIES = 3
+RESULT_FILE = "resultado.json"  # métricas + tempos gravados pelo evaluate_v2.py (--resultado)
+STREAM_FILE = "results.jsonl"  # modo -i: um resultado por linha, gravado ao chegar
+SNAPSHOT_INTERVAL = 30  # modo -i: segundos entre snapshots do metrics.json
 
 
 class LevelColorFormatter(logging.Formatter):
@@ -58,6 +63,21 @@ def parse_args():
     g = p.add_mutually_exclusive_group()
     g.add_argument("-n", "--n_runs", type=int, default=100, help="Número de iterações (finito)")
     g.add_argument("-i", "--indefinite", action="store_true", help="Modo indefinido até Ctrl+C")
+    p.add_argument(
+        "-w", "--workers", type=int, default=0, help="Execuções em paralelo (padrão: nº de CPUs)"
+    )
+    p.add_argument(
+        "-t",
+        "--threads",
+        type=int,
+        default=0,
+        help="Threads de BLAS/OpenMP por execução (padrão: nº de CPUs / workers)",
+    )
+    p.add_argument(
+        "--db",
+        default=RESULTADOS_DB,
+        help=f"Banco SQLite do histórico de resultados (padrão: {RESULTADOS_DB})",
+    )
     return p.parse_args()
 
 
@@ -68,47 +88,95 @@ def setup_workspace(base):
     logger.info(f"Workspace criado em '{base}/'")
 
 
-def extract_metrics(logfile):
+def read_result(path):
+    """Resultado gravado pelo evaluate_v2.py --resultado (None se a execução falhou)."""
     try:
-        with open(logfile, "r", encoding="utf-8", errors="ignore") as f:
-            lines = f.read().splitlines()
-    except Exception:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
         return None
 
-    for text in reversed(lines):
-        text = text.strip()
-        if not (text.startswith("{") and text.endswith("}")):
-            continue
-        try:
-            d = ast.literal_eval(text)
-        except (ValueError, SyntaxError):
-            continue
-        if isinstance(d, dict) and "precision@K" in d:
-            return d
-    return None
-
 
-def run_single(idx, logs_dir):
+def run_single(idx, logs_dir, env=None):
     ws = os.path.join(logs_dir, f"Exec_{idx:02d}")
     os.makedirs(ws, exist_ok=True)
     data_dir = os.path.join(ws, "data")
     os.makedirs(data_dir, exist_ok=True)
     shutil.copy(os.path.abspath("data/source.py"), os.path.join(data_dir, "source.py"))
     logpath = os.path.join(ws, f"Exec_{idx:02d}.log")
+    result_path = os.path.join(ws, RESULT_FILE)
 
+    ini = time.time()
     for attempt in range(1, MAX_RETRIES + 1):
-        if os.path.exists(logpath):
-            os.remove(logpath)
+        for path in (logpath, result_path):
+            if os.path.exists(path):
+                os.remove(path)
         with open(logpath, "w", encoding="utf-8") as log:
             for script in SCRIPTS:
+                extra = ["--resultado", RESULT_FILE] if script == "evaluate_v2.py" else []
                 subprocess.run(
-                    [sys.executable, os.path.abspath(script)], cwd=ws, stdout=log, stderr=log
+                    [sys.executable, os.path.abspath(script), *extra],
+                    cwd=ws,
+                    stdout=log,
+                    stderr=log,
+                    env=env,
                 )
-        mets = extract_metrics(logpath)
-        if mets:
-            return idx, mets, attempt
-        time.sleep(1)
-    return idx, {"precision@K": 0.0, "recall@K": 0.0}, MAX_RETRIES
+        res = read_result(result_path)
+        if res:
+            return idx, {**res["metricas"], "tempo": res["tempo"]}, attempt, time.time() - ini
+    return idx, {"precision@K": 0.0, "recall@K": 0.0}, MAX_RETRIES, time.time() - ini
+
+
+class RunningStats:
+    """
+    Agregados das execuções em memória O(1): média e variância (Welford) de precision@K e
+    recall@K e as estatísticas de retries, sem guardar os resultados.
+    """
+
+    KEYS = ("precision@K", "recall@K")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = dict.fromkeys(self.KEYS, 0.0)
+        self.m2 = dict.fromkeys(self.KEYS, 0.0)
+        self.retries_sum = 0
+        self.retries_max = 0
+        self.with_retry = 0
+        self.failed = 0
+
+    def add(self, mets, tries):
+        self.n += 1
+        for k in self.KEYS:
+            delta = mets[k] - self.mean[k]
+            self.mean[k] += delta / self.n
+            self.m2[k] += delta * (mets[k] - self.mean[k])
+        self.retries_sum += tries
+        self.retries_max = max(self.retries_max, tries)
+        self.with_retry += tries > 1
+        self.failed += tries == MAX_RETRIES
+
+    def stability(self):
+        return {
+            "avg_retries": self.retries_sum / self.n if self.n else 0.0,
+            "max_retries": self.retries_max,
+            "with_retry": self.with_retry,
+            "failed": self.failed,
+        }
+
+    def aggregates(self):
+        out = {}
+        for k in self.KEYS:
+            var = self.m2[k] / (self.n - 1) if self.n > 1 else 0.0
+            out[k] = {"mean": self.mean[k], "variance": var, "std": var**0.5}
+        return out
+
+
+def write_json_atomic(path, data):
+    """Grava `data` em `path` via arquivo temporário + rename (nunca deixa JSON pela metade)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
 
 
 def load_global_best():
@@ -146,7 +214,13 @@ def main():
     logs_dir = os.path.join(base, "logs")
     global_best = load_global_best()
     best = {"Exec": None, "precision@K": global_best, "recall@K": 0.0}
+    # No modo -i os resultados vão só para o arquivo; em memória ficam os agregados
     results, stop = [], False
+    stats = RunningStats()
+    stream = None
+    if args.indefinite:
+        stream = open(os.path.join(base, STREAM_FILE), "a", encoding="utf-8")
+    metrics_path = os.path.join(base, "metrics.json")
 
     def _sigint(sig, frame):
         nonlocal stop
@@ -156,40 +230,96 @@ def main():
 
     signal.signal(signal.SIGINT, _sigint)
 
+    # Cada execução é um pipeline de subprocessos; sem limite, os pools de BLAS de todos
+    # eles disputariam todos os núcleos
+    n_workers = args.workers or os.cpu_count() or 1
+    n_threads = agendador.threads_por_worker(n_workers, args.threads)
+    env = agendador.ambiente_limitado(n_threads)
+    logger.info(f"{n_workers} execuções em paralelo × {n_threads} threads de BLAS")
+    ocupado = 0.0
+    banco = BancoResultados(args.db)
+    execucao_id = banco.nova_execucao("testbench", os.path.abspath(base))
+
+    def registrar(run_id, mets, tries):
+        result = {"Exec": run_id, **mets, "retries": tries}
+        stats.add(mets, tries)
+        if stream:
+            stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+            stream.flush()
+        else:
+            results.append(result)
+        banco.registrar(
+            execucao_id,
+            run_id,
+            mets["precision@K"],
+            mets["recall@K"],
+            tempo=mets.get("tempo", {}).get("total"),
+            retries=tries,
+        )
+
+    def summary():
+        elapsed = time.time() - start
+        out = {
+            "best": best,
+            "elapsed_time": elapsed,
+            "results_count": stats.n,
+            "stability": stats.stability(),
+            "aggregates": stats.aggregates(),
+            "agendamento": {
+                "workers": n_workers,
+                "threads_por_worker": n_threads,
+                "tempo_ocupado": ocupado,
+                "ocupacao_workers": ocupado / (elapsed * n_workers) if elapsed else 0.0,
+            },
+        }
+        if stream:
+            out["results_file"] = STREAM_FILE
+        return out
+
     start = time.time()
-    executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+    last_snapshot = start
+    executor = ThreadPoolExecutor(max_workers=n_workers)
 
     try:
         if args.indefinite:
             # start one per worker
-            pool = os.cpu_count() or 1
-            futures = {executor.submit(run_single, i + 1, logs_dir): i + 1 for i in range(pool)}
+            pool = n_workers
+            futures = {
+                executor.submit(run_single, i + 1, logs_dir, env): i + 1 for i in range(pool)
+            }
             next_idx = pool + 1
             while futures and not stop:
                 done = next(as_completed(futures), None)
                 if not done:
                     break
                 run_id = futures.pop(done)
-                _, mets, tries = done.result()
-                results.append({"Exec": run_id, **mets, "retries": tries})
+                _, mets, tries, dur = done.result()
+                ocupado += dur
+                registrar(run_id, mets, tries)
                 elapsed = time.time() - start
                 print_progress(run_id, None, mets["precision@K"], mets["recall@K"], elapsed)
                 if mets["precision@K"] > best["precision@K"]:
                     best = {"Exec": run_id, **mets}
                     save_best(best)
+                if time.time() - last_snapshot >= SNAPSHOT_INTERVAL:
+                    write_json_atomic(metrics_path, summary())
+                    last_snapshot = time.time()
                 if not stop:
-                    fut = executor.submit(run_single, next_idx, logs_dir)
+                    fut = executor.submit(run_single, next_idx, logs_dir, env)
                     futures[fut] = next_idx
                     next_idx += 1
 
         else:
-            futures = {executor.submit(run_single, i, logs_dir): i for i in range(1, total + 1)}
+            futures = {
+                executor.submit(run_single, i, logs_dir, env): i for i in range(1, total + 1)
+            }
             for fut in as_completed(futures):
                 if stop:
                     break
                 run_id = futures[fut]
-                _, mets, tries = fut.result()
-                results.append({"Exec": run_id, **mets, "retries": tries})
+                _, mets, tries, dur = fut.result()
+                ocupado += dur
+                registrar(run_id, mets, tries)
                 elapsed = time.time() - start
                 print_progress(run_id, total, mets["precision@K"], mets["recall@K"], elapsed)
                 if mets["precision@K"] > best["precision@K"]:
@@ -197,33 +327,25 @@ def main():
 
     finally:
         executor.shutdown(wait=False, cancel_futures=True)
+        if stream:
+            stream.close()
         print()
 
-    # compute stability
-    retries = [r["retries"] for r in results]
-    stability = {
-        "avg_retries": sum(retries) / len(retries) if retries else 0.0,
-        "max_retries": max(retries) if retries else 0,
-        "with_retry": sum(1 for t in retries if t > 1),
-        "failed": sum(1 for t in retries if t == MAX_RETRIES),
-    }
-
-    final = {
-        "best": best,
-        "elapsed_time": time.time() - start,
-        "results_count": len(results),
-        "stability": stability,
-        "results": results,
-    }
-    metrics_path = os.path.join(base, "metrics.json")
-    with open(metrics_path, "w", encoding="utf-8") as f:
-        json.dump(final, f, indent=2, ensure_ascii=False)
+    final = summary()
+    banco.atualizar_resumo(execucao_id, final)
+    banco.fechar()
+    if not stream:
+        final["results"] = results
+    write_json_atomic(metrics_path, final)
     logger.info(f"Métricas salvas em '{metrics_path}'")
 
     if not args.indefinite and best["Exec"] and best["precision@K"] > global_best:
         save_best(best)
 
-    logger.info(f"Testbench concluído em {time.time() - start:.1f}s")
+    logger.info(
+        f"Testbench concluído em {time.time() - start:.1f}s "
+        f"(ocupação dos workers: {final['agendamento']['ocupacao_workers'] * 100:.1f}%)"
+    )
 
 
 if __name__ == "__main__":
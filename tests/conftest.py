@@ -0,0 +1,34 @@
+"""Fixtures compartilhadas: um dataset de vendas fictícias fixo (semente) em CSV."""
+
+import os
+import random
+import sys
+
+import pandas as pd
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+
+@pytest.fixture(scope="session")
+def vendas() -> pd.DataFrame:
+    from fake_customers_generation import generate_fake_sales
+
+    random.seed(0)
+    return pd.DataFrame(generate_fake_sales())
+
+
+@pytest.fixture
+def vendas_csv(vendas, tmp_path) -> str:
+    caminho = tmp_path / "sells_data.csv"
+    vendas.to_csv(caminho, index=False, encoding="utf-8-sig")
+    return str(caminho)
+
+
+@pytest.fixture
+def params() -> dict:
+    import ai
+
+    return ai.parametros_atuais()
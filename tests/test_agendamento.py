@@ -0,0 +1,160 @@
+"""Agendamento do grid search: agrupamento por estágio, ordem LPT dos grupos e relatório."""
+
+import itertools
+import json
+from concurrent.futures import Future
+
+import pytest
+
+import agendador
+import grid_search
+from grid_search import (
+    ESTAGIOS_GRID,
+    PARAM_GRID,
+    agrupar_combos,
+    execucao_do_journal,
+    executar_runs,
+    ler_journal,
+)
+
+COMBOS = list(itertools.product(*PARAM_GRID.values()))
+CHAVES = list(PARAM_GRID)
+
+
+def _folhas(arvore):
+    for prefixo, subgrupos in arvore.items():
+        for sub, caudas in subgrupos.items():
+            for idx, cauda in caudas:
+                yield prefixo, sub, idx, cauda
+
+
+def test_agrupar_combos_cobre_cada_combinacao_uma_vez():
+    arvore = agrupar_combos(COMBOS)
+    folhas = list(_folhas(arvore))
+    assert sorted(idx for _, _, idx, _ in folhas) == list(range(1, len(COMBOS) + 1))
+    for prefixo, sub, idx, cauda in folhas:
+        params = dict(zip(CHAVES, COMBOS[idx - 1]))
+        assert prefixo == tuple(params[k] for k in ESTAGIOS_GRID[0])
+        assert sub == tuple(params[k] for k in ESTAGIOS_GRID[1])
+        assert cauda == {k: params[k] for k in ESTAGIOS_GRID[2]}
+    assert len(arvore) == len(PARAM_GRID["ALPHA"]) * len(PARAM_GRID["MIN_QUANTITY"])
+
+    parcial = agrupar_combos(COMBOS, [7, 3, 200])
+    assert sorted(idx for _, _, idx, _ in _folhas(parcial)) == [3, 7, 200]
+
+
+def test_ordenar_por_custo_lpt_com_empates_estaveis():
+    assert agendador.ordenar_por_custo(["a", "b", "c", "d"], [1.0, 3.0, 1.0, 2.0]) == [1, 3, 0, 2]
+
+
+def test_makespan_e_relatorio():
+    # Ordem ingênua termina com a tarefa longa; LPT a envia primeiro
+    ingenua = [1.0, 1.0, 1.0, 1.0, 4.0]
+    lpt = sorted(ingenua, reverse=True)
+    assert agendador.makespan(ingenua, 2) == 6.0
+    assert agendador.makespan(lpt, 2) == 4.0
+
+    rel = agendador.relatorio([(lpt, [1, 2, 3, 4, 0])], 2, wall_time=4.0)
+    assert rel["tarefas"] == 5
+    assert rel["tempo_ocupado"] == 8.0
+    assert rel["ocupacao_workers"] == pytest.approx(1.0)
+    assert rel["makespan_agendado"] == 4.0
+    assert rel["makespan_ingenuo"] == 6.0
+    assert rel["limite_inferior"] == 4.0
+
+
+class _PoolSincrono:
+    """Executa cada envio na hora, registrando a ordem dos grupos enviados."""
+
+    def __init__(self):
+        self.enviados = []
+
+    def submit(self, fn, rep, caminho, prefixo, subgrupos, n_threads):
+        self.enviados.append((rep, prefixo, n_threads))
+        fut = Future()
+        try:
+            fut.set_result(fn(rep, caminho, prefixo, subgrupos, n_threads))
+        except Exception as e:  # como no pool real, a exceção fica no future
+            fut.set_exception(e)
+        return fut
+
+
+def test_executar_runs_envia_grupos_do_mais_caro_ao_mais_barato(monkeypatch):
+    arvore = agrupar_combos(COMBOS)
+    grupos = list(arvore)
+    # Custo por combo cresce com a posição do grupo: a ordem LPT é a inversa da ingênua
+    custos = {idx: float(grupos.index(p) + 1) for p, _, idx, _ in _folhas(arvore)}
+    custo_grupo = [sum(custos[idx] for p, _, idx, _ in _folhas(arvore) if p == g) for g in grupos]
+    feitos = {(idx, 0) for p, _, idx, _ in _folhas(arvore) if p == grupos[-1]}
+
+    def _avaliar(rep, caminho, prefixo, subgrupos, n_threads):
+        return [(idx, rep, 0.5, 0.5, custos[idx]) for c in subgrupos.values() for idx, _ in c], []
+
+    monkeypatch.setattr(grid_search, "gerar_dados", lambda base, rep: f"{base}/run{rep}.csv")
+    monkeypatch.setattr(grid_search, "avaliar_grupo", _avaliar)
+    pool, resultados = _PoolSincrono(), []
+    indices = list(range(1, len(COMBOS) + 1))
+    n, (duracoes, ingenua) = executar_runs(
+        pool, "base", COMBOS, indices, [0, 1], lambda *r: resultados.append(r), custos, feitos, 2
+    )
+
+    assert n == len(resultados) == 2 * len(COMBOS) - len(feitos)
+    assert not {(idx, rep) for idx, rep, *_ in resultados} & feitos
+    # Run 0 sem o grupo mais caro (já no journal); run 1 com todos, do mais caro ao mais barato
+    assert pool.enviados == [(0, p, 2) for p in grupos[-2::-1]] + [(1, p, 2) for p in grupos[::-1]]
+    # A ordem ingênua devolve os envios à ordem da árvore de cada run
+    assert [duracoes[i] for i in ingenua] == custo_grupo[:-1] + custo_grupo
+
+
+def test_executar_runs_registra_falhas(monkeypatch):
+    arvore = agrupar_combos(COMBOS)
+    quebrado = next(iter(arvore))
+
+    def _avaliar(rep, caminho, prefixo, subgrupos, n_threads):
+        if prefixo == quebrado:
+            raise RuntimeError("worker caiu")
+        primeiro, *demais = subgrupos.values()
+        ok = [(idx, rep, 0.5, 0.5, 1.0) for c in demais for idx, _ in c]
+        return ok, [(idx, rep, "ValueError()") for idx, _ in primeiro]
+
+    monkeypatch.setattr(grid_search, "gerar_dados", lambda base, rep: f"{base}/run{rep}.csv")
+    monkeypatch.setattr(grid_search, "avaliar_grupo", _avaliar)
+    resultados, falhas = [], []
+    indices = list(range(1, len(COMBOS) + 1))
+    n, _ = executar_runs(
+        _PoolSincrono(),
+        "base",
+        COMBOS,
+        indices,
+        [0],
+        lambda *r: resultados.append(r),
+        {},
+        ao_falha=lambda *f: falhas.append(f),
+    )
+
+    # Nenhuma combinação some: cada uma termina como resultado ou como falha
+    assert n == len(resultados)
+    assert sorted(idx for idx, *_ in resultados + falhas) == indices
+    do_grupo = {idx for p, _, idx, _ in _folhas(arvore) if p == quebrado}
+    assert {idx for idx, _, e in falhas if e == "RuntimeError('worker caiu')"} == do_grupo
+
+
+def test_journal_retomado_guarda_execucao_e_pula_falhas(tmp_path):
+    caminho = tmp_path / "journal.jsonl"
+    params = dict(zip(CHAVES, COMBOS[4]))
+    linhas = [
+        {"execucao": 3, "combo": 5, "rep": 1, "params": params, "erro": "ValueError()"},
+        {
+            "execucao": 3,
+            "combo": 5,
+            "rep": 2,
+            "params": params,
+            "precision@K": 0.3,
+            "recall@K": 0.2,
+            "time": 1.5,
+        },
+    ]
+    caminho.write_text("".join(json.dumps(e) + "\n" for e in linhas) + '{"trunc', "utf-8")
+    assert execucao_do_journal(str(caminho)) == 3
+    assert execucao_do_journal(str(tmp_path / "nao_existe.jsonl")) is None
+    assert list(ler_journal(str(caminho), COMBOS)) == [(5, 2, 0.3, 0.2, 1.5)]
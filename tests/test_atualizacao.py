@@ -0,0 +1,89 @@
+"""atualizar_modelo: incorporar vendas novas equivale a reconstruir com todas as vendas."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ai
+from ingest import agregar_vendas_brutas, carregar_vendas
+
+
+def _csv(df, caminho) -> str:
+    df.to_csv(caminho, index=False, encoding="utf-8-sig")
+    return str(caminho)
+
+
+@pytest.mark.parametrize("cenario", ["cliente_novo", "clientes_existentes"])
+def test_atualizacao_incremental_igual_a_reconstrucao(
+    vendas, params, tmp_path, monkeypatch, cenario
+):
+    monkeypatch.setattr(ai, "REBUILD_FRACTION", 1.0)
+    if cenario == "cliente_novo":
+        base = vendas
+    else:
+        # A data máxima fica na base, para que a âncora da recência seja a mesma nos dois builds
+        sorteio = np.random.default_rng(0).random(len(vendas)) < 0.05
+        base = vendas[~(sorteio & (vendas["date"] != vendas["date"].max()))]
+    brutos, ancora = agregar_vendas_brutas(_csv(base, tmp_path / "base.csv"), params)
+    m = ai.construir_modelo(brutos, params, ancora)
+    if cenario == "cliente_novo":
+        # Cópia das compras de um cliente, só de produtos já no modelo (colunas inalteradas)
+        cliente = vendas["client"].value_counts().index[0]
+        novas = vendas[(vendas["client"] == cliente) & vendas["product"].isin(m.produtos.tolist())]
+        novas = novas.assign(client="Cliente Novo")
+    else:
+        novas = vendas.drop(base.index)
+    ai.materializar_tabela(m, 10)
+
+    # O caminho incremental não pode cair na reconstrução
+    construir = ai.construir_modelo
+    monkeypatch.setattr(ai, "construir_modelo", lambda *a, **k: pytest.fail("reconstruiu"))
+    m = ai.atualizar_modelo(carregar_vendas(_csv(novas, tmp_path / "novas.csv")), m)
+
+    todas = _csv(pd.concat([base, novas]), tmp_path / "todas.csv")
+    brutos, ancora_ref = agregar_vendas_brutas(todas, params)
+    ref = construir(brutos, params, ancora_ref)
+    assert ancora_ref == ancora
+    assert cenario != "cliente_novo" or "Cliente Novo" in m.clientes
+    assert sorted(m.clientes.tolist()) == sorted(ref.clientes.tolist())
+    assert m.produtos.tolist() == ref.produtos.tolist()
+
+    linhas = ref.clientes.codificar(m.clientes.tolist())
+    np.testing.assert_allclose(m.matriz.toarray(), ref.matriz.toarray()[linhas], atol=1e-6)
+    np.testing.assert_allclose(m.normas, np.asarray(ref.normas)[linhas], rtol=1e-6)
+    ai.materializar_tabela(ref, 10)
+    for cliente in m.clientes:
+        assert ai.recomendar_por_cliente(cliente, modelo_ref=m) == ai.recomendar_por_cliente(
+            cliente, modelo_ref=ref
+        )
+
+
+def test_atualizacao_remenda_grafo_e_tabela(vendas, params, tmp_path, monkeypatch):
+    brutos, ancora = agregar_vendas_brutas(_csv(vendas, tmp_path / "base.csv"), params)
+    m = ai.construir_modelo(brutos, params, ancora)
+    ai.materializar_tabela(m, 10)
+    grafo, tabela = m.grafo, m.tabela.copy()
+    # Recompras de produtos que os clientes já têm: IDF e vocabulários inalterados
+    clientes = vendas["client"].unique()[:3]
+    novas = vendas[vendas["client"].isin(clientes)].groupby("client").head(2)
+    novas = novas.assign(date=vendas["date"].min())
+
+    grafo_vizinhos = ai.grafo_vizinhos
+
+    def _parcial(matriz, k_vizinhos=ai.K_VIZINHOS, linhas=None, **kwargs):
+        assert linhas is not None, "grafo kNN refeito inteiro"
+        return grafo_vizinhos(matriz, k_vizinhos, linhas, **kwargs)
+
+    monkeypatch.setattr(ai, "grafo_vizinhos", _parcial)
+    novo = ai.atualizar_modelo(carregar_vendas(_csv(novas, tmp_path / "novas.csv")), m)
+    monkeypatch.undo()
+
+    assert m.grafo is grafo and np.array_equal(m.tabela, tabela)  # original intacto
+    brutos, ancora_ref = agregar_vendas_brutas(
+        _csv(pd.concat([vendas, novas]), tmp_path / "todas.csv"), params
+    )
+    ref = ai.construir_modelo(brutos, params, ancora_ref)
+    ai.materializar_tabela(ref, 10)
+    assert novo.clientes.tolist() == ref.clientes.tolist()
+    np.testing.assert_allclose(novo.grafo.toarray(), ref.grafo.toarray(), atol=1e-6)
+    np.testing.assert_array_equal(novo.tabela, ref.tabela)
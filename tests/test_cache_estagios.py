@@ -0,0 +1,69 @@
+"""Cache de estágios do build: acertos, falhas por parâmetro e despejo LRU."""
+
+import os
+
+import numpy as np
+
+import ai
+from cache_estagios import CacheEstagios
+
+
+def _entradas(raiz) -> set:
+    return {n for n in os.listdir(raiz) if ".tmp-" not in n}
+
+
+def _estagios(nomes) -> list:
+    return sorted(n.split("-", 1)[0] for n in nomes)
+
+
+def test_build_quente_reaproveita_todos_os_estagios(vendas_csv, params, tmp_path, monkeypatch):
+    cache = CacheEstagios(str(tmp_path / "cache"))
+    frio = ai.construir_de_vendas(vendas_csv, params, cache)
+    entradas = _entradas(cache.raiz)
+    assert _estagios(entradas) == ["agregados", "fatores", "indice", "matriz", "similares"]
+
+    def _falha(*args, **kwargs):
+        raise AssertionError("estágio recalculado com o cache quente")
+
+    for nome in ("agregar_vendas_brutas", "grafo_vizinhos", "similaridade_itens", "fatorar"):
+        monkeypatch.setattr(ai, nome, _falha)
+    quente = ai.construir_de_vendas(vendas_csv, params, cache)
+    assert _entradas(cache.raiz) == entradas
+    for atributo in ("matriz", "grafo", "similares"):
+        assert (getattr(quente, atributo) != getattr(frio, atributo)).nnz == 0
+    np.testing.assert_array_equal(quente.fatores_clientes.dados, frio.fatores_clientes.dados)
+
+
+def test_parametro_de_um_estagio_so_invalida_esse_estagio(vendas_csv, params, tmp_path):
+    cache = CacheEstagios(str(tmp_path / "cache"))
+    ai.construir_de_vendas(vendas_csv, params, cache)
+    antes = _entradas(cache.raiz)
+
+    m = ai.construir_de_vendas(vendas_csv, {**params, "ITEM_TOP_N": 3}, cache)
+    assert _estagios(_entradas(cache.raiz) - antes) == ["similares"]
+    assert np.diff(m.similares.indptr).max() <= 3
+
+    antes = _entradas(cache.raiz)
+    ai.construir_de_vendas(vendas_csv, {**params, "ANN_BACKEND": "ivf", "ANN_LISTS": 4}, cache)
+    assert _estagios(_entradas(cache.raiz) - antes) == ["indice"]
+
+
+def test_despejo_remove_as_entradas_menos_usadas(tmp_path):
+    cache = CacheEstagios(str(tmp_path / "cache"))
+    arrays = {"x": np.zeros(1000)}  # ~8 KB por entrada
+    for i, chave in enumerate(("a", "b", "c")):
+        cache.gravar("matriz", chave, arrays)
+        os.utime(cache._dir("matriz", chave), (i, i))
+    assert cache.ler("matriz", "a") is not None  # "a" passa a ser a mais recente
+
+    cache.max_bytes = 20_000
+    cache.despejar()
+    assert _entradas(cache.raiz) == {"matriz-a", "matriz-c"}
+    assert cache.ler("matriz", "b") is None
+
+
+def test_artefato_incompativel_com_outro_item_top_n(params):
+    manifest = {"versao": ai.ARTIFACT_VERSION, "params": dict(params), "shape": [1, 1]}
+    assert ai.artefato_compativel(manifest, params, None, precompute_k=0)
+    for mudanca in ({"ITEM_TOP_N": 3}, {"ANN_BACKEND": "ivf"}, {"ANN_LISTS": 4}):
+        assert not ai.artefato_compativel(manifest, {**params, **mudanca}, None, precompute_k=0)
@@ -0,0 +1,67 @@
+"""evaluate_v2: split independente da fonte das vendas e ranking por grafo."""
+
+import pandas as pd
+import pytest
+
+import ai
+import sales_store
+from evaluate_v2 import avaliar_divisao, avaliar_knn_v2, dividir_treino_teste, ranquear_pelo_grafo
+from ingest import agregar_vendas_brutas
+
+
+@pytest.mark.skipif(not sales_store.disponivel(), reason="store colunar requer pyarrow")
+def test_split_igual_no_csv_e_no_store(vendas_csv, params, tmp_path):
+    raiz = str(tmp_path / "store")
+    sales_store.importar_csv(vendas_csv, raiz)
+    brutos, ancora = agregar_vendas_brutas(vendas_csv, params)
+    m = ai.construir_modelo(brutos, params, ancora)
+
+    do_csv = avaliar_knn_v2(ai.preparar_dados(vendas_csv, params), modelo_ref=m)
+    do_store = avaliar_knn_v2(ai.preparar_dados(raiz, params), modelo_ref=m)
+    assert do_csv == do_store
+
+
+def test_ranquear_cliente_desconhecido(vendas_csv, params):
+    brutos, ancora = agregar_vendas_brutas(vendas_csv, params)
+    m = ai.construir_modelo(brutos, params, ancora)
+    clientes = m.clientes.tolist()[:3] + ["Cliente inexistente"]
+    with pytest.raises(ValueError, match="Cliente inexistente"):
+        ranquear_pelo_grafo(m.matriz, clientes, [5], 10, modelo_ref=m)
+
+
+def test_recomendar_fn_igual_ao_grafo(vendas_csv, params):
+    brutos, ancora = agregar_vendas_brutas(vendas_csv, params)
+    m = ai.construir_modelo(brutos, params, ancora)
+    grafo, knn = m.grafo, m.knn
+    divisao = dividir_treino_teste(ai.preparar_dados(vendas_csv, params))
+
+    pelo_grafo = avaliar_divisao(divisao, k_vizinhos=5, k_recs=10, modelo_ref=m)
+    pela_fn = avaliar_divisao(divisao, ai.recomendar_por_cliente, 5, 10, modelo_ref=m)
+    assert pela_fn == pelo_grafo
+    # O modelo servido não é reajustado ao treino
+    assert m.grafo is grafo and m.knn is knn
+
+
+def test_avaliar_modelo_atualizado(vendas, params, tmp_path, monkeypatch):
+    # O cliente novo entra ao final do vocabulário do modelo atualizado, fora da ordem do split
+    monkeypatch.setattr(ai, "REBUILD_FRACTION", 1.0)
+    base = tmp_path / "base.csv"
+    vendas.to_csv(base, index=False, encoding="utf-8-sig")
+    brutos, ancora = agregar_vendas_brutas(str(base), params)
+    m = ai.construir_modelo(brutos, params, ancora)
+    cliente = vendas["client"].value_counts().index[0]
+    novas = vendas[(vendas["client"] == cliente) & vendas["product"].isin(m.produtos.tolist())]
+    novas = novas.assign(client="Aaa Cliente Novo")
+    atualizado = ai.atualizar_modelo(novas, m)
+    assert atualizado.clientes[len(atualizado.clientes) - 1] == "Aaa Cliente Novo"
+
+    todas = tmp_path / "todas.csv"
+    pd.concat([vendas, novas]).to_csv(todas, index=False, encoding="utf-8-sig")
+    brutos, ancora = agregar_vendas_brutas(str(todas), params)
+    ref = ai.construir_modelo(brutos, params, ancora)
+    assert ref.clientes[0] == "Aaa Cliente Novo"
+
+    divisao = dividir_treino_teste(ai.preparar_dados(str(todas), params))
+    obtido = avaliar_divisao(divisao, modelo_ref=atualizado)
+    esperado = avaliar_divisao(divisao, modelo_ref=ref)
+    assert obtido == pytest.approx(esperado)
@@ -0,0 +1,40 @@
+"""quantizacao: produtos sobre dados int8 e busca KNN na CSR quantizada."""
+
+import numpy as np
+import pytest
+from scipy.sparse import random as esparsa_aleatoria
+
+import ai
+from evaluate_v2 import avaliar_divisao, dividir_treino_teste
+from ingest import agregar_vendas_brutas
+from quantizacao import CSRQuantizada, VetoresQuantizados
+
+
+def test_produto_csr_int8_sem_transbordo():
+    x = esparsa_aleatoria(40, 3000, density=0.5, format="csr", random_state=0)
+    q = CSRQuantizada.de(x)
+    assert q.dados.dtype == np.int8
+    esperado = (x @ x.T).toarray()
+    # Centenas de termos 127 · 127 por linha: acumular em int8 transbordaria
+    np.testing.assert_allclose(q.produto(q, np.arange(10)), esperado[:10], rtol=0.02)
+    pesos = esparsa_aleatoria(7, 40, density=0.2, format="csr", random_state=1)
+    np.testing.assert_allclose(q.combinacao(pesos).toarray(), (pesos @ x).toarray(), atol=0.05)
+
+
+@pytest.mark.parametrize("precisao", ["float32", "float16", "int8"])
+def test_produto_denso_em_blocos(precisao):
+    rng = np.random.default_rng(0)
+    a = VetoresQuantizados.de(rng.standard_normal((20, 16)), precisao)
+    b = VetoresQuantizados.de(rng.standard_normal((50, 16)), precisao)
+    inteiro = a.linhas() @ b.linhas().T
+    np.testing.assert_allclose(a.produto(b, tamanho_bloco=7), inteiro, rtol=1e-5, atol=1e-5)
+
+
+def test_knn_int8_proximo_do_float32(vendas_csv, params):
+    brutos, ancora = agregar_vendas_brutas(vendas_csv, params)
+    m = ai.construir_modelo(brutos, params, ancora)
+    divisao = dividir_treino_teste(ai.preparar_dados(vendas_csv, params))
+    float32 = avaliar_divisao(divisao, precisao="float32", modelo_ref=m)
+    int8 = avaliar_divisao(divisao, precisao="int8", modelo_ref=m)
+    assert int8["precision@K"] == pytest.approx(float32["precision@K"], abs=0.02)
+    assert int8["recall@K"] == pytest.approx(float32["recall@K"], abs=0.02)
@@ -0,0 +1,44 @@
+"""
+reancorar_modelo: equivalente a reconstruir com a data âncora deslocada, sem alterar o
+original.
+"""
+
+import numpy as np
+import pandas as pd
+
+import ai
+from ingest import agregar_vendas_brutas
+
+
+def test_reancorar_equivale_a_reconstruir_na_nova_ancora(vendas_csv, params):
+    params = {**params, "RECENCY_MODE": "exponencial"}
+    brutos, ancora = agregar_vendas_brutas(vendas_csv, params)
+    m = ai.construir_modelo(brutos, params, ancora)
+    ai.materializar_tabela(m, 10)
+    matriz_antes, tabela_antes, ancora_antes = m.matriz.copy(), m.tabela.copy(), m.estado["ancora"]
+
+    novo = ai.reancorar_modelo(ancora + pd.Timedelta(days=30, hours=5), m)
+
+    # O original fica intacto (quem serve troca a referência)
+    assert m.estado["ancora"] == ancora_antes
+    assert (m.matriz != matriz_antes).nnz == 0
+    np.testing.assert_array_equal(m.tabela, tabela_antes)
+
+    # Reconstruir com todos os pesos decaídos 30 dias dá a mesma matriz e as mesmas normas
+    deslocados = brutos.copy()
+    deslocados["weighted_quantity"] *= np.exp(-params["ALPHA"] * 30)
+    ref = ai.construir_modelo(deslocados, params, ancora)
+    np.testing.assert_allclose(novo.matriz.toarray(), ref.matriz.toarray(), atol=1e-6)
+    np.testing.assert_allclose(novo.normas, ref.normas, rtol=1e-6)
+    assert pd.Timestamp(novo.estado["ancora"]) == pd.Timestamp(ancora) + pd.Timedelta(days=30)
+    assert novo.tabela.shape == tabela_antes.shape
+
+    # Mesmo dia da nova âncora: nada a fazer
+    assert ai.reancorar_modelo(ancora + pd.Timedelta(days=30, hours=6), novo) is None
+
+
+def test_reancorar_no_modo_hiperbolico_nao_faz_nada(vendas_csv, params):
+    params = {**params, "RECENCY_MODE": "hiperbolico"}
+    brutos, ancora = agregar_vendas_brutas(vendas_csv, params)
+    m = ai.construir_modelo(brutos, params, ancora)
+    assert ai.reancorar_modelo(ancora + pd.Timedelta(days=30), m) is None
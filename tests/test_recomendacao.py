@@ -0,0 +1,50 @@
+"""
+recomendar_por_cliente, recomendar_em_lote e a tabela materializada concordam (inclusive
+nos empates).
+"""
+
+import pytest
+
+import ai
+from ingest import agregar_vendas_brutas
+
+
+@pytest.fixture
+def modelo(vendas_csv, params):
+    brutos, ancora = agregar_vendas_brutas(vendas_csv, params)
+    return ai.construir_modelo(brutos, params, ancora)
+
+
+@pytest.mark.parametrize("modo", ai.MODOS_RECOMENDACAO)
+def test_consulta_individual_igual_ao_lote(modelo, modo):
+    clientes = modelo.clientes.tolist()
+    lote = ai.recomendar_em_lote(clientes, 5, 10, modelo_ref=modelo, modo=modo)
+    for cliente, linha in zip(clientes, lote):
+        recs = ai.recomendar_por_cliente(cliente, 5, 10, modo=modo, modelo_ref=modelo)
+        assert recs == modelo.produtos.decodificar(linha)
+
+
+def test_tabela_igual_a_consulta_ao_vivo(modelo):
+    clientes = modelo.clientes.tolist()
+    ao_vivo = [ai.recomendar_por_cliente(c, 5, 10, modelo_ref=modelo) for c in clientes]
+    ai.materializar_tabela(modelo, 10, 5)
+    assert [ai.recomendar_por_cliente(c, 5, 10, modelo_ref=modelo) for c in clientes] == ao_vivo
+
+
+def test_empates_na_mesma_ordem(vendas_csv, params):
+    # Quantidades iguais: produtos com o mesmo IDF empatam nos scores
+    brutos, ancora = agregar_vendas_brutas(vendas_csv, params)
+    brutos["weighted_quantity"] = 1.0
+    m = ai.construir_modelo(brutos, params, ancora)
+    clientes = m.clientes.tolist()
+    lote = ai.recomendar_em_lote(clientes, 1, 10, modelo_ref=m)
+    for cliente, linha in zip(clientes, lote):
+        recs = ai.recomendar_por_cliente(cliente, 1, 10, modelo_ref=m)
+        assert recs == m.produtos.decodificar(linha)
+
+
+def test_grafo_com_orcamento_de_memoria(modelo, monkeypatch):
+    # Orçamento zerado: blocos de uma linha, mesmo grafo
+    monkeypatch.setattr(ai, "MEMORIA_BLOCOS_MB", 0)
+    grafo = ai.grafo_vizinhos(modelo.matriz, modelo.grafo_k, n_threads=4)
+    assert (grafo != modelo.grafo).nnz == 0
@@ -0,0 +1,76 @@
+"""
+vocab.py
+
+Vocabulários de clientes e produtos: mapeiam nomes para códigos int32 densos (0..n-1)
+com busca O(1) em hash map e decodificação por array reverso. Usados por ai.py,
+evaluate_v2.py e app.py no lugar de listas Python com `in`/`.index()` lineares.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Vocabulario:
+    """
+    Mapeamento bidirecional nome ↔ código int32.
+    A ordem dos nomes define os códigos (linha/coluna correspondente na matriz do modelo).
+    """
+
+    def __init__(self, nomes):
+        self.nomes = np.asarray(list(nomes), dtype=object)
+        self._codigos = {nome: i for i, nome in enumerate(self.nomes)}
+        if len(self._codigos) != len(self.nomes):
+            raise ValueError("Vocabulário com nomes duplicados.")
+
+    @classmethod
+    def de_categorias(cls, serie: pd.Series) -> "Vocabulario":
+        """Cria o vocabulário a partir das categorias (já ordenadas) de uma coluna categórica."""
+        return cls(serie.cat.categories)
+
+    def __len__(self) -> int:
+        return len(self.nomes)
+
+    def __contains__(self, nome) -> bool:
+        return nome in self._codigos
+
+    def __iter__(self):
+        return iter(self.nomes.tolist())
+
+    def __getitem__(self, codigo):
+        return self.nomes[codigo]
+
+    def adicionar(self, nomes) -> np.ndarray:
+        """Acrescenta nomes novos ao final (códigos existentes não mudam); retorna os códigos."""
+        novos = [n for n in dict.fromkeys(nomes) if n not in self._codigos]
+        if novos:
+            base = len(self.nomes)
+            self.nomes = np.concatenate([self.nomes, np.asarray(novos, dtype=object)])
+            self._codigos.update((n, base + i) for i, n in enumerate(novos))
+        return self.codificar(nomes)
+
+    def codigo(self, nome) -> int:
+        """Código de um nome; KeyError se ausente."""
+        return self._codigos[nome]
+
+    def get(self, nome, default: int = -1) -> int:
+        return self._codigos.get(nome, default)
+
+    def codificar(self, nomes) -> np.ndarray:
+        """Codifica uma sequência de nomes em int32; nomes desconhecidos viram -1."""
+        if isinstance(nomes, pd.Series) and isinstance(nomes.dtype, pd.CategoricalDtype):
+            # Traduz só as categorias e reindexa pelos códigos da coluna
+            trad = np.array([self.get(c) for c in nomes.cat.categories], dtype=np.int32)
+            codes = nomes.cat.codes.to_numpy()
+            return np.where(codes >= 0, trad[codes], -1).astype(np.int32)
+        return np.fromiter((self.get(n) for n in nomes), dtype=np.int32)
+
+    def decodificar(self, codigos) -> list:
+        """Nomes correspondentes a uma sequência de códigos."""
+        return self.nomes[np.asarray(codigos, dtype=np.int64)].tolist()
+
+    def categorico(self, nomes) -> pd.Categorical:
+        """Coluna categórica cujos códigos coincidem com os do vocabulário."""
+        return pd.Categorical(nomes, categories=self.nomes)
+
+    def tolist(self) -> list:
+        return self.nomes.tolist()